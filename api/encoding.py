@@ -0,0 +1,71 @@
+from typing import Any, Dict, Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import Response
+
+from services.ohlcv_cache import PRICE_COLUMNS
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def ohlcv_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Parallel arrays per field, as contiguous NumPy buffers"""
+    columns = {'timestamp': np.ascontiguousarray(df['timestamp'].to_numpy(dtype=np.int64))}
+    for col in PRICE_COLUMNS:
+        columns[col] = np.ascontiguousarray(df[col].to_numpy(dtype=np.float64))
+    return columns
+
+def json_response(payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Encode with orjson, which writes NumPy arrays natively (NaN -> null),
+    bypassing the per-object Pydantic/jsonable_encoder pass"""
+    return Response(content=orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+                    media_type="application/json", headers=headers)
+
+def arrow_response(df: pd.DataFrame, metadata: Dict[str, Any],
+                   headers: Optional[Dict[str, str]] = None) -> Response:
+    """OHLCV as an Arrow IPC stream, `metadata` stored in the schema"""
+    import pyarrow as pa
+
+    table = pa.table(ohlcv_columns(df))
+    table = table.replace_schema_metadata({k: str(v) for k, v in metadata.items() if v is not None})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_STREAM_MEDIA_TYPE,
+                    headers=headers)
+
+def tail_bounds(timestamps: np.ndarray, since: Optional[int] = None, limit: Optional[int] = None) -> slice:
+    """Positions of candles at or after `since`, keeping the last `limit`"""
+    lo = int(np.searchsorted(timestamps, since, 'left')) if since is not None else 0
+    if limit is not None:
+        lo = max(lo, len(timestamps) - limit)
+    return slice(lo, len(timestamps))
+
+def indicator_payload(timestamps: np.ndarray, results: Dict[str, Any], columnar: bool = False,
+                      since: Optional[int] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Indicator results aligned to the candle timestamps, in one pass.
+
+    Every result is cut to the requested tail as NumPy arrays first. Rows
+    format: per indicator a list of {timestamp, value} (Series) or
+    {timestamp, <column>...} (DataFrame) records. Columnar format: one
+    shared `timestamp` array and {column: array} per indicator. Results not
+    aligned with the candles (volume profile) are passed through whole.
+    NaN (indicator warm-up) becomes null when orjson encodes the floats.
+    """
+    window = tail_bounds(timestamps, since, limit)
+    ts = timestamps[window]
+    series = {}
+    for name, data in results.items():
+        if len(data) != len(timestamps):
+            series[name] = {col: data[col].tolist() for col in data.columns} if columnar \
+                else data.to_dict(orient='records')
+            continue
+        columns = {'value': data} if isinstance(data, pd.Series) else data
+        arrays = {col: np.asarray(columns[col], dtype=np.float64)[window] for col in columns}
+        if columnar:
+            series[name] = arrays
+        else:
+            keys = ['timestamp', *arrays]
+            series[name] = [dict(zip(keys, row)) for row in zip(ts.tolist(), *(a.tolist() for a in arrays.values()))]
+    return {'timestamp': ts, 'indicators': series} if columnar else series
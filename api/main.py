@@ -1,21 +1,40 @@
-from fastapi import FastAPI, HTTPException, Query, Body
+from fastapi import FastAPI, HTTPException, Query, Body, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Any
 import yaml
 import asyncio
-import pandas as pd
+import time
+import numpy as np
 from datetime import datetime
 
+from api.encoding import arrow_response, indicator_payload, json_response, ohlcv_columns
+from api.streaming import StreamHub, encode
 from api.models import (
     MarketData, OHLCV, BacktestRequest, BacktestResult, 
     MultiTimeframeData, APIResponse, APIError,
-    Trade, BacktestMetrics, TimeframeAnalysis
+    Trade, BacktestMetrics, TimeframeAnalysis,
+    SweepRequest, SweepRow, SweepResult,
+    WalkForwardRequest, WalkForwardFold, WalkForwardResult, EquityPoint,
+    PortfolioBacktestRequest, PortfolioTrade, PortfolioBacktestResult,
+    ScreenerRequest, ScreenerMatch, ScreenerResult,
+    MultiTimeframeBatchRequest, MultiTimeframeBatch
 )
 from services.data_fetcher import DataFetcher
-from services.storage import StorageEngine
-from services.indicators import IndicatorEngine
+from services.alerts import AlertEngine
+from services.data_collector import DataCollector
+from services.exporter import DataExporter, media_type
+from services.market_data import MarketDataService
+from services.stream_ingest import StreamIngestor
+from services.webhooks import WebhookDispatcher
+from services.storage import create_storage
+from services.indicator_cache import IndicatorCache
 from services.backtester import Backtester
 from services.multi_timeframe import MultiTimeframeAnalyzer
+from services.portfolio import PortfolioBacktester, watchlist_symbols
+from services.screener import Screener
+from services.timeframes import timeframe_to_ms
+from services.optimizer import ParameterSweep, WalkForwardOptimizer, load_strategy_config
 
 # Load Config
 def load_config():
@@ -41,20 +60,51 @@ app.add_middleware(
 )
 
 # Services
-storage = StorageEngine(config['storage']['database'])
+storage = create_storage(config)
 fetcher = DataFetcher(config)
-backtester = Backtester(storage)
-mtf_analyzer = MultiTimeframeAnalyzer(storage)
+indicator_cache = IndicatorCache(storage, config)
+backtester = Backtester(storage, indicator_cache)
+mtf_analyzer = MultiTimeframeAnalyzer(storage, config)
+sweeper = ParameterSweep(backtester)
+walk_forward = WalkForwardOptimizer(backtester)
+portfolio_backtester = PortfolioBacktester(storage, config, backtester)
+screener = Screener(storage, config)
+exporter = DataExporter(storage, config)
+collector = DataCollector(storage, fetcher, config)
+ingestor = StreamIngestor(storage, collector.backfiller, config, collector.pairs())
+# Chart reads share the collector's exchange budget
+market_data = MarketDataService(storage, fetcher, config, rate_limiter=collector.rate_limiter)
+stream_hub = StreamHub(market_data, config)
+alert_dispatcher = WebhookDispatcher(config)
+alert_engine = AlertEngine(storage, config, dispatcher=alert_dispatcher)
+
+@app.on_event("startup")
+async def startup_event():
+    if config.get('data_sources', {}).get('stream', {}).get('enabled'):
+        collector.live_feed = ingestor
+        asyncio.create_task(ingestor.run_forever())
+    if config.get('data_sources', {}).get('collector', {}).get('enabled'):
+        asyncio.create_task(collector.run_forever())
+    if alert_engine.enabled:
+        asyncio.create_task(alert_engine.run_forever())
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    collector.stop()
+    ingestor.stop()
+    alert_engine.stop()
+    await alert_dispatcher.close()
     await fetcher.close()
 
 @app.get("/health")
 async def health_check():
     return {
         "status": "ok",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "ohlcv_cache": storage.ohlcv_cache.stats() if storage.ohlcv_cache else None,
+        "market_data": market_data.stats(),
+        "streaming": stream_hub.stats(),
+        "multi_timeframe": mtf_analyzer.stats()
     }
 
 def success_response(data: Any):
@@ -63,6 +113,12 @@ def success_response(data: Any):
 def error_response(message: str, code: str = "INTERNAL_ERROR"):
     return APIResponse(success=False, error=APIError(message=message, code=code))
 
+def freshness_headers(freshness: dict) -> dict:
+    headers = {"X-Data-Source": freshness['source']}
+    if freshness['stale_sec'] is not None:
+        headers["X-Data-Stale-Sec"] = f"{freshness['stale_sec']:.3f}"
+    return headers
+
 def save_watchlists(data):
     with open("config/watchlists.yaml", "w") as f:
         yaml.dump(data, f)
@@ -140,20 +196,45 @@ async def get_symbols(watchlist: Optional[str] = None):
             all_symbols.add(asset['symbol'])
     return success_response(list(all_symbols))
 
+@app.get("/api/v1/collector/status")
+async def get_collector_status():
+    """Per-(symbol, timeframe) schedule, latency and lag of the background collector"""
+    return success_response({**collector.metrics(), 'stream': ingestor.metrics()})
+
+@app.get("/api/v1/alerts/status")
+async def get_alerts_status():
+    """Loaded rules, invalid rules and timings of the alert engine, plus webhook delivery"""
+    return success_response({**alert_engine.metrics(), 'delivery': alert_dispatcher.stats()})
+
 @app.get("/api/v1/ohlcv/{symbol:path}/{timeframe}")
-async def get_ohlcv(symbol: str, timeframe: str, limit: int = 500):
+async def get_ohlcv(symbol: str, timeframe: str, response: Response, limit: int = 500,
+                    format: str = Query("rows", pattern="^(rows|columnar|arrow)$")):
+    """`format`: rows (list of OHLCV objects), columnar (one array per field)
+    or arrow (Arrow IPC stream, freshness in the schema metadata)"""
     # Decode symbol if needed (FastAPI handles path params well, but just in case)
     # symbol e.g. BTC/USDT -> BTC/USDT
     
     try:
-        # Try fetch live for now as per app.py logic
-        df = await fetcher.fetch_ohlcv(symbol, timeframe, limit)
+        # Stored candles when fresh, otherwise one coalesced live refresh
+        df, freshness = await market_data.get_ohlcv(symbol, timeframe, limit)
         
         if df.empty:
              return error_response(f"No data found for {symbol}", "NO_DATA")
-        
-        # Store async (fire and forget in real app, here sync for simplicity or just skip)
-        storage.store_ohlcv(symbol, timeframe, df)
+        headers = freshness_headers(freshness)
+        meta = {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'lastUpdate': freshness['as_of'],
+            'staleSec': freshness['stale_sec'],
+            'source': freshness['source'],
+        }
+        # Straight from the NumPy columns, no per-row models
+        if format == "columnar":
+            return json_response({'success': True, 'data': {**meta, 'ohlcv': ohlcv_columns(df)}, 'error': None},
+                                 headers)
+        if format == "arrow":
+            return arrow_response(df, meta, headers)
+        response.headers.update(headers)
         
         # Convert to model
         ohlcv_list = []
@@ -171,65 +252,80 @@ async def get_ohlcv(symbol: str, timeframe: str, limit: int = 500):
             symbol=symbol,
             timeframe=timeframe,
             ohlcv=ohlcv_list,
-            lastUpdate=int(datetime.now().timestamp() * 1000)
+            lastUpdate=freshness['as_of'],
+            staleSec=freshness['stale_sec'],
+            source=freshness['source']
         ))
         
     except Exception as e:
         return error_response(str(e))
 
 @app.get("/api/v1/indicators/{symbol:path}/{timeframe}")
-async def get_indicators(symbol: str, timeframe: str, indicators: str = Query(...)):
+async def get_indicators(symbol: str, timeframe: str, response: Response, indicators: str = Query(...),
+                         since: Optional[int] = None, limit: Optional[int] = Query(None, ge=1),
+                         format: str = Query("rows", pattern="^(rows|columnar)$")):
+    """`since` (ms, inclusive) and `limit` return only the newest points; the
+    indicators are still computed over the full window so warm-up matches"""
     indicator_list = indicators.split(",")
     
     # We need data first
-    df = await fetcher.fetch_ohlcv(symbol, timeframe, 500)
+    try:
+        df, freshness = await market_data.get_ohlcv(symbol, timeframe, 500)
+    except Exception as e:
+        return error_response(str(e))
     if df.empty:
         return error_response("No data for indicators", "NO_DATA")
         
-    results = IndicatorEngine.calculate_all(df, indicator_list)
-    
-    # Convert Pandas objects to dicts/lists for JSON serialization
-    serialized_results = {}
-    for name, data in results.items():
-        if isinstance(data, pd.DataFrame):
-            serialized_results[name] = data.to_dict(orient='records')
-        elif isinstance(data, pd.Series):
-            serialized_results[name] = data.tolist() # Or dict with timestamp? 
-            # For simplicity in this prototype, let's just return the values list matching OHLCV index
-            # Ideally we should align timestamps.
-            
-            # Better approach: return list of objects {timestamp, value}
-            # But the existing engine returns Series without index alignment guarantee in return type doc?
-            # Actually engine returns Series/DF with same index as input DF usually.
-            # Let's assume 1:1 mapping with the fetched OHLCV for now.
-            pass
-            
-            # Re-mapping to include timestamps for safer frontend consumption
-            values = []
-            for idx, val in data.items():
-                # idx is likely integer index if reset_index wasn't called, or timestamp if set as index
-                # The fetcher returns integer index.
-                ts = df.iloc[idx]['timestamp'] if isinstance(idx, int) and idx < len(df) else 0
-                values.append({"timestamp": ts, "value": val})
-            serialized_results[name] = values
-
-    # Actually, let's simplify. The frontend expects specific structures.
-    # We will just return the raw dicts and let frontend parse or refine here.
-    # To make it robust, let's just return the last 500 points as list of dicts.
-    
-    final_data = {}
-    for name, data in results.items():
-        if isinstance(data, pd.DataFrame):
-            # e.g. MACD, BB
-            # Add timestamp
-            data_with_ts = data.copy()
-            data_with_ts['timestamp'] = df['timestamp']
-            final_data[name] = data_with_ts.to_dict(orient='records')
-        else:
-            # Series (RSI)
-            final_data[name] = [{"timestamp": t, "value": v} for t, v in zip(df['timestamp'], data)]
+    results = indicator_cache.calculate_all(symbol, timeframe, df, indicator_list)
+    data = indicator_payload(df['timestamp'].to_numpy(dtype=np.int64), results,
+                             columnar=format == "columnar", since=since, limit=limit)
+    return json_response({'success': True, 'data': data, 'error': None}, freshness_headers(freshness))
+
+@app.get("/api/v1/export/{symbol:path}/{timeframe}")
+async def export_ohlcv(symbol: str, timeframe: str, start: Optional[int] = None, end: Optional[int] = None,
+                       format: str = Query("csv", pattern="^(csv|json|parquet)$"),
+                       compression: Optional[str] = Query(None, pattern="^(gzip|zstd)$")):
+    """Download stored candles in [start, end] (ms) as a file. Read and
+    encoded `export.chunk_rows` candles at a time while it is sent, so memory
+    stays flat for any range; Parquet gets one row group per chunk."""
+    if storage.get_last_timestamp(symbol, timeframe) is None:
+        return error_response(f"No data found for {symbol} {timeframe}", "NOT_FOUND")
+    filename = exporter.ohlcv_filename(symbol, timeframe, start, end, format, compression)
+    return StreamingResponse(exporter.stream_ohlcv(symbol, timeframe, start, end, format, compression),
+                             media_type=media_type(format, compression),
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
-    return success_response(final_data)
+@app.websocket("/api/v1/stream")
+async def stream(websocket: WebSocket):
+    """Live candles and indicators. Client messages:
+    {"action": "subscribe", "symbol": "BTC/USDT", "timeframe": "1m", "indicators": ["RSI"]}
+    {"action": "unsubscribe", "symbol": "BTC/USDT", "timeframe": "1m"}
+    Each subscription gets a "snapshot" of the window, then "update" deltas."""
+    await websocket.accept()
+    subscriber = stream_hub.connect()
+    sender = asyncio.create_task(stream_hub.pump(subscriber, websocket.send_text))
+    # Whatever ends the loop, the subscriber's streams must be released
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+                if not isinstance(message, dict):
+                    raise ValueError("expected a JSON object")
+                action = message.get('action')
+                if action == 'subscribe':
+                    await stream_hub.subscribe(subscriber, message['symbol'], message['timeframe'],
+                                               message.get('indicators') or ())
+                elif action == 'unsubscribe':
+                    stream_hub.unsubscribe(subscriber, message['symbol'], message['timeframe'])
+                else:
+                    raise ValueError(f"Unknown action: {action}")
+            except (KeyError, ValueError) as e:
+                subscriber.offer(None, encode({'type': 'error', 'message': f"Invalid message: {e}"}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        stream_hub.disconnect(subscriber)
 
 @app.post("/api/v1/backtest")
 async def run_backtest(request: BacktestRequest):
@@ -276,26 +372,252 @@ async def run_backtest(request: BacktestRequest):
     except Exception as e:
         return error_response(str(e))
 
+def resolve_strategy_config(request) -> dict:
+    """Inline strategy_config if given, else config/strategies/<strategy>.yaml"""
+    if request.strategy_config is None:
+        return load_strategy_config(request.strategy)
+    if 'strategy' not in request.strategy_config:
+        return {"strategy": request.strategy_config}
+    return request.strategy_config
+
+@app.post("/api/v1/backtest/sweep")
+async def run_sweep(request: SweepRequest):
+    try:
+        strategy_config = resolve_strategy_config(request)
+        
+        # CPU-bound; keep the event loop responsive while workers run
+        result = await asyncio.to_thread(
+            sweeper.run,
+            strategy_config,
+            request.symbol,
+            request.timeframe,
+            request.start_date,
+            request.end_date,
+            parameter_ranges=request.parameter_ranges,
+            metric=request.metric,
+            top_n=request.top_n
+        )
+        
+        if 'error' in result:
+            return error_response(result['error'])
+        
+        rows = [SweepRow(
+            rank=r['rank'],
+            parameters=r['parameters'],
+            totalTrades=r['total_trades'],
+            winRate=r['win_rate'],
+            totalReturn=r['total_return'],
+            totalReturnPct=r['total_return_pct'],
+            finalCapital=r['final_capital']
+        ) for r in result['results']]
+        
+        return success_response(SweepResult(
+            metric=result['metric'],
+            combinations=result['combinations'],
+            bars=result['bars'],
+            elapsedSec=result['elapsed_sec'],
+            results=rows
+        ))
+        
+    except FileNotFoundError:
+        return error_response(f"Strategy not found: {request.strategy}", "NOT_FOUND")
+    except Exception as e:
+        return error_response(str(e))
+
+@app.post("/api/v1/backtest/walk-forward")
+async def run_walk_forward(request: WalkForwardRequest):
+    try:
+        strategy_config = resolve_strategy_config(request)
+        
+        result = await asyncio.to_thread(
+            walk_forward.run,
+            strategy_config,
+            request.symbol,
+            request.timeframe,
+            request.start_date,
+            request.end_date,
+            train_bars=request.train_bars,
+            test_bars=request.test_bars,
+            step_bars=request.step_bars,
+            anchored=request.anchored,
+            parameter_ranges=request.parameter_ranges,
+            metric=request.metric
+        )
+        
+        if 'error' in result:
+            return error_response(result['error'])
+        
+        folds = [WalkForwardFold(
+            fold=f['fold'],
+            trainStart=f['train_start'],
+            trainEnd=f['train_end'],
+            testStart=f['test_start'],
+            testEnd=f['test_end'],
+            parameters=f['parameters'],
+            inSample=f['in_sample'],
+            outOfSample=f['out_of_sample'],
+            finalCapital=f['final_capital']
+        ) for f in result['folds']]
+        
+        return success_response(WalkForwardResult(
+            metric=result['metric'],
+            combinations=result['combinations'],
+            folds=folds,
+            outOfSampleMetrics=result['out_of_sample_metrics'],
+            equityCurve=[EquityPoint(**p) for p in result['equity_curve']],
+            finalCapital=result['final_capital'],
+            elapsedSec=result['elapsed_sec']
+        ))
+        
+    except FileNotFoundError:
+        return error_response(f"Strategy not found: {request.strategy}", "NOT_FOUND")
+    except Exception as e:
+        return error_response(str(e))
+
+@app.post("/api/v1/backtest/portfolio")
+async def run_portfolio_backtest(request: PortfolioBacktestRequest):
+    try:
+        strategy_config = resolve_strategy_config(request)
+        
+        if request.symbols:
+            symbols = request.symbols
+        elif request.watchlist:
+            symbols = watchlist_symbols(load_watchlists(), request.watchlist)
+        else:
+            return error_response("Provide a watchlist or symbols", "INVALID_REQUEST")
+        
+        result = await asyncio.to_thread(
+            portfolio_backtester.run_backtest,
+            strategy_config,
+            symbols,
+            request.timeframe,
+            request.start_date,
+            request.end_date,
+            request.initial_capital
+        )
+        
+        if 'error' in result:
+            return error_response(result['error'])
+        
+        trades = [PortfolioTrade(
+            entryTime=t['entry_time'],
+            entryPrice=t['entry_price'],
+            exitTime=t['exit_time'],
+            exitPrice=t['exit_price'],
+            pnl=t['pnl'],
+            pnlPct=t['pnl_pct'],
+            reason=t['reason'],
+            symbol=t['symbol'],
+            quantity=t['quantity'],
+            fees=t['fees']
+        ) for t in result['trades']]
+        
+        return success_response(PortfolioBacktestResult(
+            symbols=result['symbols'],
+            trades=trades,
+            metrics=result['metrics'],
+            perSymbol=result['per_symbol'],
+            openPositions=result['open_positions'],
+            equityCurve=[EquityPoint(**p) for p in result['equity_curve']],
+            finalCapital=result['final_capital']
+        ))
+        
+    except KeyError as e:
+        return error_response(e.args[0], "NOT_FOUND")
+    except FileNotFoundError:
+        return error_response(f"Strategy not found: {request.strategy}", "NOT_FOUND")
+    except Exception as e:
+        return error_response(str(e))
+
+@app.post("/api/v1/screener")
+async def run_screener(request: ScreenerRequest):
+    """Symbols of a watchlist (or the given symbols, or every stored symbol)
+    whose latest candle meets all conditions"""
+    try:
+        if request.symbols:
+            symbols = request.symbols
+        elif request.watchlist:
+            symbols = watchlist_symbols(load_watchlists(), request.watchlist)
+        else:
+            symbols = await asyncio.to_thread(storage.get_symbols, request.timeframe)
+        
+        result = await asyncio.to_thread(
+            screener.screen,
+            symbols,
+            request.timeframe,
+            request.conditions,
+            request.parameters,
+            request.bars,
+            request.as_of
+        )
+        
+        if 'error' in result:
+            return error_response(result['error'], "INVALID_REQUEST")
+        
+        return success_response(ScreenerResult(
+            timeframe=result['timeframe'],
+            evaluated=result['evaluated'],
+            matches=[ScreenerMatch(**m) for m in result['matches']],
+            elapsedMs=result['elapsed_ms']
+        ))
+        
+    except KeyError as e:
+        return error_response(e.args[0], "NOT_FOUND")
+    except ValueError as e:
+        return error_response(str(e), "INVALID_REQUEST")
+    except Exception as e:
+        return error_response(str(e))
+
+def multi_timeframe_data(symbol: str, analysis: dict) -> MultiTimeframeData:
+    tf_analysis = {}
+    for tf, data in analysis['timeframes'].items():
+        tf_analysis[tf] = TimeframeAnalysis(
+            timeframe=tf,
+            trend=data['trend'],
+            strength=float(data['strength']),
+            divergences=data['divergences']
+        )
+    return MultiTimeframeData(
+        symbol=symbol,
+        timeframes=tf_analysis,
+        alignment=analysis['alignment'],
+        confluenceScore=analysis['confluence_score']
+    )
+
 @app.get("/api/v1/multi-timeframe/{symbol:path}")
 async def get_multi_timeframe(symbol: str):
     try:
-        analysis = mtf_analyzer.analyze_symbol(symbol)
-        
-        tf_analysis = {}
-        for tf, data in analysis['timeframes'].items():
-            tf_analysis[tf] = TimeframeAnalysis(
-                timeframe=tf,
-                trend=data['trend'],
-                strength=float(data['strength']),
-                divergences=data['divergences']
-            )
-            
-        return success_response(MultiTimeframeData(
-            symbol=symbol,
-            timeframes=tf_analysis,
-            alignment=analysis['alignment'],
-            confluenceScore=analysis['confluence_score']
+        analysis = await asyncio.to_thread(mtf_analyzer.analyze_symbol, symbol)
+        return success_response(multi_timeframe_data(symbol, analysis))
+    except Exception as e:
+        return error_response(str(e))
+
+@app.post("/api/v1/multi-timeframe")
+async def get_multi_timeframe_batch(request: MultiTimeframeBatchRequest):
+    """Cross-timeframe analysis of a watchlist (or the given symbols), ranked
+    by confluence score"""
+    try:
+        started = time.perf_counter()
+        if request.symbols:
+            symbols = request.symbols
+        elif request.watchlist:
+            symbols = watchlist_symbols(load_watchlists(), request.watchlist)
+        else:
+            return error_response("Provide a watchlist or symbols", "INVALID_REQUEST")
+        for tf in request.timeframes or []:
+            timeframe_to_ms(tf)
+        
+        analyses = await asyncio.to_thread(mtf_analyzer.analyze_many, symbols, request.timeframes)
+        results = [multi_timeframe_data(symbol, analysis) for symbol, analysis in analyses.items()]
+        results.sort(key=lambda r: r.confluenceScore, reverse=True)
+        return success_response(MultiTimeframeBatch(
+            results=results,
+            elapsedMs=(time.perf_counter() - started) * 1000
         ))
+    except KeyError as e:
+        return error_response(e.args[0], "NOT_FOUND")
+    except ValueError as e:
+        return error_response(str(e), "INVALID_REQUEST")
     except Exception as e:
         return error_response(str(e))
 
@@ -15,6 +15,8 @@ class MarketData(BaseModel):
     ohlcv: List[OHLCV]
     indicators: Optional[Dict[str, Any]] = None
     lastUpdate: int
+    staleSec: Optional[float] = None
+    source: Optional[str] = None
 
 class IndicatorConfig(BaseModel):
     name: str
@@ -50,6 +52,116 @@ class BacktestResult(BaseModel):
     metrics: BacktestMetrics
     finalCapital: float
 
+class SweepRequest(BaseModel):
+    strategy: str = "rsi_mean_reversion"
+    strategy_config: Optional[Dict[str, Any]] = None
+    symbol: str
+    timeframe: str
+    start_date: int
+    end_date: int
+    parameter_ranges: Optional[Dict[str, Any]] = None
+    metric: Optional[str] = None
+    top_n: Optional[int] = 50
+
+class SweepRow(BaseModel):
+    rank: int
+    parameters: Dict[str, Any]
+    totalTrades: int
+    winRate: float
+    totalReturn: float
+    totalReturnPct: float
+    finalCapital: float
+
+class SweepResult(BaseModel):
+    metric: str
+    combinations: int
+    bars: int
+    elapsedSec: float
+    results: List[SweepRow]
+
+class WalkForwardRequest(BaseModel):
+    strategy: str = "rsi_mean_reversion"
+    strategy_config: Optional[Dict[str, Any]] = None
+    symbol: str
+    timeframe: str
+    start_date: int
+    end_date: int
+    train_bars: Optional[int] = None
+    test_bars: Optional[int] = None
+    step_bars: Optional[int] = None
+    anchored: Optional[bool] = None
+    parameter_ranges: Optional[Dict[str, Any]] = None
+    metric: Optional[str] = None
+
+class WalkForwardFold(BaseModel):
+    fold: int
+    trainStart: int
+    trainEnd: int
+    testStart: int
+    testEnd: int
+    parameters: Dict[str, Any]
+    inSample: Dict[str, Any]
+    outOfSample: Dict[str, Any]
+    finalCapital: float
+
+class EquityPoint(BaseModel):
+    timestamp: int
+    equity: float
+
+class WalkForwardResult(BaseModel):
+    metric: str
+    combinations: int
+    folds: List[WalkForwardFold]
+    outOfSampleMetrics: Dict[str, Any]
+    equityCurve: List[EquityPoint]
+    finalCapital: float
+    elapsedSec: float
+
+class PortfolioBacktestRequest(BaseModel):
+    strategy: str = "rsi_mean_reversion"
+    strategy_config: Optional[Dict[str, Any]] = None
+    watchlist: Optional[str] = None
+    symbols: Optional[List[str]] = None
+    timeframe: str
+    start_date: int
+    end_date: int
+    initial_capital: Optional[float] = None
+
+class PortfolioTrade(Trade):
+    symbol: str
+    quantity: float
+    fees: float
+
+class PortfolioBacktestResult(BaseModel):
+    symbols: List[str]
+    trades: List[PortfolioTrade]
+    metrics: Dict[str, Any]
+    perSymbol: Dict[str, Dict[str, Any]]
+    openPositions: List[Dict[str, Any]]
+    equityCurve: List[EquityPoint]
+    finalCapital: float
+
+class ScreenerRequest(BaseModel):
+    timeframe: str
+    conditions: List[Dict[str, Any]]
+    watchlist: Optional[str] = None
+    symbols: Optional[List[str]] = None
+    parameters: Optional[Dict[str, Any]] = None
+    bars: int = 200
+    as_of: Optional[int] = None
+
+class ScreenerMatch(BaseModel):
+    symbol: str
+    timestamp: int
+    close: float
+    values: Dict[str, Optional[float]]
+
+class ScreenerResult(BaseModel):
+    timeframe: str
+    evaluated: int
+    matches: List[ScreenerMatch]
+    elapsedMs: float
+
 class TimeframeAnalysis(BaseModel):
     timeframe: str
     trend: str
@@ -62,6 +174,15 @@ class MultiTimeframeData(BaseModel):
     alignment: str
     confluenceScore: float
 
+class MultiTimeframeBatchRequest(BaseModel):
+    watchlist: Optional[str] = None
+    symbols: Optional[List[str]] = None
+    timeframes: Optional[List[str]] = None
+
+class MultiTimeframeBatch(BaseModel):
+    results: List[MultiTimeframeData]  # highest confluence first
+    elapsedMs: float
+
 class APIError(BaseModel):
     message: str
     code: str
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, Set, Tuple
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from api.encoding import indicator_payload, ohlcv_columns
+from services.incremental import INCREMENTAL_INDICATORS, Bar, IncrementalIndicatorEngine
+from services.indicators import IndicatorEngine
+from services.market_data import MarketDataService
+from services.ohlcv_cache import PRICE_COLUMNS
+from services.timeframes import timeframe_to_ms
+
+logger = logging.getLogger(__name__)
+
+StreamKey = Tuple[str, str]
+
+def encode(message: dict) -> str:
+    return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+class Subscriber:
+    """Outbound side of one WebSocket connection.
+
+    Messages wait in a bounded queue. A client too slow to drain it misses
+    deltas for a stream, so that stream is flagged for a fresh snapshot
+    instead of queueing more.
+    """
+
+    def __init__(self, max_queue: int):
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.subscriptions: Dict[StreamKey, Tuple[str, ...]] = {}
+        self.resync: Set[StreamKey] = set()
+
+    def offer(self, key: StreamKey, message: str):
+        if key in self.resync:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.resync.add(key)
+
+class StreamHub:
+    """Fans candle and indicator deltas out to WebSocket subscribers.
+
+    Each subscribed (symbol, timeframe) has one upstream task, shared by
+    every client on it. The task polls MarketDataService, which serves from
+    storage and coalesces exchange refreshes. It diffs the window against
+    the last candle it saw and updates indicators once for the union the
+    subscribers asked for: closed candles advance an
+    IncrementalIndicatorEngine and the in-progress one is peeked, so a poll
+    costs O(changed candles), not a pass over the window. Each update is
+    encoded once per distinct indicator set. Load grows with the number of
+    streams, not clients. Subscribers get a snapshot of the window first,
+    then only changed candles: the in-progress one and any newly opened.
+    """
+
+    def __init__(self, market_data: MarketDataService, config: dict):
+        self.market_data = market_data
+        stream_config = config.get('streaming', {})
+        self.poll_interval_sec = stream_config.get('poll_interval_sec', 2.0)
+        self.max_stale_sec = stream_config.get('max_stale_sec', 10.0)
+        self.snapshot_limit = stream_config.get('snapshot_limit', 500)
+        self.max_queue = stream_config.get('max_queue', 100)
+        self._subscribers: Dict[StreamKey, Set[Subscriber]] = {}
+        self._upstreams: Dict[StreamKey, asyncio.Task] = {}
+        # Last candle each upstream has published: (timestamp, prices)
+        self._last: Dict[StreamKey, Tuple[int, tuple]] = {}
+        self.incremental = IncrementalIndicatorEngine()
+        # Updates run in worker threads, resets on the event loop
+        self._incremental_lock = threading.Lock()
+        self.polls = 0
+        self.updates = 0
+        self.messages = 0
+        self.errors = 0
+
+    def connect(self) -> Subscriber:
+        return Subscriber(self.max_queue)
+
+    async def subscribe(self, subscriber: Subscriber, symbol: str, timeframe: str, indicators=()):
+        timeframe_to_ms(timeframe)  # ValueError for unsupported timeframes
+        key = (symbol, timeframe)
+        subscriber.subscriptions[key] = tuple(indicators)
+        self._subscribers.setdefault(key, set()).add(subscriber)
+        if key not in self._upstreams:
+            self._upstreams[key] = asyncio.create_task(self._upstream(key))
+        await self._send_snapshot(subscriber, key)
+
+    def unsubscribe(self, subscriber: Subscriber, symbol: str, timeframe: str):
+        key = (symbol, timeframe)
+        subscriber.subscriptions.pop(key, None)
+        subscriber.resync.discard(key)
+        subscribers = self._subscribers.get(key)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[key]
+            self._last.pop(key, None)
+            with self._incremental_lock:
+                self.incremental.reset(*key)
+            task = self._upstreams.pop(key, None)
+            if task is not None:
+                task.cancel()
+
+    def disconnect(self, subscriber: Subscriber):
+        for symbol, timeframe in list(subscriber.subscriptions):
+            self.unsubscribe(subscriber, symbol, timeframe)
+
+    async def pump(self, subscriber: Subscriber, send: Callable[[str], Awaitable[None]]):
+        """Deliver a subscriber's queue over its connection until cancelled"""
+        while True:
+            message = await subscriber.queue.get()
+            await send(message)
+            self.messages += 1
+            if subscriber.resync and subscriber.queue.empty():
+                for key in list(subscriber.resync):
+                    subscriber.resync.discard(key)
+                    if key in subscriber.subscriptions:
+                        await self._send_snapshot(subscriber, key)
+
+    async def _read(self, key: StreamKey) -> Tuple[pd.DataFrame, Dict]:
+        return await self.market_data.get_ohlcv(*key, limit=self.snapshot_limit,
+                                                max_stale_sec=self.max_stale_sec)
+
+    @staticmethod
+    def _indicators(df: pd.DataFrame, indicators, since: int) -> Dict:
+        if not indicators or df.empty:
+            return {}
+        results = IndicatorEngine.calculate_all(df, list(indicators))
+        return indicator_payload(df['timestamp'].to_numpy(dtype=np.int64), results,
+                                 columnar=True, since=since)['indicators']
+
+    def _update_indicators(self, key: StreamKey, df: pd.DataFrame, indicators, since: int) -> Dict:
+        """Indicator values of the candles from `since` on, from the
+        incremental state; others (volume profile) still use the window"""
+        if not indicators or df.empty:
+            return {}
+        with self._incremental_lock:
+            return self._advance_indicators(key, df, indicators, since)
+
+    def _advance_indicators(self, key: StreamKey, df: pd.DataFrame, indicators, since: int) -> Dict:
+        symbol, timeframe = key
+        names = [name for name in indicators if name.upper() in INCREMENTAL_INDICATORS]
+        timestamps = df['timestamp'].to_numpy(dtype=np.int64)
+        committed = [self.incremental.last_timestamp(symbol, timeframe, name) for name in names]
+        if any(ts is None or ts < timestamps[0] or ts >= timestamps[-1] for ts in committed):
+            # New stream, or candles missed or rewritten: replay the window
+            self.incremental.reset(symbol, timeframe)
+            committed = []
+        lo = int(np.searchsorted(timestamps, min(committed), side='right')) if committed else 0
+        rows = np.column_stack([df[col].to_numpy(dtype=np.float64)[lo:] for col in Bar._fields])
+        *closed, current = [Bar(*row) for row in rows.tolist()]
+
+        self.incremental.advance(symbol, timeframe, [bar for bar in closed if bar.timestamp < since], names)
+        values = {name: [] for name in names}
+        for bar in closed:
+            if bar.timestamp >= since:
+                for name, value in self.incremental.advance(symbol, timeframe, [bar], names).items():
+                    values[name].append(value)
+        for name, value in self.incremental.peek(symbol, timeframe, current, names).items():
+            values[name].append(value)
+
+        changed = timestamps[timestamps >= since]
+        results = {name: pd.DataFrame(v) if isinstance(v[0], dict) else pd.Series(v, dtype=np.float64)
+                   for name, v in values.items()}
+        others = [name for name in indicators if name not in values]
+        for name, data in IndicatorEngine.calculate_all(df, others).items() if others else ():
+            results[name] = data.iloc[-len(changed):] if len(data) == len(df) else data
+        return indicator_payload(changed, results, columnar=True)['indicators']
+
+    async def _send_snapshot(self, subscriber: Subscriber, key: StreamKey):
+        try:
+            df, freshness = await self._read(key)
+        except Exception as e:
+            subscriber.offer(key, encode({'type': 'error', 'symbol': key[0], 'timeframe': key[1],
+                                          'message': str(e)}))
+            return
+        indicators = await asyncio.to_thread(self._indicators, df, subscriber.subscriptions.get(key, ()), None)
+        subscriber.offer(key, encode({
+            'type': 'snapshot', 'symbol': key[0], 'timeframe': key[1],
+            'candles': ohlcv_columns(df), 'indicators': indicators,
+            'staleSec': freshness['stale_sec'],
+        }))
+
+    async def _upstream(self, key: StreamKey):
+        while True:
+            try:
+                await self.poll(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Stream poll failed for {key[0]} {key[1]}: {e}")
+            await asyncio.sleep(self.poll_interval_sec)
+
+    async def poll(self, key: StreamKey) -> int:
+        """Publish candles changed since the last poll; returns how many"""
+        self.polls += 1
+        df, freshness = await self._read(key)
+        if df.empty:
+            return 0
+        timestamps = df['timestamp'].to_numpy(dtype=np.int64)
+        last = (int(timestamps[-1]), tuple(float(df[col].iloc[-1]) for col in PRICE_COLUMNS))
+        previous = self._last.get(key)
+        self._last[key] = last
+        if previous is None or previous == last:
+            return 0
+
+        # The previous in-progress candle may have been finalized, so resend it too
+        since = previous[0]
+        changed = df[timestamps >= since]
+        if len(changed) and int(changed['timestamp'].iloc[0]) == previous[0] and \
+                tuple(float(changed[col].iloc[0]) for col in PRICE_COLUMNS) == previous[1]:
+            changed = changed.iloc[1:]
+            since = int(changed['timestamp'].iloc[0]) if len(changed) else last[0]
+
+        subscribers = list(self._subscribers.get(key, ()))
+        wanted = sorted({name for s in subscribers for name in s.subscriptions.get(key, ())})
+        indicators = await asyncio.to_thread(self._update_indicators, key, df, wanted, since)
+        candles = ohlcv_columns(changed)
+        encoded = {}
+        for subscriber in subscribers:
+            names = subscriber.subscriptions.get(key, ())
+            if names not in encoded:
+                encoded[names] = encode({
+                    'type': 'update', 'symbol': key[0], 'timeframe': key[1], 'candles': candles,
+                    'indicators': {name: indicators[name] for name in names if name in indicators},
+                    'staleSec': freshness['stale_sec'],
+                })
+            subscriber.offer(key, encoded[names])
+        self.updates += 1
+        return len(changed)
+
+    def stats(self) -> Dict:
+        return {
+            'streams': len(self._upstreams),
+            'subscriptions': sum(len(s) for s in self._subscribers.values()),
+            'polls': self.polls,
+            'updates': self.updates,
+            'messages': self.messages,
+            'errors': self.errors,
+        }
@@ -0,0 +1,50 @@
+"""Serialization cost of the /api/v1/ohlcv response formats.
+
+Times DataFrame -> response bytes for the default row format (an OHLCV
+model per row, then FastAPI's jsonable_encoder + JSONResponse) against the
+columnar JSON and Arrow IPC formats.
+
+    python -m benchmarks.api_serialization [--bars 500 5000 50000]
+"""
+import argparse
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from api.encoding import arrow_response, json_response, ohlcv_columns
+from api.models import APIResponse, MarketData, OHLCV
+from benchmarks.storage_columnar import best_of
+from benchmarks.storage_ingest import candles
+
+META = {'symbol': 'BTC/USDT', 'timeframe': '1m', 'lastUpdate': 0, 'staleSec': 0.0, 'source': 'storage'}
+
+def rows_format(df) -> bytes:
+    ohlcv_list = []
+    for _, row in df.iterrows():
+        ohlcv_list.append(OHLCV(timestamp=int(row['timestamp']), open=row['open'], high=row['high'],
+                                low=row['low'], close=row['close'], volume=row['volume']))
+    payload = APIResponse(success=True, data=MarketData(ohlcv=ohlcv_list, **META))
+    return JSONResponse(jsonable_encoder(payload)).body
+
+def columnar_format(df) -> bytes:
+    return json_response({'success': True, 'data': {**META, 'ohlcv': ohlcv_columns(df)}, 'error': None}).body
+
+def arrow_format(df) -> bytes:
+    return arrow_response(df, META).body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bars', type=int, nargs='+', default=[500, 5000, 50_000])
+    args = parser.parse_args()
+    for bars in args.bars:
+        df = candles(bars)
+        repeat = max(3, 20_000 // bars)
+        rows = best_of(lambda: rows_format(df), repeat=min(repeat, 5))
+        columnar = best_of(lambda: columnar_format(df), repeat=repeat)
+        arrow = best_of(lambda: arrow_format(df), repeat=repeat)
+        print(f"{bars:>7} bars: rows {rows * 1e3:8.2f}ms ({len(rows_format(df)) / 1e3:7.0f} kB) | "
+              f"columnar {columnar * 1e3:6.2f}ms ({len(columnar_format(df)) / 1e3:6.0f} kB, {rows / columnar:5.0f}x) | "
+              f"arrow {arrow * 1e3:6.2f}ms ({len(arrow_format(df)) / 1e3:6.0f} kB, {rows / arrow:5.0f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Swing-point and divergence detection on long series.
+
+Times the sliding-window pivot finder and divergence scan against a
+per-bar Python loop over the same series, on top of the RSI/MACD
+calculation they need.
+
+    python -m benchmarks.divergence [--bars 100000]
+"""
+import argparse
+
+from benchmarks.storage_columnar import best_of
+from benchmarks.storage_ingest import candles
+from services.divergence import find_divergences, find_pivots
+from services.indicators import IndicatorEngine
+
+def loop_pivots(values, left: int, right: int, highs: bool):
+    pivots = []
+    for i in range(left, len(values) - right):
+        window = values[i - left:i + right + 1]
+        extreme = max(window) if highs else min(window)
+        if values[i] == extreme and window.index(extreme) == left:
+            pivots.append(i)
+    return pivots
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bars', type=int, default=100_000)
+    args = parser.parse_args()
+    df = candles(args.bars)
+    high, low = df['high'].to_numpy(), df['low'].to_numpy()
+
+    indicators = best_of(lambda: IndicatorEngine.calculate_all(df, ['RSI', 'MACD']))
+    results = IndicatorEngine.calculate_all(df, ['RSI', 'MACD'])
+    oscillators = {'RSI': results['RSI'].to_numpy(), 'MACD': results['MACD']['histogram'].to_numpy()}
+
+    pivots = best_of(lambda: (find_pivots(high), find_pivots(low, highs=False)), repeat=5)
+    loop = best_of(lambda: (loop_pivots(high.tolist(), 5, 5, True), loop_pivots(low.tolist(), 5, 5, False)))
+    assert loop_pivots(high.tolist(), 5, 5, True) == find_pivots(high).tolist()
+    divergences = best_of(lambda: find_divergences(high, low, oscillators), repeat=5)
+    found = find_divergences(high, low, oscillators)
+    kinds = {}
+    for d in found:
+        kinds[f"{d['direction']}_{d['kind']}"] = kinds.get(f"{d['direction']}_{d['kind']}", 0) + 1
+
+    print(f"{args.bars} bars: RSI+MACD {indicators * 1e3:.1f}ms | pivots {pivots * 1e3:.2f}ms "
+          f"(loop {loop * 1e3:.0f}ms, {loop / pivots:.0f}x) | pivots+divergences {divergences * 1e3:.2f}ms")
+    print(f"{len(found)} divergences: " + ", ".join(f"{k} {v}" for k, v in sorted(kinds.items())))
+
+if __name__ == '__main__':
+    main()
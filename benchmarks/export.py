@@ -0,0 +1,77 @@
+"""Peak memory and time of OHLCV exports, whole-frame vs streamed.
+
+Stores multi-year 1m history, then exports it once by loading the whole
+range into a DataFrame (the previous approach) and once through the
+chunked DataExporter. Each export runs in a fresh forked process so its
+peak is measured on its own: RSS, which also counts the SQLite file pages
+mapped by `PRAGMA mmap_size` (up to 256 MiB, reclaimable), and the peak
+Python/NumPy heap traced by tracemalloc in a second run.
+
+    python -m benchmarks.export [--bars 2000000]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.storage_ingest import candles
+from services.exporter import DataExporter
+from services.storage import StorageEngine
+
+def whole_frame(storage: StorageEngine, out_dir: str, format: str, compression):
+    df = storage.get_ohlcv('BTC/USDT', '1m')
+    path = os.path.join(out_dir, f"whole.{format}")
+    if format == 'csv':
+        df.to_csv(path, index=False, compression=compression)
+    else:
+        df.to_parquet(path, index=False, compression=compression)
+
+def streamed(storage: StorageEngine, out_dir: str, format: str, compression):
+    DataExporter(storage, {'export': {'dir': out_dir}}).export_ohlcv('BTC/USDT', '1m', format=format,
+                                                                     compression=compression)
+
+def measure(fn, *args, traced: bool = False):
+    """Seconds and peak RSS MiB of fn(*args) in a child process, or the peak
+    traced heap MiB when `traced`"""
+    ctx = multiprocessing.get_context('fork')
+    parent, child = ctx.Pipe()
+
+    def run():
+        if traced:
+            tracemalloc.start()
+        started = time.perf_counter()
+        if fn is not None:
+            fn(*args)
+        elapsed = time.perf_counter() - started
+        if traced:
+            child.send(tracemalloc.get_traced_memory()[1] / 2**20)
+        else:
+            child.send((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+    process = ctx.Process(target=run)
+    process.start()
+    result = parent.recv()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bars', type=int, default=2_000_000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = StorageEngine(os.path.join(tmp, "export.db"), ohlcv_cache_bytes=0)
+        storage.store_ohlcv('BTC/USDT', '1m', candles(args.bars))
+        _, baseline = measure(None)
+        print(f"{args.bars} 1m candles, process baseline {baseline:.0f} MiB RSS")
+        for format, compression in (('csv', None), ('csv', 'gzip'), ('parquet', 'zstd')):
+            label = f"{format}{'+' + compression if compression else ''}"
+            for name, fn in (('whole frame', whole_frame), ('streamed', streamed)):
+                seconds, rss = measure(fn, storage, tmp, format, compression)
+                heap = measure(fn, storage, tmp, format, compression, traced=True)
+                print(f"{label:13s} {name:11s} {seconds:5.1f}s | peak RSS {rss:5.0f} MiB | peak heap {heap:5.0f} MiB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Range-read throughput of the SQLite and columnar OHLCV backends.
+
+Stores multi-year 1m history in both and times full and partial range
+reads with the in-process LRU disabled, so every read hits disk (or the OS
+page cache).
+
+    python -m benchmarks.storage_columnar [--bars 2000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.storage_ingest import candles
+from services.columnar_storage import ColumnarStorageEngine
+from services.storage import StorageEngine
+
+def best_of(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bars', type=int, default=2_000_000)
+    args = parser.parse_args()
+    df = candles(args.bars)
+    first, last = int(df['timestamp'].iloc[0]), int(df['timestamp'].iloc[-1])
+    middle = first + (last - first) // 2
+    payload_mb = args.bars * 48 / 1e6
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite = StorageEngine(os.path.join(tmp, 'sqlite.db'), ohlcv_cache_bytes=0)
+        columnar = ColumnarStorageEngine(os.path.join(tmp, 'meta.db'), os.path.join(tmp, 'ohlcv'),
+                                         ohlcv_cache_bytes=0)
+        for name, engine in (('sqlite', sqlite), ('columnar', columnar)):
+            write = best_of(lambda: engine.store_ohlcv('BTC/USDT', '1m', df), repeat=1)
+            full = best_of(lambda: engine.get_ohlcv('BTC/USDT', '1m'))
+            half = best_of(lambda: engine.get_ohlcv('BTC/USDT', '1m', start=middle))
+            recent = best_of(lambda: engine.get_ohlcv('BTC/USDT', '1m', start=last - 500 * 60_000), repeat=20)
+            size = os.path.getsize(engine.db_path) if name == 'sqlite' else dir_size(columnar.data_dir)
+            print(f"{name:>9}: write {write:6.2f}s | full read {full:6.3f}s ({payload_mb / full:7.0f} MB/s) | "
+                  f"half {half:6.3f}s | last 500 {recent * 1e3:6.2f}ms | {size / 1e6:6.0f} MB on disk")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Concurrent OHLCV read throughput while a collector-style writer is active.
+
+Compares the pooled WAL StorageEngine against the previous connect-per-call
+setup in rollback-journal mode. The OHLCV LRU is disabled so every read hits
+SQLite.
+
+    python -m benchmarks.storage_concurrency [--readers 4] [--seconds 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from services.storage import StorageEngine
+
+SYMBOLS = [f"SYM{i}/USDT" for i in range(20)]
+BARS = 20_000
+STEP = 60_000
+START = 1_600_000_000_000
+
+class LegacyStorageEngine(StorageEngine):
+    """New connection per operation, default journal mode"""
+
+    @contextmanager
+    def get_conn(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+def candles(n: int, start: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return pd.DataFrame({
+        'timestamp': start + np.arange(n, dtype=np.int64) * STEP,
+        'open': close, 'high': close * 1.001, 'low': close * 0.999,
+        'close': close, 'volume': rng.uniform(10, 100, n),
+    })
+
+def populate(engine: StorageEngine):
+    for i, symbol in enumerate(SYMBOLS):
+        engine.store_ohlcv(symbol, '1m', candles(BARS, START, i))
+
+def run(engine: StorageEngine, readers: int, seconds: float) -> dict:
+    stop = threading.Event()
+    reads, errors, writes = [0] * readers, [0] * readers, [0]
+
+    def reader(slot: int):
+        rng = random.Random(slot)
+        while not stop.is_set():
+            symbol = rng.choice(SYMBOLS)
+            start = START + rng.randrange(BARS - 500) * STEP
+            try:
+                engine.get_ohlcv(symbol, '1m', start=start, limit=500)
+                reads[slot] += 1
+            except sqlite3.OperationalError:
+                errors[slot] += 1
+
+    def writer():
+        # Collector-style: upsert the latest 50 candles of each symbol in turn
+        ts = START + BARS * STEP
+        i = 0
+        while not stop.is_set():
+            engine.store_ohlcv(SYMBOLS[i % len(SYMBOLS)], '1m', candles(50, ts - 49 * STEP, i))
+            writes[0] += 1
+            i += 1
+            if i % len(SYMBOLS) == 0:
+                ts += STEP
+
+    threads = [threading.Thread(target=reader, args=(slot,)) for slot in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {
+        'reads_per_sec': sum(reads) / seconds,
+        'writes_per_sec': writes[0] / seconds,
+        'read_errors': sum(errors),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = LegacyStorageEngine(os.path.join(tmp, 'legacy.db'), ohlcv_cache_bytes=0)
+        with legacy.get_conn() as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        pooled = StorageEngine(os.path.join(tmp, 'pooled.db'), ohlcv_cache_bytes=0)
+
+        for name, engine in (('connect-per-call', legacy), ('pooled WAL', pooled)):
+            populate(engine)
+            result = run(engine, args.readers, args.seconds)
+            print(f"{name:>17}: {result['reads_per_sec']:8.0f} reads/s "
+                  f"{result['writes_per_sec']:6.0f} writes/s "
+                  f"({result['read_errors']} read errors, {args.readers} readers)")
+        pooled.close()
+
+if __name__ == '__main__':
+    main()
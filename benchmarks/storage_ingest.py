@@ -0,0 +1,60 @@
+"""Bulk OHLCV ingest throughput: store_ohlcv against the previous
+to_dict('records') + INSERT OR REPLACE path.
+
+    python -m benchmarks.storage_ingest [--rows 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from services.storage import StorageEngine
+
+def legacy_store(engine: StorageEngine, symbol: str, timeframe: str, df: pd.DataFrame):
+    df_to_store = df.copy()
+    df_to_store['symbol'] = symbol
+    df_to_store['timeframe'] = timeframe
+    data = df_to_store[['symbol', 'timeframe', 'timestamp', 'open', 'high', 'low', 'close', 'volume']].to_dict('records')
+    with engine.get_conn() as conn:
+        conn.executemany("""
+            INSERT OR REPLACE INTO ohlcv (symbol, timeframe, timestamp, open, high, low, close, volume)
+            VALUES (:symbol, :timeframe, :timestamp, :open, :high, :low, :close, :volume)
+        """, data)
+
+def candles(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    return pd.DataFrame({
+        'timestamp': 1_500_000_000_000 + np.arange(n, dtype=np.int64) * 60_000,
+        'open': close, 'high': close * 1.001, 'low': close * 0.999,
+        'close': close, 'volume': rng.uniform(10, 100, n),
+    })
+
+def timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+    df = candles(args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = StorageEngine(os.path.join(tmp, 'legacy.db'), ohlcv_cache_bytes=0)
+        bulk = StorageEngine(os.path.join(tmp, 'bulk.db'), ohlcv_cache_bytes=0)
+        results = [
+            ('legacy, empty table', timed(lambda: legacy_store(legacy, 'BTC/USDT', '1m', df))),
+            ('legacy, re-ingest', timed(lambda: legacy_store(legacy, 'BTC/USDT', '1m', df))),
+            ('bulk, empty table', timed(lambda: bulk.store_ohlcv('BTC/USDT', '1m', df))),
+            ('bulk, re-ingest', timed(lambda: bulk.store_ohlcv('BTC/USDT', '1m', df))),
+        ]
+        for name, elapsed in results:
+            print(f"{name:>20}: {elapsed:6.2f}s {args.rows / elapsed:>10,.0f} rows/s")
+
+if __name__ == '__main__':
+    main()
@@ -54,6 +54,8 @@ export const MarketDataSchema = z.object({
     ohlcv: OHLCVArraySchema,
     indicators: z.record(z.string(), z.any()).optional(),
     lastUpdate: z.number(),
+    staleSec: z.number().nullable().optional(),
+    source: z.enum(["storage", "exchange"]).nullable().optional(),
 });
 
 export type MarketData = z.infer<typeof MarketDataSchema>;
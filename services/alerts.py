@@ -1,87 +1,479 @@
+import ast
+import asyncio
 import logging
-import httpx
-from typing import List, Dict
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
 import pandas as pd
 
+from services.incremental import INCREMENTAL_INDICATORS, Bar, IncrementalIndicatorEngine
+from services.ohlcv_cache import PRICE_COLUMNS
+from services.storage import StorageEngine
+from services.strategy_compiler import COMPARISONS, CROSSOVERS, Expr, compile_expression, indicator_for_column
+from services.timeframes import candle_open, timeframe_to_ms
+from services.webhooks import WebhookDispatcher
+
 logger = logging.getLogger(__name__)
 
+OPERATORS = tuple(COMPARISONS) + CROSSOVERS
+
+_COMPARE_NODES = {ast.Lt: '<', ast.Gt: '>', ast.LtE: '<=', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!='}
+# Crossovers are rewritten to shift operators before parsing: they bind
+# tighter than comparisons and looser than arithmetic, like the words read
+_CROSS_NODES = {ast.RShift: 'crosses_above', ast.LShift: 'crosses_below'}
+MAX_CLAUSES = 64
+
+# Whether each operator holds given sign(left - right) on the previous and
+# current bar, indexed [operator, previous sign + 1, current sign + 1]
+_TRUTH = np.zeros((len(OPERATORS), 3, 3), dtype=bool)
+for _code, _op in enumerate(OPERATORS):
+    for _prev in (-1, 0, 1):
+        for _cur in (-1, 0, 1):
+            if _op == 'crosses_above':
+                _TRUTH[_code, _prev + 1, _cur + 1] = _cur > 0 and _prev <= 0
+            elif _op == 'crosses_below':
+                _TRUTH[_code, _prev + 1, _cur + 1] = _cur < 0 and _prev >= 0
+            else:
+                _TRUTH[_code, _prev + 1, _cur + 1] = COMPARISONS[_op](_cur, 0)
+
+# (operator, left operand source, right operand source)
+Atom = Tuple[str, str, str]
+# An OR of AND-clauses; each literal is an atom and whether it is negated
+Clauses = List[List[Tuple[Atom, bool]]]
+
+def parse_condition(condition: str) -> Tuple[Clauses, Set[str]]:
+    """Compile an alert condition to disjunctive normal form.
+
+    Grammar: comparisons (< > <= >= == !=) and crosses_above/crosses_below
+    between arithmetic expressions over indicator columns (RSI,
+    MACD_histogram, BB_lower, ...), OHLCV columns and numbers, combined with
+    and/or/not and parentheses. `price` is an alias for close. Returns the
+    clauses and the columns they read; raises ValueError on anything else.
+    """
+    if '$' in condition:
+        raise ValueError(f"Parameters are not supported in alert conditions: {condition!r}")
+    text = re.sub(r'\bprice\b', 'close', condition)
+    text = re.sub(r'\bcrosses_above\b', '>>', text)
+    text = re.sub(r'\bcrosses_below\b', '<<', text)
+    text = re.sub(r'\b(and|or|not)\b', lambda m: m.group(1).lower(), text, flags=re.IGNORECASE)
+    try:
+        tree = ast.parse(text.strip(), mode='eval').body
+    except SyntaxError as e:
+        raise ValueError(f"Invalid condition {condition!r}: {e.msg}") from e
+    columns: Set[str] = set()
+    return _clauses(tree, False, columns, condition), columns
+
+def _operand(node: ast.AST, columns: Set[str]) -> str:
+    source = ast.unparse(node)
+    _, used = compile_expression(source)  # validates names and syntax
+    columns.update(used)
+    return source
+
+def _clauses(node: ast.AST, negate: bool, columns: Set[str], condition: str) -> Clauses:
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return _clauses(node.operand, not negate, columns, condition)
+
+    if isinstance(node, ast.BoolOp):
+        parts = [_clauses(value, negate, columns, condition) for value in node.values]
+        # De Morgan: a negated AND distributes like an OR and vice versa
+        if isinstance(node.op, ast.And) != negate:
+            combined = parts[0]
+            for part in parts[1:]:
+                combined = [left + right for left in combined for right in part]
+                if len(combined) > MAX_CLAUSES:
+                    raise ValueError(f"Condition too complex: {condition!r}")
+            return combined
+        return [clause for part in parts for clause in part]
+
+    if isinstance(node, ast.Compare):
+        # a < b < c means a < b and b < c
+        operands = [node.left] + node.comparators
+        literals = []
+        for op, left, right in zip(node.ops, operands, operands[1:]):
+            if type(op) not in _COMPARE_NODES:
+                raise ValueError(f"Unsupported operator in {condition!r}")
+            literals.append((_COMPARE_NODES[type(op)], _operand(left, columns), _operand(right, columns)))
+        if negate:
+            return [[(atom, True)] for atom in literals]
+        return [[(atom, False) for atom in literals]]
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _CROSS_NODES:
+        atom = (_CROSS_NODES[type(node.op)], _operand(node.left, columns), _operand(node.right, columns))
+        return [[(atom, negate)]]
+
+    raise ValueError(f"Unsupported condition: {condition!r}")
+
+@dataclass
+class AlertRule:
+    name: str
+    symbol: str
+    timeframe: str
+    condition: str
+    clauses: Clauses
+    columns: Set[str]
+    cooldown_sec: float = 0.0
+    alert_id: Optional[int] = None  # row in the alerts table
+    webhook_url: Optional[str] = None
+    last_triggered: Optional[float] = None
+
+    @property
+    def key(self) -> tuple:
+        return (self.alert_id, self.name, self.symbol, self.timeframe, self.condition)
+
+def compile_rule(rule: dict, default_timeframe: str = '1h', default_cooldown_sec: float = 0.0) -> AlertRule:
+    """AlertRule from a config entry or alerts table row; ValueError if invalid"""
+    condition = str(rule['condition'])
+    clauses, columns = parse_condition(condition)
+    for column in columns:
+        indicator = indicator_for_column(column)
+        if indicator is not None and indicator not in INCREMENTAL_INDICATORS:
+            raise ValueError(f"Indicator not supported by alerts: {indicator}")
+    timeframe = rule.get('timeframe') or default_timeframe
+    timeframe_to_ms(timeframe)
+    return AlertRule(
+        name=rule.get('name') or f"{rule['symbol']} {condition}",
+        symbol=rule['symbol'],
+        timeframe=timeframe,
+        condition=condition,
+        clauses=clauses,
+        columns=columns,
+        cooldown_sec=float(rule.get('cooldown_sec', default_cooldown_sec)),
+        alert_id=rule.get('id'),
+        webhook_url=rule.get('webhook_url'),
+        last_triggered=rule.get('last_triggered'),
+    )
+
+class RuleBook:
+    """Every rule of one (symbol, timeframe), laid out for a batched pass.
+
+    Operands and atoms shared between rules are evaluated once. Columns are
+    two-element arrays (previous bar, current bar). Every atom reduces to
+    the sign of left - right on both bars and one lookup in a truth table,
+    then clauses and rules are combined with reduceat, so the cost per tick
+    is a handful of array operations however many rules the symbol has.
+    Atoms touching NaN (indicator warm-up) are false.
+    """
+
+    def __init__(self, rules: List[AlertRule], operands: Dict[str, Expr]):
+        self.rules = rules
+        self.columns = set().union(*(rule.columns for rule in rules))
+        self.indicators = sorted({indicator_for_column(c) for c in self.columns} - {None})
+
+        operand_index: Dict[str, int] = {}
+        atom_index: Dict[Atom, int] = {}
+        literal_atoms, literal_negated, clause_starts, rule_starts = [], [], [], []
+        for rule in rules:
+            rule_starts.append(len(clause_starts))
+            for clause in rule.clauses:
+                clause_starts.append(len(literal_atoms))
+                for atom, negated in clause:
+                    for source in atom[1:]:
+                        operand_index.setdefault(source, len(operand_index))
+                    literal_atoms.append(atom_index.setdefault(atom, len(atom_index)))
+                    literal_negated.append(negated)
+
+        # Numbers are filled in once; only column expressions run per tick
+        self.values = np.zeros((len(operand_index), 2))
+        self.operands = []
+        for source, i in operand_index.items():
+            try:
+                self.values[i] = float(source)
+            except ValueError:
+                self.operands.append((i, operands[source]))
+        atoms = list(atom_index)
+        self.left = np.array([operand_index[a[1]] for a in atoms], dtype=np.intp)
+        self.right = np.array([operand_index[a[2]] for a in atoms], dtype=np.intp)
+        self.codes = np.array([OPERATORS.index(a[0]) for a in atoms], dtype=np.intp)
+        self.crossover = np.isin(self.codes, [OPERATORS.index(op) for op in CROSSOVERS])
+        self.literal_atoms = np.array(literal_atoms, dtype=np.intp)
+        self.literal_negated = np.array(literal_negated, dtype=bool)
+        self.clause_starts = np.array(clause_starts, dtype=np.intp)
+        self.rule_starts = np.array(rule_starts, dtype=np.intp)
+        self.cooldown = np.array([rule.cooldown_sec for rule in rules], dtype=np.float64)
+        self.active = np.zeros(len(rules), dtype=bool)
+        self.last_fired = np.full(len(rules), -np.inf)
+
+    def evaluate(self, cols: Dict[str, np.ndarray]) -> np.ndarray:
+        """Which rules hold on the current bar"""
+        values = self.values.copy()
+        for i, operand in self.operands:
+            values[i] = operand(cols, {})
+        diff = values[self.left] - values[self.right]
+        # Comparisons read the current bar; crossovers need both
+        valid = ~np.isnan(diff[:, 1]) & (~np.isnan(diff[:, 0]) | ~self.crossover)
+        signs = np.sign(np.nan_to_num(diff)).astype(np.intp) + 1
+        atoms = _TRUTH[self.codes, signs[:, 0], signs[:, 1]] & valid
+        literals = atoms[self.literal_atoms] != self.literal_negated
+        clauses = np.logical_and.reduceat(literals, self.clause_starts)
+        return np.logical_or.reduceat(clauses, self.rule_starts)
+
+    def fire(self, holding: np.ndarray, now: float) -> np.ndarray:
+        """Rules that just became true and are out of their cooldown"""
+        fired = holding & ~self.active & (now - self.last_fired >= self.cooldown)
+        self.active = holding
+        self.last_fired[fired] = now
+        return np.flatnonzero(fired)
+
+def _flatten(values: Dict, out: Dict[str, float]):
+    for name, value in values.items():
+        if isinstance(value, dict):
+            for col, v in value.items():
+                out[f"{name}_{col}"] = v
+        else:
+            out[name] = value
+
+def _float(value) -> float:
+    return np.nan if value is None else float(value)
+
+def _nullable(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+def _operand_sources(rules: List[AlertRule]) -> Set[str]:
+    return {source for rule in rules for clause in rule.clauses for atom, _ in clause for source in atom[1:]}
+
+class AlertEngine:
+    """Evaluates alert rules against stored candles on a fixed schedule.
+
+    Rules come from `alerts.rules` in the config and the enabled rows of the
+    alerts table (which use `alerts.default_timeframe`). Each is compiled
+    once and filed in a RuleBook per (symbol, timeframe). On each tick the
+    latest candles are read from storage, indicators advance through
+    IncrementalIndicatorEngine (closed bars committed, the newest bar
+    peeked), and the book is evaluated in one pass. A book whose newest
+    candle has not changed since the last tick is skipped. Alerts fire when
+    a condition becomes true, then not again until it has been false and
+    `cooldown_sec` (default `alerts.cooldown_sec`) has passed; stored rules
+    resume their cooldown from `last_triggered` after a restart. Fired
+    alerts are handed to the WebhookDispatcher without waiting.
+    """
+
+    def __init__(self, storage: StorageEngine, config: dict, dispatcher: Optional[WebhookDispatcher] = None,
+                 clock: Callable[[], float] = time.time):
+        self.storage = storage
+        self.dispatcher = dispatcher
+        self.clock = clock
+        alerts_config = config.get('alerts', {})
+        self.enabled = alerts_config.get('enabled', True)
+        self.check_interval_sec = alerts_config.get('check_interval_sec', 60)
+        self.default_timeframe = alerts_config.get('default_timeframe', '1h')
+        self.warmup_bars = alerts_config.get('warmup_bars', 300)
+        self.cooldown_sec = alerts_config.get('cooldown_sec', 0.0)
+        self.config_rules = alerts_config.get('rules') or []
+        defaults = config.get('indicators', {}).get('defaults', {})
+        self.indicator_params = {name.upper(): params for name, params in defaults.items()}
+        self.incremental = IncrementalIndicatorEngine()
+        self.books: Dict[Tuple[str, str], RuleBook] = {}
+        self.invalid: Dict[str, str] = {}
+        self._operands: Dict[str, Expr] = {}
+        self._stored_rules: Optional[List[Dict]] = None
+        self._seen: Dict[Tuple[str, str], Bar] = {}
+        self._committed: Dict[Tuple[str, str], int] = {}
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+        self.ticks = 0
+        self.evaluated_books = 0
+        self.triggered = 0
+        self.errors = 0
+        self.last_tick_ms: Optional[float] = None
+        self.last_eval_ms: Optional[float] = None
+
+    @property
+    def rule_count(self) -> int:
+        return sum(len(book.rules) for book in self.books.values())
+
+    def load_rules(self) -> bool:
+        """(Re)compile rules if the alerts table changed; True if rebuilt"""
+        stored = self.storage.get_alert_rules()
+        # Firing updates last_triggered; that alone needs no rebuild
+        definitions = [{k: v for k, v in row.items() if k != 'last_triggered'} for row in stored]
+        if definitions == self._stored_rules:
+            return False
+        self._stored_rules = definitions
+
+        rules, self.invalid = [], {}
+        for entry in list(self.config_rules) + stored:
+            try:
+                rules.append(compile_rule(entry, self.default_timeframe, self.cooldown_sec))
+            except (KeyError, ValueError) as e:
+                self.invalid[str(entry.get('name') or entry.get('condition'))] = str(e)
+                logger.error(f"Invalid alert rule {entry}: {e}")
+        for source in _operand_sources(rules) - set(self._operands):
+            self._operands[source] = compile_expression(source)[0]
+
+        grouped: Dict[Tuple[str, str], List[AlertRule]] = {}
+        for rule in rules:
+            grouped.setdefault((rule.symbol, rule.timeframe), []).append(rule)
+        previous, self.books = self.books, {}
+        self._seen.clear()
+        for key, book_rules in grouped.items():
+            book = RuleBook(book_rules, self._operands)
+            old = previous.get(key)
+            if old is None or old.indicators != book.indicators:
+                # New indicators need the full warm-up window
+                self.incremental.reset(*key)
+                self._committed.pop(key, None)
+            for i, rule in enumerate(book_rules):
+                if rule.last_triggered is not None:
+                    book.last_fired[i] = float(rule.last_triggered)
+            if old is not None:
+                # Keep edge/cooldown state of rules that survived the reload
+                state = {rule.key: i for i, rule in enumerate(old.rules)}
+                for i, rule in enumerate(book_rules):
+                    if rule.key in state:
+                        book.active[i] = old.active[state[rule.key]]
+                        book.last_fired[i] = old.last_fired[state[rule.key]]
+            self.books[key] = book
+        logger.info(f"Loaded {len(rules)} alert rules for {len(self.books)} symbol/timeframe pairs")
+        return True
+
+    def _columns(self, key: Tuple[str, str], book: RuleBook, now_ms: int) -> Optional[Dict[str, np.ndarray]]:
+        """(previous, current) bar values of every column the book reads, or
+        None when the newest candle is unchanged since the last tick"""
+        symbol, timeframe = key
+        start = self._committed.get(key)
+        if start is None:
+            start = candle_open(now_ms, timeframe) - (self.warmup_bars - 1) * timeframe_to_ms(timeframe)
+        df = self.storage.get_ohlcv(symbol, timeframe, start=start)
+        if df.empty:
+            return None
+        rows = np.column_stack([df[col].to_numpy(dtype=np.float64) for col in Bar._fields])
+        *closed, last = [Bar(*row) for row in rows.tolist()]
+        if self._seen.get(key) == last:
+            return None
+        self._seen[key] = last
+
+        latest = self.incremental.advance(symbol, timeframe, closed, book.indicators, self.indicator_params)
+        if closed:
+            self._committed[key] = int(closed[-1].timestamp)
+        previous = closed[-1]._asdict() if closed else {}
+        _flatten(latest, previous)
+        current = last._asdict()
+        _flatten(self.incremental.peek(symbol, timeframe, last, book.indicators, self.indicator_params), current)
+        return {col: np.array([_float(previous.get(col)), _float(current.get(col))]) for col in book.columns}
+
+    def evaluate(self, now: Optional[float] = None) -> List[Tuple[AlertRule, Dict[str, float]]]:
+        """One pass over every book; returns the rules that fired with the
+        current values of the columns they read"""
+        now = self.clock() if now is None else now
+        now_ms = int(now * 1000)
+        fired = []
+        eval_sec = 0.0
+        for key, book in self.books.items():
+            try:
+                cols = self._columns(key, book, now_ms)
+                if cols is None:
+                    continue
+                started = time.perf_counter()
+                indices = book.fire(book.evaluate(cols), now)
+                eval_sec += time.perf_counter() - started
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Alert evaluation failed for {key[0]} {key[1]}: {e}")
+                continue
+            self.evaluated_books += 1
+            for i in indices:
+                rule = book.rules[i]
+                fired.append((rule, {col: _nullable(cols[col][1]) for col in sorted(rule.columns)}))
+        self.last_eval_ms = eval_sec * 1000
+        return fired
+
+    async def tick(self) -> int:
+        """Reload rules if needed, evaluate, queue notifications; returns how many fired"""
+        started = time.perf_counter()
+        await asyncio.to_thread(self.load_rules)
+        fired = await asyncio.to_thread(self.evaluate)
+        stored = [rule.alert_id for rule, _ in fired if rule.alert_id is not None]
+        if stored:
+            await asyncio.to_thread(self.storage.mark_alerts_triggered, stored, self.clock())
+        if self.dispatcher is not None:
+            for rule, values in fired:
+                details = ", ".join(f"{col}={value:.4g}" for col, value in values.items() if value is not None)
+                self.dispatcher.submit(rule.name, f"{rule.symbol} {rule.timeframe}: {rule.condition} ({details})",
+                                       url=rule.webhook_url, key=str(rule.key))
+        self.ticks += 1
+        self.triggered += len(fired)
+        self.last_tick_ms = (time.perf_counter() - started) * 1000
+        return len(fired)
+
+    async def run_forever(self):
+        """Tick every `check_interval_sec` until stopped"""
+        self.running = True
+        self._task = asyncio.current_task()
+        try:
+            while self.running:
+                try:
+                    await self.tick()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Alert tick failed: {e}")
+                await asyncio.sleep(self.check_interval_sec)
+        finally:
+            self.running = False
+
+    def stop(self):
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+
+    def metrics(self) -> Dict:
+        return {
+            'running': self.running,
+            'rules': self.rule_count,
+            'books': len(self.books),
+            'invalid_rules': self.invalid,
+            'ticks': self.ticks,
+            'evaluated_books': self.evaluated_books,
+            'triggered': self.triggered,
+            'errors': self.errors,
+            'last_tick_ms': self.last_tick_ms,
+            'last_eval_ms': self.last_eval_ms,
+        }
+
 class AlertSystem:
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, dispatcher: Optional[WebhookDispatcher] = None):
         self.config = config
-        self.webhooks = config.get('alerts', {}).get('webhooks', {})
+        self.dispatcher = dispatcher or WebhookDispatcher(config)
         self.enabled = config.get('alerts', {}).get('enabled', True)
-        
+        self._compiled: Dict[str, RuleBook] = {}
+
     async def check_alerts(self, symbol: str, df: pd.DataFrame, indicators: Dict):
-        """Check configured alerts against current data"""
+        """Check configured alerts against the last two rows of computed data"""
         if not self.enabled or df.empty:
             return
-            
-        rules = self.config.get('alerts', {}).get('rules', [])
-        current_price = df['close'].iloc[-1]
-        
+
+        rules = [rule for rule in self.config.get('alerts', {}).get('rules', []) if rule.get('symbol') == symbol]
+        if not rules:
+            return
+
+        frame = {col: df[col] for col in PRICE_COLUMNS if col in df}
+        for name, data in indicators.items():
+            if isinstance(data, pd.DataFrame):
+                frame.update({f"{name}_{col}": data[col] for col in data.columns})
+            else:
+                frame[name] = data
+        cols = {}
+        for col, series in frame.items():
+            tail = series.to_numpy(dtype=np.float64)[-2:]
+            cols[col] = np.concatenate([np.full(2 - len(tail), np.nan), tail])
+
         for rule in rules:
-            if rule.get('symbol') != symbol:
-                continue
-                
             condition = rule.get('condition')
-            # Very simple condition parser for demo
-            # e.g. "RSI < 30"
-            
             try:
-                triggered = self._evaluate_condition(condition, current_price, indicators)
-                if triggered:
+                if condition not in self._compiled:
+                    compiled = compile_rule(rule)
+                    operands = {s: compile_expression(s)[0] for s in _operand_sources([compiled])}
+                    self._compiled[condition] = RuleBook([compiled], operands)
+                if self._compiled[condition].evaluate(cols)[0]:
                     await self._send_alert(rule['name'], f"Condition met: {condition}")
             except Exception as e:
                 logger.error(f"Error evaluating alert {rule.get('name')}: {e}")
 
-    def _evaluate_condition(self, condition: str, price: float, indicators: Dict) -> bool:
-        # Safe eval context
-        context = {'price': price}
-        # Add indicator values (last value)
-        for name, data in indicators.items():
-            if isinstance(data, pd.Series):
-                context[name] = data.iloc[-1]
-            elif isinstance(data, pd.DataFrame):
-                # Flatten, e.g. MACD_histogram
-                for col in data.columns:
-                    context[f"{name}_{col}"] = data[col].iloc[-1]
-        
-        # Security risk: eval is dangerous. In prod, use a safe parser.
-        # For this local tool, we assume config is trusted or use simple parsing.
-        # We'll use a very restricted eval or just simple string parsing.
-        # For this demo, we'll assume simple "VAR OP VAL" format.
-        
-        parts = condition.split()
-        if len(parts) == 3:
-            var, op, val = parts
-            left = context.get(var)
-            right = float(val)
-            
-            if left is None: return False
-            
-            if op == '<': return left < right
-            if op == '>': return left > right
-            if op == '<=': return left <= right
-            if op == '>=': return left >= right
-            if op == '==': return left == right
-            
-        return False
-
     async def _send_alert(self, title: str, message: str):
-        """Send to webhooks"""
+        """Queue for the webhooks; delivery happens in the background"""
         logger.info(f"ALERT: {title} - {message}")
-        
-        async with httpx.AsyncClient() as client:
-            for name, url in self.webhooks.items():
-                if not url or "${" in url: continue
-                
-                try:
-                    # Discord format
-                    if "discord" in name or "discord" in url:
-                        await client.post(url, json={"content": f"**{title}**\n{message}"})
-                    # Telegram format (simplified)
-                    elif "telegram" in name:
-                        # URL should include token and chat_id in real impl
-                        pass
-                except Exception as e:
-                    logger.error(f"Failed to send webhook to {name}: {e}")
+        self.dispatcher.submit(title, message)
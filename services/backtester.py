@@ -1,9 +1,11 @@
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
 import numpy as np
 from services.storage import StorageEngine
 from services.indicators import IndicatorEngine
+from services.indicator_cache import IndicatorCache
+from services.strategy_compiler import Signals, compile_strategy
 
 @dataclass
 class Trade:
@@ -15,77 +17,229 @@ class Trade:
     pnl_pct: float
     reason: str  # "take_profit", "stop_loss", "exit_signal"
 
+WARMUP_BARS = 14  # RSI(14) is undefined before this bar
+RSI_PERIOD = 14
+ENGINES = ("loop", "vectorized")
+
+def next_true_index(mask: np.ndarray) -> np.ndarray:
+    """For each bar i, index of the first True at or after i (len(mask) if none).
+
+    2D masks are scanned down each column (bars x assets).
+    """
+    n = len(mask)
+    rows = np.arange(n).reshape(-1, *([1] * (mask.ndim - 1)))
+    idx = np.where(mask, rows, n)
+    return np.minimum.accumulate(idx[::-1], axis=0)[::-1]
+
+def find_exit(close: np.ndarray, next_exit_signal: np.ndarray, i: int,
+              stop_loss: float, take_profit: float) -> int:
+    """Bar that closes a long opened at bar i (len(close) if it stays open).
+
+    Only the bars up to the next signal exit are scanned for the stop loss /
+    take profit, since those depend on the entry price. `stop_loss` is the
+    (negative) pnl threshold.
+    """
+    n = len(close)
+    if i + 1 >= n:
+        return n
+    entry_price = close[i]
+    signal_idx = next_exit_signal[i + 1]
+    
+    window = close[i + 1:signal_idx + 1]
+    window_pnl = (window - entry_price) / entry_price
+    hits = (window_pnl < stop_loss) | (window_pnl > take_profit)
+    if hits.any():
+        return i + 1 + int(np.argmax(hits))
+    return int(signal_idx)
+
+def exit_reason(pnl_pct: float, stop_loss: float, take_profit: float) -> str:
+    reason = "signal"
+    if pnl_pct < stop_loss: reason = "stop_loss"
+    if pnl_pct > take_profit: reason = "take_profit"
+    return reason
+
+def simulate_signals(timestamps: np.ndarray, close: np.ndarray, signals: Signals,
+                     initial_capital: float,
+                     warmup: int = WARMUP_BARS,
+                     close_open: bool = False) -> Tuple[List[Trade], float]:
+    """Array-based single-position simulation over precomputed signal masks.
+
+    For the built-in RSI rules this is trade-for-trade identical to the
+    per-bar loop. Entry and exit masks are turned into "next index" lookups,
+    so the Python-level work is one jump per trade instead of one pandas row
+    per bar.
+
+    `warmup` can be lowered when the arrays are a window into a longer
+    series whose indicators were computed beforehand. A position still open
+    on the last bar is dropped, or closed there (reason "window_end") with
+    `close_open`.
+    """
+    trades = []
+    capital = initial_capital
+    n = len(close)
+    if n <= warmup:
+        return trades, capital
+    
+    stop_loss = -signals.stop_loss
+    take_profit = signals.take_profit
+    
+    # NaN comparisons are False, matching the loop's behaviour during warmup
+    entry_mask = signals.entry.copy()
+    entry_mask[:warmup] = False
+    next_entry = next_true_index(entry_mask)
+    next_exit_signal = next_true_index(signals.exit)
+    
+    i = next_entry[warmup]
+    while i < n - 1:
+        j = find_exit(close, next_exit_signal, i, stop_loss, take_profit)
+        reason = None
+        if j >= n:
+            if not close_open:
+                break  # position still open at the end of the data
+            j, reason = n - 1, "window_end"
+        
+        entry_price = close[i]
+        exit_price = close[j]
+        pnl_pct = (exit_price - entry_price) / entry_price
+        pnl = (exit_price - entry_price) * (initial_capital * signals.position_size / entry_price) # Fixed position size logic
+        
+        trades.append(Trade(
+            entry_time=int(timestamps[i]),
+            entry_price=float(entry_price),
+            exit_time=int(timestamps[j]),
+            exit_price=float(exit_price),
+            pnl=float(pnl),
+            pnl_pct=float(pnl_pct),
+            reason=reason or exit_reason(pnl_pct, stop_loss, take_profit)
+        ))
+        capital += pnl
+        
+        if j + 1 >= n:
+            break
+        i = next_entry[j + 1]
+    
+    return trades, float(capital)
+
+def frame_columns(df: pd.DataFrame, columns) -> Dict[str, np.ndarray]:
+    return {c: df[c].to_numpy(dtype=np.float64) for c in columns}
+
+def strategy_warmup(parameters: Dict[str, Any]) -> int:
+    """Bars skipped before the first entry; RSI is undefined before `rsi_period`"""
+    return max(WARMUP_BARS, int(parameters.get('rsi_period', RSI_PERIOD)))
+
 class Backtester:
-    def __init__(self, storage: StorageEngine):
+    def __init__(self, storage: StorageEngine, indicator_cache: Optional[IndicatorCache] = None):
         self.storage = storage
+        self.indicator_cache = indicator_cache
     
-    def run_backtest(self, 
-                    strategy_config: dict,
-                    symbol: str,
-                    timeframe: str,
-                    start_date: int,
-                    end_date: int,
-                    initial_capital: float = 10000.0) -> Dict:
-        """Execute backtest with proper position sizing"""
-        
-        # Load historical data
+    def load_frame(self, symbol: str, timeframe: str,
+                   start_date: int, end_date: int,
+                   indicators: List[str] = ["RSI", "MACD", "BB", "ATR"],
+                   parameters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """Load OHLCV and attach indicator columns (DataFrame outputs as NAME_col).
+
+        A strategy's `rsi_period` parameter replaces the default RSI(14).
+        """
         df = self.storage.get_ohlcv(symbol, timeframe, start_date, end_date)
-        
         if df.empty:
-            return {'error': 'No data found for backtest range'}
+            return df
+        return self.attach_indicators(symbol, timeframe, df, indicators, parameters)
 
-        # Calculate required indicators
-        # Extract indicators from config (simplified parsing)
-        # For now, just calculate common ones
-        indicators = IndicatorEngine.calculate_all(df, ["RSI", "MACD", "BB", "ATR"])
+    def attach_indicators(self, symbol: str, timeframe: str, df: pd.DataFrame,
+                          indicators: List[str], parameters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """Add indicator columns to one symbol's candles, through the cache
+        when there is one; `rsi_period` replaces the default RSI(14)"""
+        if self.indicator_cache is not None:
+            results = self.indicator_cache.calculate_all(symbol, timeframe, df, indicators)
+        else:
+            results = IndicatorEngine.calculate_all(df, indicators)
+        rsi_period = int((parameters or {}).get('rsi_period', RSI_PERIOD))
+        if 'RSI' in results and rsi_period != RSI_PERIOD:
+            results['RSI'] = IndicatorEngine.calc_rsi(df, rsi_period)
         
         # Add indicators to DF for easier condition checking
-        for name, data in indicators.items():
+        for name, data in results.items():
             if isinstance(data, pd.Series):
                 df[name] = data
             elif isinstance(data, pd.DataFrame):
                 for col in data.columns:
                     df[f"{name}_{col}"] = data[col]
+        return df
+    
+    def run_backtest(self, 
+                    strategy_config: dict,
+                    symbol: str,
+                    timeframe: str,
+                    start_date: int,
+                    end_date: int,
+                    initial_capital: float = 10000.0,
+                    engine: str = "vectorized") -> Dict:
+        """Execute backtest with proper position sizing
+
+        Both engines compile the strategy's entry/exit conditions and only
+        compute the indicators they reference. engine="vectorized" jumps
+        between signals on arrays; engine="loop" is the per-bar reference.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown backtest engine: {engine}. Expected one of {ENGINES}")
         
-        # Simulate trades
+        compiled = compile_strategy(strategy_config)
+        df = self.load_frame(symbol, timeframe, start_date, end_date, compiled.indicators,
+                             compiled.parameters)
+        if df.empty:
+            return {'error': 'No data found for backtest range'}
+        signals = compiled.evaluate(frame_columns(df, compiled.columns))
+        warmup = strategy_warmup(compiled.parameters)
+        if engine == "loop":
+            trades, capital = self._simulate_loop(df, signals, initial_capital, warmup)
+        else:
+            trades, capital = simulate_signals(
+                df['timestamp'].to_numpy(),
+                df['close'].to_numpy(dtype=np.float64),
+                signals, initial_capital, warmup)
+        
+        # Calculate metrics
+        metrics = self._calculate_metrics(trades, initial_capital, df)
+        
+        return {
+            'trades': [t.__dict__ for t in trades],
+            'metrics': metrics,
+            'final_capital': capital
+        }
+    
+    def _simulate_loop(self, df: pd.DataFrame, signals: Signals,
+                       initial_capital: float, warmup: int = WARMUP_BARS):
+        """Reference per-bar simulation over the compiled signal masks"""
         trades = []
         capital = initial_capital
         position = None
         entry_price = 0
         entry_idx = 0
         
-        params = strategy_config.get('strategy', {}).get('parameters', {})
-        rsi_oversold = params.get('rsi_oversold', 30)
-        rsi_overbought = params.get('rsi_overbought', 70)
-        
-        # Simple loop for RSI Mean Reversion logic (hardcoded for now as parser is complex)
-        # In a real engine, we'd parse the 'entry_conditions' from YAML dynamically.
-        
-        for i in range(14, len(df)):
+        for i in range(warmup, len(df)):
             current_bar = df.iloc[i]
             
             if position is None:
-                # Entry: RSI < Oversold
-                if current_bar['RSI'] < rsi_oversold:
+                # Entry: every entry condition holds
+                if signals.entry[i]:
                     position = "long"
                     entry_price = current_bar['close']
                     entry_idx = i
             else:
-                # Exit: RSI > 50 or Stop Loss / Take Profit
-                # Simplified exit logic
+                # Exit: any exit condition, or Stop Loss / Take Profit
                 current_price = current_bar['close']
                 pnl_pct = (current_price - entry_price) / entry_price
                 
-                exit_signal = current_bar['RSI'] > 50
-                stop_loss = pnl_pct < -0.02
-                take_profit = pnl_pct > 0.05
+                exit_signal = signals.exit[i]
+                stop_loss = pnl_pct < -signals.stop_loss
+                take_profit = pnl_pct > signals.take_profit
                 
                 if exit_signal or stop_loss or take_profit:
                     reason = "signal"
                     if stop_loss: reason = "stop_loss"
                     if take_profit: reason = "take_profit"
                     
-                    pnl = (current_price - entry_price) * (initial_capital * 0.1 / entry_price) # Fixed position size logic
+                    pnl = (current_price - entry_price) * (initial_capital * signals.position_size / entry_price) # Fixed position size logic
                     
                     trade = Trade(
                         entry_time=df.iloc[entry_idx]['timestamp'],
@@ -100,16 +254,10 @@ class Backtester:
                     capital += pnl
                     position = None
         
-        # Calculate metrics
-        metrics = self._calculate_metrics(trades, initial_capital, df)
-        
-        return {
-            'trades': [t.__dict__ for t in trades],
-            'metrics': metrics,
-            'final_capital': capital
-        }
+        return trades, capital
     
-    def _calculate_metrics(self, trades: List[Trade], 
+    @staticmethod
+    def _calculate_metrics(trades: List[Trade], 
                           initial_capital: float,
                           df: pd.DataFrame) -> Dict:
         """Comprehensive performance metrics"""
@@ -0,0 +1,280 @@
+import glob
+import logging
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from services.ohlcv_cache import PRICE_COLUMNS, last_wins_order
+from services.storage import EXPORT_CHUNK_ROWS, StorageEngine
+from services.timeframes import timeframe_to_ms
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_DELTAS = 8
+
+SCHEMA = pa.schema(
+    [('timestamp', pa.int64())] + [(col, pa.float64()) for col in PRICE_COLUMNS]
+)
+
+def partition_unit(timeframe: str) -> str:
+    """Monthly files for intraday candles, yearly for daily and above"""
+    return 'Y' if timeframe_to_ms(timeframe) >= 86_400_000 else 'M'
+
+class ColumnarStorageEngine(StorageEngine):
+    """StorageEngine with OHLCV kept in partitioned Arrow IPC files.
+
+    Each symbol/timeframe is split into monthly (or yearly) files of plain
+    int64/float64 columns under `data_dir`. Files are uncompressed, so reads
+    memory-map them and slice the column buffers without decoding. SQLite
+    still holds everything else, plus an `ohlcv_partitions` index of each
+    file's time range. Writes merge into the affected partitions and replace
+    them atomically; unchanged partitions are not rewritten.
+
+    Writes to an existing partition land in a small delta file next to it
+    (`<partition>.dNNNNNN.arrow`) holding only the written rows, so frequent
+    updates of the newest candle cost O(rows written). Reads overlay the
+    deltas on the partition, newest last. Once `max_deltas` accumulate the
+    partition is compacted: rewritten once with them merged in, and the
+    deltas removed.
+    """
+
+    def __init__(self, db_path: str, data_dir: str, max_deltas: int = DEFAULT_MAX_DELTAS, **kwargs):
+        self.data_dir = data_dir
+        self.max_deltas = max_deltas
+        os.makedirs(data_dir, exist_ok=True)
+        self._write_lock = threading.Lock()
+        super().__init__(db_path, **kwargs)
+
+    def _init_schema(self):
+        super()._init_schema()
+        with self.get_conn() as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS ohlcv_partitions (
+                symbol TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                partition TEXT NOT NULL,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                PRIMARY KEY(symbol, timeframe, partition)
+            );
+            """)
+
+    def partition_path(self, symbol: str, timeframe: str, partition: str) -> str:
+        return os.path.join(self.data_dir, quote(symbol, safe=''), timeframe, f"{partition}.arrow")
+
+    @staticmethod
+    def _read_file(path: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Zero-copy views over a memory-mapped partition"""
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        arrays = {name: table.column(name).chunk(0).to_numpy(zero_copy_only=True)
+                  for name in SCHEMA.names}
+        return arrays.pop('timestamp'), arrays
+
+    @staticmethod
+    def _delta_paths(path: str) -> List[str]:
+        """Delta files of a partition, oldest first"""
+        return sorted(glob.glob(glob.escape(path[:-len('.arrow')]) + ".d[0-9]*.arrow"))
+
+    def _read_partition(self, path: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """A partition with its deltas applied; zero-copy when it has none"""
+        while True:
+            deltas = self._delta_paths(path)
+            try:
+                timestamps, prices = self._read_file(path)
+                if not deltas:
+                    return timestamps, prices
+                parts = [(timestamps, prices)] + [self._read_file(delta) for delta in deltas]
+            except FileNotFoundError:
+                if not deltas:
+                    raise
+                continue  # compacted meanwhile; the partition now holds the deltas
+            merged_ts = np.concatenate([part[0] for part in parts])
+            order = last_wins_order(merged_ts)
+            return merged_ts[order], {col: np.concatenate([part[1][col] for part in parts])[order]
+                                      for col in PRICE_COLUMNS}
+
+    def _lookup(self, paths: List[str], timestamps: np.ndarray) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Which of `timestamps` the files hold and their current values
+        (later files win); only the matching rows are read"""
+        found = np.zeros(len(timestamps), dtype=bool)
+        values = {col: np.full(len(timestamps), np.nan) for col in PRICE_COLUMNS}
+        for path in paths:
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            file_ts = table.column('timestamp').chunk(0).to_numpy(zero_copy_only=True)
+            if not len(file_ts):
+                continue
+            pos = np.minimum(np.searchsorted(file_ts, timestamps), len(file_ts) - 1)
+            hit = file_ts[pos] == timestamps
+            if not hit.any():
+                continue
+            found |= hit
+            rows = pa.array(pos[hit])
+            for col in PRICE_COLUMNS:
+                values[col][hit] = table.column(col).chunk(0).take(rows).to_numpy()
+        return found, values
+
+    @staticmethod
+    def _write_file(path: str, timestamps: np.ndarray, prices: Dict[str, np.ndarray]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        batch = pa.record_batch([pa.array(timestamps)] + [pa.array(prices[c]) for c in PRICE_COLUMNS],
+                                schema=SCHEMA)
+        tmp_path = f"{path}.tmp"
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, SCHEMA) as writer:
+                writer.write_batch(batch)
+        # Readers holding the old mapping keep a consistent snapshot
+        os.replace(tmp_path, path)
+
+    def _write_ohlcv(self, symbol: str, timeframe: str,
+                     timestamps: np.ndarray, prices: Dict[str, np.ndarray]):
+        order = last_wins_order(timestamps)
+        timestamps = timestamps[order]
+        prices = {col: values[order] for col, values in prices.items()}
+
+        keys = timestamps.astype('datetime64[ms]').astype(f"datetime64[{partition_unit(timeframe)}]")
+        bounds = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True])
+
+        with self._write_lock:
+            replaced, extended = [], []
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                partition = str(keys[lo])
+                path = self.partition_path(symbol, timeframe, partition)
+                new_ts = timestamps[lo:hi]
+                new_prices = {col: values[lo:hi] for col, values in prices.items()}
+
+                if not os.path.exists(path):
+                    self._write_file(path, new_ts, new_prices)
+                    replaced.append((symbol, timeframe, partition, int(new_ts[0]), int(new_ts[-1]), len(new_ts)))
+                    continue
+
+                deltas = self._delta_paths(path)
+                found, current = self._lookup([path] + deltas, new_ts)
+                if found.all() and all(np.array_equal(current[col], new_prices[col]) for col in PRICE_COLUMNS):
+                    continue
+
+                sequence = int(deltas[-1][:-len('.arrow')].rsplit('.d', 1)[1]) + 1 if deltas else 1
+                delta = f"{path[:-len('.arrow')]}.d{sequence:06d}.arrow"
+                self._write_file(delta, new_ts, new_prices)
+                if len(deltas) + 1 < self.max_deltas:
+                    extended.append((symbol, timeframe, partition, int(new_ts[0]), int(new_ts[-1]),
+                                     int((~found).sum())))
+                    continue
+
+                # Compact: the partition is replaced before its deltas go, so
+                # a reader never misses rows (re-applying a delta is harmless)
+                merged_ts, merged = self._read_partition(path)
+                self._write_file(path, merged_ts, merged)
+                for old in deltas + [delta]:
+                    os.remove(old)
+                replaced.append((symbol, timeframe, partition, int(merged_ts[0]), int(merged_ts[-1]),
+                                 len(merged_ts)))
+
+            if replaced or extended:
+                with self.get_conn() as conn:
+                    conn.executemany("""
+                        INSERT OR REPLACE INTO ohlcv_partitions
+                        (symbol, timeframe, partition, start_ts, end_ts, rows)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, replaced)
+                    conn.executemany("""
+                        UPDATE ohlcv_partitions
+                        SET start_ts = MIN(start_ts, ?4), end_ts = MAX(end_ts, ?5), rows = rows + ?6
+                        WHERE symbol = ?1 AND timeframe = ?2 AND partition = ?3
+                    """, extended)
+
+    def _query_ohlcv(self, symbol: str, timeframe: str,
+                     start: int = None, end: int = None, limit: int = None) -> pd.DataFrame:
+        query = "SELECT partition FROM ohlcv_partitions WHERE symbol = ? AND timeframe = ?"
+        params = [symbol, timeframe]
+        if start:
+            query += " AND end_ts >= ?"
+            params.append(start)
+        if end:
+            query += " AND start_ts <= ?"
+            params.append(end)
+        # With a limit, walk partitions newest first and stop once it is met
+        query += " ORDER BY start_ts DESC" if limit else " ORDER BY start_ts ASC"
+        with self.get_conn() as conn:
+            partitions = [row[0] for row in conn.execute(query, params).fetchall()]
+
+        pieces = []
+        remaining = limit or None
+        for partition in partitions:
+            timestamps, prices = self._read_partition(self.partition_path(symbol, timeframe, partition))
+            lo = int(np.searchsorted(timestamps, start, 'left')) if start else 0
+            hi = int(np.searchsorted(timestamps, end, 'right')) if end else len(timestamps)
+            if remaining is not None:
+                lo = max(lo, hi - remaining)
+                remaining -= hi - lo
+            pieces.append((timestamps[lo:hi], {col: values[lo:hi] for col, values in prices.items()}))
+            if remaining == 0:
+                break
+        if limit:
+            pieces.reverse()
+
+        # The one copy: out of the mapped files into the result frame
+        data = {'timestamp': np.concatenate([p[0] for p in pieces]) if pieces else np.empty(0, np.int64)}
+        for col in PRICE_COLUMNS:
+            data[col] = np.concatenate([p[1][col] for p in pieces]) if pieces else np.empty(0)
+        return pd.DataFrame(data)
+
+    def _iter_ohlcv(self, symbol: str, timeframe: str, start: int = None, end: int = None,
+                    chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        # One partition mapped at a time, sliced into chunks
+        query = "SELECT partition FROM ohlcv_partitions WHERE symbol = ? AND timeframe = ?"
+        params = [symbol, timeframe]
+        if start:
+            query += " AND end_ts >= ?"
+            params.append(start)
+        if end:
+            query += " AND start_ts <= ?"
+            params.append(end)
+        with self.get_conn() as conn:
+            partitions = [row[0] for row in conn.execute(query + " ORDER BY start_ts ASC", params).fetchall()]
+
+        for partition in partitions:
+            timestamps, prices = self._read_partition(self.partition_path(symbol, timeframe, partition))
+            lo = int(np.searchsorted(timestamps, start, 'left')) if start else 0
+            hi = int(np.searchsorted(timestamps, end, 'right')) if end else len(timestamps)
+            for offset in range(lo, hi, chunk_rows):
+                stop = min(offset + chunk_rows, hi)
+                data = {'timestamp': timestamps[offset:stop]}
+                data.update((col, values[offset:stop]) for col, values in prices.items())
+                yield pd.DataFrame(data, copy=True)
+
+    def _query_timestamps(self, symbol: str, timeframe: str,
+                          start: int = None, end: int = None) -> np.ndarray:
+        return self._query_ohlcv(symbol, timeframe, start, end)['timestamp'].to_numpy(dtype=np.int64)
+
+    def _query_last_timestamp(self, symbol: str, timeframe: str) -> Optional[int]:
+        with self.get_conn() as conn:
+            result = conn.execute("""
+                SELECT MAX(end_ts) FROM ohlcv_partitions WHERE symbol = ? AND timeframe = ?
+            """, (symbol, timeframe)).fetchone()
+            return result[0] if result else None
+
+    def _query_symbols(self, timeframe: str) -> List[str]:
+        with self.get_conn() as conn:
+            rows = conn.execute("SELECT DISTINCT symbol FROM ohlcv_partitions WHERE timeframe = ?",
+                                (timeframe,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_ohlcv_many(self, symbols: List[str], timeframe: str,
+                       start: int = None, end: int = None) -> pd.DataFrame:
+        """Retrieve several symbols, long format with a symbol column"""
+        frames = []
+        for symbol in symbols:
+            df = self.get_ohlcv(symbol, timeframe, start, end)
+            df.insert(0, 'symbol', symbol)
+            frames.append(df)
+        if not frames:
+            return pd.DataFrame(columns=['symbol', 'timestamp'] + list(PRICE_COLUMNS))
+        return pd.concat(frames, ignore_index=True)
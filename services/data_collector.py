@@ -1,84 +1,232 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import List
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import yaml
+
 from services.storage import StorageEngine
 from services.data_fetcher import DataFetcher
+from services.backfill import Backfiller
+from services.rate_limit import TokenBucket
+from services.timeframes import candle_open, next_candle_close, timeframe_to_ms
 
 logger = logging.getLogger(__name__)
 
+# History kept complete when `history_days` isn't configured, in candles
+INITIAL_LIMIT = 500
+
+@dataclass
+class CollectionTask:
+    """Schedule and metrics for one (symbol, timeframe)"""
+    symbol: str
+    timeframe: str
+    next_run: float
+    running: bool = False
+    runs: int = 0
+    errors: int = 0
+    empty_fetches: int = 0
+    last_rows: int = 0
+    last_latency_sec: Optional[float] = None
+    last_lag_sec: Optional[float] = None
+    last_completed: Optional[float] = None
+    last_error: Optional[str] = None
+    last_backfill: Optional[Dict] = None
+    live_skips: int = 0
+
+def watchlist_pairs(watchlists: List[dict], resampler=None) -> Set[Tuple[str, str]]:
+    """(symbol, timeframe) pairs to keep current from the exchange"""
+    pairs = set()
+    for watchlist in watchlists:
+        for asset in watchlist.get('assets', []):
+            timeframes = asset.get('timeframes', ['1h'])
+            for timeframe in timeframes:
+                # Built locally from the base candles, no exchange calls needed
+                if resampler and resampler.is_derived(timeframe) and resampler.base_timeframe in timeframes:
+                    continue
+                pairs.add((asset['symbol'], timeframe))
+    return pairs
+
+def exchange_request_rate(fetcher: DataFetcher, collector_config: dict) -> float:
+    """Requests/sec for the token bucket.
+
+    An explicit `max_requests_per_sec` wins; otherwise use a fraction of the
+    exchange's published CCXT rateLimit (ms between requests) to leave
+    headroom for API-triggered fetches.
+    """
+    if collector_config.get('max_requests_per_sec'):
+        return float(collector_config['max_requests_per_sec'])
+    rate_limit_ms = getattr(getattr(fetcher, 'exchange', None), 'rateLimit', None) or 1000
+    return 1000.0 / rate_limit_ms * collector_config.get('rate_limit_fraction', 0.8)
+
 class DataCollector:
-    def __init__(self, storage: StorageEngine, fetcher: DataFetcher, config: dict):
+    """Keeps watchlist candles current with a candle-close scheduler.
+
+    Every (symbol, timeframe) is due shortly after its candle closes (1m every
+    minute, 1d once a day). The first run of each pair backfills its history
+    window (`history_days`), interior gaps included; later runs fetch from
+    the last stored candle and fall back to a paged backfill when too far
+    behind for one request. Due fetches run concurrently, bounded by
+    `max_concurrency` and a token bucket sized from the exchange's rate
+    limit. Each task records fetch latency and lag, i.e. how long after the
+    candle close the data was stored.
+    """
+
+    def __init__(self, storage: StorageEngine, fetcher: DataFetcher, config: dict,
+                 clock: Callable[[], float] = time.time):
         self.storage = storage
         self.fetcher = fetcher
         self.config = config
+        self.clock = clock
         self.running = False
         self.watchlists = self._load_watchlists()
-        
-    def _load_watchlists(self):
-        # In a real app, this might reload from file or be passed in
-        # For now, we assume config has watchlist info or we load it
-        # The main config has 'watchlist_file', but we need to load it.
-        # We'll assume the caller passes the loaded watchlists or we load them here.
-        # For simplicity, we'll assume config has a 'watchlists' key if merged, 
-        # or we just use a simple list for now.
-        return self.config.get('watchlists', [])
-    
+        resampler = getattr(storage, 'resampler', None)
+        if resampler is not None:
+            # Derived timeframes are only built where the base candles are collected
+            resampler.collect(asset['symbol'] for watchlist in self.watchlists
+                              for asset in watchlist.get('assets', [])
+                              if resampler.base_timeframe in asset.get('timeframes', ['1h']))
+
+        collector_config = config.get('data_sources', {}).get('collector', {})
+        # Exchanges finalize a candle shortly after its close
+        self.close_delay_sec = collector_config.get('close_delay_sec', 2.0)
+        self.rate_limiter = TokenBucket(exchange_request_rate(fetcher, collector_config),
+                                        collector_config.get('burst'))
+        self._semaphore = asyncio.Semaphore(collector_config.get('max_concurrency', 8))
+        self.history_days = collector_config.get('history_days')
+        self.backfiller = Backfiller(storage, fetcher, self.rate_limiter,
+                                     page_limit=collector_config.get('backfill_page_limit', 1000),
+                                     max_concurrency=collector_config.get('max_concurrency', 8))
+        self.tasks: Dict[Tuple[str, str], CollectionTask] = {}
+        self._in_flight = set()
+        # Optional push feed (StreamIngestor); pairs it covers skip REST polls
+        self.live_feed = None
+
+    def _load_watchlists(self) -> List[dict]:
+        watchlists = self.config.get('watchlists', [])
+        if watchlists:
+            return watchlists
+        path = self.config.get('watchlist_file', 'config/watchlists.yaml')
+        try:
+            with open(path, "r") as f:
+                return (yaml.safe_load(f) or {}).get('watchlists', [])
+        except Exception as e:
+            logger.error(f"Failed to load watchlists: {e}")
+            return []
+
+    def pairs(self) -> Set[Tuple[str, str]]:
+        return watchlist_pairs(self.watchlists, getattr(self.storage, 'resampler', None))
+
+    def build_tasks(self, now: float):
+        """(Re)create the task table from the watchlists; new pairs are due now"""
+        wanted = self.pairs()
+        for key in wanted - self.tasks.keys():
+            self.tasks[key] = CollectionTask(symbol=key[0], timeframe=key[1], next_run=now)
+        for key in self.tasks.keys() - wanted:
+            del self.tasks[key]
+
+    def next_run(self, timeframe: str, now: float) -> float:
+        """Just after the close of the candle open at `now`"""
+        return next_candle_close(int(now * 1000), timeframe) / 1000 + self.close_delay_sec
+
+    def fetch_limit(self, timeframe: str, last_ts: int, now: float) -> int:
+        """Candles from the last stored one (which may have been in progress) to now"""
+        return int(max((int(now * 1000) - last_ts) // timeframe_to_ms(timeframe) + 1, 2))
+
+    def history_start(self, timeframe: str, now: float) -> int:
+        """Oldest candle the collector keeps complete"""
+        if self.history_days:
+            return int((now - self.history_days * 86400) * 1000)
+        return candle_open(int(now * 1000), timeframe) - (INITIAL_LIMIT - 1) * timeframe_to_ms(timeframe)
+
+    def launch_due(self, now: float) -> List[asyncio.Task]:
+        """Start every task whose time has come and that isn't still running"""
+        launched = []
+        for task in self.tasks.values():
+            if task.running or task.next_run > now:
+                continue
+            due = task.next_run
+            task.next_run = self.next_run(task.timeframe, now)
+            # History is still backfilled once; after that the feed keeps it current
+            if task.runs and self.live_feed is not None and self.live_feed.covers(task.symbol, task.timeframe):
+                task.live_skips += 1
+                continue
+            task.running = True
+            job = asyncio.create_task(self._collect(task, due))
+            self._in_flight.add(job)
+            job.add_done_callback(self._in_flight.discard)
+            launched.append(job)
+        return launched
+
+    async def _collect(self, task: CollectionTask, due: float):
+        try:
+            async with self._semaphore:
+                started = self.clock()
+                last_ts = await asyncio.to_thread(self.storage.get_last_timestamp, task.symbol, task.timeframe)
+                limit = self.fetch_limit(task.timeframe, last_ts, started) if last_ts is not None else None
+                if task.runs == 0 or limit is None or limit > self.backfiller.page_limit:
+                    # First pass, or too far behind for one request: page through
+                    # the missing ranges (including interior gaps on the first pass)
+                    start = self.history_start(task.timeframe, started) if task.runs == 0 or last_ts is None \
+                        else last_ts
+                    end = next_candle_close(int(started * 1000), task.timeframe)
+                    task.last_backfill = await self.backfiller.backfill(task.symbol, task.timeframe, start, end)
+                    rows = task.last_backfill['rows']
+                else:
+                    # The backfiller takes a token per page itself
+                    await self.rate_limiter.acquire()
+                    df = await self.fetcher.fetch_ohlcv(task.symbol, task.timeframe, limit=limit, since=last_ts)
+                    if not df.empty:
+                        await asyncio.to_thread(self.storage.store_ohlcv, task.symbol, task.timeframe, df)
+                    rows = len(df)
+                if rows == 0:
+                    task.empty_fetches += 1
+                finished = self.clock()
+            task.runs += 1
+            task.last_rows = rows
+            task.last_latency_sec = finished - started
+            task.last_lag_sec = max(finished - due, 0.0)
+            task.last_completed = finished
+            logger.debug(f"Stored {rows} rows for {task.symbol} {task.timeframe} "
+                         f"in {task.last_latency_sec:.2f}s")
+        except Exception as e:
+            task.errors += 1
+            task.last_error = str(e)
+            logger.error(f"Collection error for {task.symbol} {task.timeframe}: {e}")
+        finally:
+            task.running = False
+
     async def run_forever(self):
         """Background collection loop"""
         self.running = True
         logger.info("Starting DataCollector background loop...")
-        
+        self.build_tasks(self.clock())
+
         while self.running:
-            try:
-                poll_interval = self.config.get('data_sources', {}).get('poll_intervals', {}).get('ohlcv', 60)
-                
-                # Iterate through watchlists
-                # Note: This depends on how config is structured. 
-                # If config is just main.yaml, we might need to load watchlists.yaml
-                # But for now, let's assume we just fetch for a hardcoded list or what's in config
-                # if passed.
-                
-                # We'll try to load watchlists if not present
-                if not self.watchlists:
-                    import yaml
-                    try:
-                        with open("config/watchlists.yaml", "r") as f:
-                            wl_data = yaml.safe_load(f)
-                            self.watchlists = wl_data.get('watchlists', [])
-                    except Exception as e:
-                        logger.error(f"Failed to load watchlists: {e}")
-                
-                for watchlist in self.watchlists:
-                    for asset in watchlist.get('assets', []):
-                        symbol = asset['symbol']
-                        timeframes = asset.get('timeframes', ['1h'])
-                        
-                        for timeframe in timeframes:
-                            # Check last stored timestamp
-                            last_ts = self.storage.get_last_timestamp(symbol, timeframe)
-                            
-                            # Determine limit based on last_ts
-                            limit = 500
-                            if last_ts:
-                                # Calculate how many candles we missed
-                                # This is complex without knowing timeframe duration in ms
-                                # For now, just fetch recent 50
-                                limit = 50
-                            
-                            # Fetch new data
-                            logger.info(f"Fetching {symbol} {timeframe}...")
-                            new_data = await self.fetcher.fetch_ohlcv(symbol, timeframe, limit=limit)
-                            
-                            if not new_data.empty:
-                                self.storage.store_ohlcv(symbol, timeframe, new_data)
-                                logger.info(f"Stored {len(new_data)} rows for {symbol} {timeframe}")
-                
-                await asyncio.sleep(poll_interval)
-            
-            except Exception as e:
-                logger.error(f"Collection error: {e}")
-                await asyncio.sleep(60)  # Backoff on error
-    
+            now = self.clock()
+            self.launch_due(now)
+            next_due = min((t.next_run for t in self.tasks.values() if not t.running), default=now + 1)
+            # Wake at least every second so stop() takes effect promptly
+            await asyncio.sleep(min(max(next_due - now, 0.05), 1.0))
+
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
     def stop(self):
         self.running = False
+
+    def metrics(self) -> Dict:
+        now = self.clock()
+        return {
+            'running': self.running,
+            'in_flight': len(self._in_flight),
+            'rate_limiter': self.rate_limiter.stats(),
+            'tasks': {
+                f"{task.symbol} {task.timeframe}": {
+                    **asdict(task),
+                    'next_run_in_sec': round(max(task.next_run - now, 0.0), 3),
+                }
+                for task in sorted(self.tasks.values(), key=lambda t: (t.symbol, timeframe_to_ms(t.timeframe)))
+            },
+        }
@@ -18,9 +18,11 @@ class DataFetcher:
         if self.exchange:
             await self.exchange.close()
 
-    async def fetch_ohlcv(self, symbol: str, timeframe: str, limit: int = 500) -> pd.DataFrame:
+    async def fetch_ohlcv(self, symbol: str, timeframe: str, limit: int = 500,
+                          since: Optional[int] = None) -> pd.DataFrame:
         """
         Fetches OHLCV data via CCXT and returns a DataFrame.
+        With `since` (ms), returns up to `limit` candles opening at or after it.
         """
         # Ensure symbol format (e.g., BTC/USDT)
         if '/' not in symbol:
@@ -31,7 +33,7 @@ class DataFetcher:
                 logger.warning(f"Timeframe {timeframe} not supported by {self.exchange_id}")
                 return pd.DataFrame()
 
-            ohlcv = await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+            ohlcv = await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit)
             
             df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
             return df
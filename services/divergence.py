@@ -0,0 +1,67 @@
+from typing import Dict, List
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# (direction, kind) -> (pivots on, price relation, oscillator relation)
+# between the earlier and the later pivot
+DIVERGENCES = {
+    ('bullish', 'regular'): ('low', np.less, np.greater),      # lower low, higher oscillator low
+    ('bullish', 'hidden'): ('low', np.greater, np.less),       # higher low, lower oscillator low
+    ('bearish', 'regular'): ('high', np.greater, np.less),     # higher high, lower oscillator high
+    ('bearish', 'hidden'): ('high', np.less, np.greater),      # lower high, higher oscillator high
+}
+
+def find_pivots(values: np.ndarray, left: int = 5, right: int = 5, highs: bool = True) -> np.ndarray:
+    """Indices of swing highs (or lows): bars that are the extreme of the
+    `left` bars before and `right` bars after them.
+
+    One argmax/argmin over a sliding window view; on a plateau only the
+    first bar counts. The last `right` bars can't be confirmed yet. NaN
+    windows never pivot.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    width = left + right + 1
+    if len(values) < width:
+        return np.empty(0, dtype=np.intp)
+    filled = np.where(np.isnan(values), -np.inf if highs else np.inf, values)
+    windows = sliding_window_view(filled, width)
+    extreme = windows.argmax(axis=1) if highs else windows.argmin(axis=1)
+    centre = np.flatnonzero(extreme == left)
+    pivots = centre + left
+    return pivots[np.isfinite(filled[pivots])]
+
+def find_divergences(high: np.ndarray, low: np.ndarray, oscillators: Dict[str, np.ndarray],
+                     left: int = 5, right: int = 5, max_gap: int = 60) -> List[Dict]:
+    """Regular and hidden divergences between price swings and oscillators.
+
+    Consecutive swing lows (bullish) or highs (bearish) at most `max_gap`
+    bars apart are compared with the oscillator at the same bars. Each hit
+    reports the two pivot indices and `confirmed`, the bar at which the
+    later pivot became known (pivot + `right`), sorted by that bar.
+    """
+    pivots = {'high': find_pivots(high, left, right, highs=True),
+              'low': find_pivots(low, left, right, highs=False)}
+    prices = {'high': np.asarray(high, dtype=np.float64), 'low': np.asarray(low, dtype=np.float64)}
+    found = []
+    for name, oscillator in oscillators.items():
+        oscillator = np.asarray(oscillator, dtype=np.float64)
+        for (direction, kind), (side, price_rel, osc_rel) in DIVERGENCES.items():
+            p = pivots[side]
+            first, second = p[:-1], p[1:]
+            price, osc = prices[side], oscillator
+            with np.errstate(invalid='ignore'):
+                hit = ((second - first <= max_gap)
+                       & price_rel(price[second], price[first])
+                       & osc_rel(osc[second], osc[first]))
+            for i, j in zip(first[hit].tolist(), second[hit].tolist()):
+                found.append({'indicator': name, 'direction': direction, 'kind': kind,
+                              'start': i, 'end': j, 'confirmed': j + right})
+    found.sort(key=lambda d: (d['confirmed'], d['indicator'], d['direction'], d['kind']))
+    return found
+
+def recent_divergences(high: np.ndarray, low: np.ndarray, oscillators: Dict[str, np.ndarray],
+                       within: int, left: int = 5, right: int = 5, max_gap: int = 60) -> List[Dict]:
+    """Divergences confirmed in the last `within` bars"""
+    return [d for d in find_divergences(high, low, oscillators, left, right, max_gap)
+            if d['confirmed'] >= len(high) - within]
@@ -1,47 +1,215 @@
+import os
+import time
+import zlib
+from itertools import chain
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
 import pandas as pd
-from services.storage import StorageEngine
+from services.ohlcv_cache import PRICE_COLUMNS
+from services.storage import EXPORT_CHUNK_ROWS, StorageEngine
+
+FORMATS = ('csv', 'json', 'parquet')
+COMPRESSIONS = ('gzip', 'zstd')
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+GZIP_LEVEL = 6  # ~2x faster than 9 for a <1% larger file
+MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'parquet': 'application/vnd.apache.parquet',
+    'gzip': 'application/gzip',
+    'zstd': 'application/zstd',
+}
+
+class _ChunkSink:
+    """Write-only file object handing back what was written since the last take()"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+def export_filename(stem: str, format: str = 'csv', compression: Optional[str] = None) -> str:
+    """Parquet compresses its pages internally, so only CSV/JSON get a suffix"""
+    suffix = SUFFIXES[compression] if compression and format != 'parquet' else ''
+    return f"{stem}.{format}{suffix}"
+
+def media_type(format: str, compression: Optional[str] = None) -> str:
+    return MEDIA_TYPES[compression] if compression and format != 'parquet' else MEDIA_TYPES[format]
+
+def _encode_text(frames: Iterable[pd.DataFrame], format: str) -> Iterator[bytes]:
+    """CSV with one header, or a single JSON array of records"""
+    first = True
+    for df in frames:
+        if format == 'csv':
+            yield df.to_csv(index=False, header=first).encode()
+            first = False
+            continue
+        records = df.to_json(orient='records')[1:-1]
+        if records:
+            yield (("[" if first else ",") + records).encode()
+            first = False
+    if format == 'json':
+        yield b"[]" if first else b"]"
+
+def _or_empty_ohlcv(frames: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """`frames`, or one typed empty frame if there are none, so an empty range
+    still encodes as a CSV header or a Parquet file with the OHLCV schema"""
+    empty = True
+    for df in frames:
+        empty = False
+        yield df
+    if empty:
+        yield pd.DataFrame({'timestamp': pd.Series(dtype='int64'),
+                            **{col: pd.Series(dtype='float64') for col in PRICE_COLUMNS}})
+
+def _compressor(compression: str) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """(compress, finish) of a streaming gzip (zlib) or zstd (pyarrow) encoder"""
+    if compression == 'gzip':
+        encoder = zlib.compressobj(GZIP_LEVEL, wbits=31)  # gzip container
+        return encoder.compress, encoder.flush
+
+    import pyarrow as pa
+
+    sink = _ChunkSink()
+    stream = pa.CompressedOutputStream(pa.PythonFile(sink, mode='w'), compression)
+
+    def compress(data: bytes) -> bytes:
+        stream.write(data)
+        return sink.take()
+
+    def finish() -> bytes:
+        stream.close()
+        return sink.take()
+
+    return compress, finish
+
+def _encode_parquet(frames: Iterable[pd.DataFrame], compression: Optional[str]) -> Iterator[bytes]:
+    """One row group per frame, `compression` as the page codec"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for df in frames:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), table.schema,
+                                      compression=compression or 'snappy')
+        elif table.schema != writer.schema:
+            table = table.cast(writer.schema)
+        writer.write_table(table)
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+def stream_frames(frames: Iterable[pd.DataFrame], format: str = 'csv',
+                  compression: Optional[str] = None) -> Iterator[bytes]:
+    """Encode a sequence of frames as one CSV, JSON or Parquet document,
+    yielding its bytes as each frame is written.
+
+    Only one frame is held at a time. Parquet uses `compression` as its
+    page codec (snappy by default); CSV and JSON are gzip/zstd compressed
+    as a stream.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format: {format}")
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    if format == 'parquet':
+        yield from _encode_parquet(frames, compression)
+        return
+    if compression is None:
+        yield from _encode_text(frames, format)
+        return
+
+    compress, finish = _compressor(compression)
+    for data in _encode_text(frames, format):
+        chunk = compress(data)
+        if chunk:
+            yield chunk
+    yield finish()
 
 class DataExporter:
-    def __init__(self, storage: StorageEngine):
+    """OHLCV and backtest exports, streamed in `export.chunk_rows` chunks so
+    memory stays flat however long the range"""
+
+    def __init__(self, storage: StorageEngine, config: Optional[dict] = None):
         self.storage = storage
-    
+        export_config = (config or {}).get('export', {})
+        self.export_dir = export_config.get('dir', 'exports')
+        self.chunk_rows = export_config.get('chunk_rows', EXPORT_CHUNK_ROWS)
+
+    @staticmethod
+    def ohlcv_filename(symbol: str, timeframe: str, start: int = None, end: int = None,
+                       format: str = 'csv', compression: Optional[str] = None) -> str:
+        # Sanitize filename
+        safe_symbol = symbol.replace('/', '_')
+        return export_filename(f"{safe_symbol}_{timeframe}_{start or 'start'}_{end or 'end'}", format, compression)
+
+    def stream_ohlcv(self, symbol: str, timeframe: str, start: int = None, end: int = None,
+                     format: str = 'csv', compression: Optional[str] = None) -> Iterator[bytes]:
+        """The encoded export, read from storage chunk by chunk; an empty
+        range is a valid file with no rows"""
+        frames = self.storage.iter_ohlcv(symbol, timeframe, start, end, self.chunk_rows)
+        return stream_frames(_or_empty_ohlcv(frames), format, compression)
+
+    def _write(self, path: str, content: Iterable[bytes]):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            for data in content:
+                f.write(data)
+
     def export_ohlcv(self, symbol: str, timeframe: str,
                     start: int = None, end: int = None,
-                    format: str = 'csv') -> str:
-        """Export historical data"""
-        df = self.storage.get_ohlcv(symbol, timeframe, start, end)
-        
-        if df.empty:
+                    format: str = 'csv', compression: Optional[str] = None) -> str:
+        """Export historical data; "" if the range is empty"""
+        frames = self.storage.iter_ohlcv(symbol, timeframe, start, end, self.chunk_rows)
+        first = next(frames, None)
+        if first is None:
             return ""
-            
-        # Sanitize filename
-        safe_symbol = symbol.replace('/', '_')
-        output_path = f"exports/{safe_symbol}_{timeframe}_{start or 'start'}_{end or 'end'}.{format}"
-        
-        if format == 'csv':
-            df.to_csv(output_path, index=False)
-        elif format == 'parquet':
-            df.to_parquet(output_path, index=False)
-        elif format == 'json':
-            df.to_json(output_path, orient='records')
-        
+
+        output_path = os.path.join(self.export_dir,
+                                   self.ohlcv_filename(symbol, timeframe, start, end, format, compression))
+        self._write(output_path, stream_frames(chain([first], frames), format, compression))
         return output_path
-    
-    def export_backtest_results(self, backtest_results: dict, format: str = 'csv') -> tuple:
+
+    def export_backtest_results(self, backtest_results: dict, format: str = 'csv',
+                                compression: Optional[str] = None) -> tuple:
         """Export backtest with trade log"""
         trades = backtest_results.get('trades', [])
         metrics = backtest_results.get('metrics', {})
-        
-        trades_df = pd.DataFrame(trades)
+
+        # Trades are converted a chunk at a time, not as one frame
+        trade_frames = (pd.DataFrame(trades[i:i + self.chunk_rows])
+                        for i in range(0, len(trades), self.chunk_rows)) if trades else [pd.DataFrame()]
         metrics_df = pd.DataFrame([metrics])
-        
-        import time
+
         ts = int(time.time())
-        trades_path = f"exports/backtest_{ts}_trades.{format}"
-        metrics_path = f"exports/backtest_{ts}_metrics.{format}"
-        
-        if format == 'csv':
-            trades_df.to_csv(trades_path, index=False)
-            metrics_df.to_csv(metrics_path, index=False)
-        
+        trades_path = os.path.join(self.export_dir, export_filename(f"backtest_{ts}_trades", format, compression))
+        metrics_path = os.path.join(self.export_dir, export_filename(f"backtest_{ts}_metrics", format, compression))
+
+        self._write(trades_path, stream_frames(trade_frames, format, compression))
+        self._write(metrics_path, stream_frames([metrics_df], format, compression))
+
         return trades_path, metrics_path
@@ -0,0 +1,299 @@
+import copy
+import math
+from collections import deque, namedtuple
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Union, Any
+
+import numpy as np
+import pandas as pd
+
+NAN = float('nan')
+
+# What the calculators read from a candle; pandas rows work too
+Bar = namedtuple('Bar', 'timestamp open high low close volume')
+
+class _EWMA:
+    """EMA with adjust=False, following the same recursion as pandas' ewm"""
+
+    def __init__(self, span: int):
+        com = (span - 1) / 2.0
+        self.alpha = 1.0 / (1.0 + com)
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if self.value != self.value:
+            if x == x:
+                self.value = x
+        elif x == x and self.value != x:
+            old_wt = 1.0 - self.alpha
+            self.value = (old_wt * self.value + self.alpha * x) / (old_wt + self.alpha)
+        return self.value
+
+class _RollingStats:
+    """Fixed-window mean / sample std with O(1) add+remove (Welford).
+
+    The running moments are rebuilt from the window every RESYNC_EVERY
+    updates so rounding error cannot build up over long streams.
+    """
+    RESYNC_EVERY = 1000
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._updates = 0
+
+    def update(self, x: float):
+        self.window.append(x)
+        n = len(self.window)
+        delta = x - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (x - self.mean)
+
+        if n > self.period:
+            old = self.window.popleft()
+            n -= 1
+            delta = old - self.mean
+            self.mean -= delta / n
+            self.m2 -= delta * (old - self.mean)
+
+        self._updates += 1
+        if self._updates % self.RESYNC_EVERY == 0:
+            values = np.fromiter(self.window, dtype=np.float64)
+            self.mean = float(values.mean())
+            self.m2 = float(((values - self.mean) ** 2).sum())
+
+    @property
+    def full(self) -> bool:
+        return len(self.window) == self.period
+
+    def rolling_mean(self) -> float:
+        return self.mean if self.full else NAN
+
+    def rolling_std(self) -> float:
+        if not self.full or self.period < 2:
+            return NAN
+        return math.sqrt(max(self.m2, 0.0) / (self.period - 1))
+
+class _RollingExtreme:
+    """Rolling max or min over a fixed window using a monotonic deque"""
+
+    def __init__(self, period: int, highest: bool):
+        self.period = period
+        self.highest = highest
+        self.items = deque()  # (index, value), values monotonic
+        self.count = 0
+
+    def update(self, x: float) -> float:
+        if self.highest:
+            while self.items and self.items[-1][1] <= x:
+                self.items.pop()
+        else:
+            while self.items and self.items[-1][1] >= x:
+                self.items.pop()
+        self.items.append((self.count, x))
+        if self.items[0][0] <= self.count - self.period:
+            self.items.popleft()
+        self.count += 1
+        return self.items[0][1] if self.count >= self.period else NAN
+
+class IncrementalRSI:
+    def __init__(self, period: int = 14):
+        self.gains = _RollingStats(period)
+        self.losses = _RollingStats(period)
+        self.prev_close = NAN
+
+    def update(self, bar) -> float:
+        # Like the batch diff().where(...), the first bar counts as no change
+        delta = bar.close - self.prev_close
+        self.prev_close = bar.close
+        self.gains.update(delta if delta > 0 else 0.0)
+        self.losses.update(-delta if delta < 0 else 0.0)
+
+        gain, loss = self.gains.rolling_mean(), self.losses.rolling_mean()
+        if gain != gain or loss != loss:
+            return NAN
+        if loss == 0:
+            return NAN if gain == 0 else 100.0
+        return 100 - (100 / (1 + gain / loss))
+
+class IncrementalMACD:
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = _EWMA(fast)
+        self.slow = _EWMA(slow)
+        self.signal = _EWMA(signal)
+
+    def update(self, bar) -> Dict[str, float]:
+        macd = self.fast.update(bar.close) - self.slow.update(bar.close)
+        signal_line = self.signal.update(macd)
+        return {'macd': macd, 'signal': signal_line, 'histogram': macd - signal_line}
+
+class IncrementalBB:
+    def __init__(self, period: int = 20, std_dev: float = 2.0):
+        self.stats = _RollingStats(period)
+        self.std_dev = std_dev
+
+    def update(self, bar) -> Dict[str, float]:
+        self.stats.update(bar.close)
+        sma, std = self.stats.rolling_mean(), self.stats.rolling_std()
+        return {'upper': sma + (std * self.std_dev), 'middle': sma, 'lower': sma - (std * self.std_dev)}
+
+class IncrementalATR:
+    def __init__(self, period: int = 14):
+        self.ranges = _RollingStats(period)
+        self.prev_close = NAN
+
+    def update(self, bar) -> float:
+        true_range = bar.high - bar.low
+        if self.prev_close == self.prev_close:
+            true_range = max(true_range, abs(bar.high - self.prev_close), abs(bar.low - self.prev_close))
+        self.prev_close = bar.close
+        self.ranges.update(true_range)
+        return self.ranges.rolling_mean()
+
+class IncrementalIchimoku:
+    """Ichimoku lines for the newest bar.
+
+    chikou is the close 26 bars *ahead*, so like the batch version it is NaN
+    for the most recent 26 bars; it is always NaN here.
+    """
+
+    def __init__(self):
+        self.high_9, self.low_9 = _RollingExtreme(9, True), _RollingExtreme(9, False)
+        self.high_26, self.low_26 = _RollingExtreme(26, True), _RollingExtreme(26, False)
+        self.high_52, self.low_52 = _RollingExtreme(52, True), _RollingExtreme(52, False)
+        # Leading spans are plotted 26 bars ahead: keep the last 27 raw values
+        self.span_a = deque(maxlen=27)
+        self.span_b = deque(maxlen=27)
+
+    def update(self, bar) -> Dict[str, float]:
+        tenkan = (self.high_9.update(bar.high) + self.low_9.update(bar.low)) / 2
+        kijun = (self.high_26.update(bar.high) + self.low_26.update(bar.low)) / 2
+        self.span_a.append((tenkan + kijun) / 2)
+        self.span_b.append((self.high_52.update(bar.high) + self.low_52.update(bar.low)) / 2)
+        return {
+            'tenkan': tenkan,
+            'kijun': kijun,
+            'senkou_a': self.span_a[0] if len(self.span_a) == 27 else NAN,
+            'senkou_b': self.span_b[0] if len(self.span_b) == 27 else NAN,
+            'chikou': NAN,
+        }
+
+INCREMENTAL_INDICATORS = {
+    'RSI': IncrementalRSI,
+    'MACD': IncrementalMACD,
+    'BB': IncrementalBB,
+    'ATR': IncrementalATR,
+    'ICHIMOKU': IncrementalIchimoku,
+}
+
+class _IndicatorState:
+    def __init__(self, calculator):
+        self.calculator = calculator
+        self.last_timestamp: Optional[int] = None
+        self.last_value: Any = None
+
+class IncrementalIndicatorEngine:
+    """Stateful indicators that only process candles they have not seen.
+
+    State is kept per (symbol, timeframe, indicator, params) and each new bar
+    costs O(1): EMAs for MACD, rolling sums for RSI/BB/ATR and monotonic
+    deques for the Ichimoku highs/lows. Output matches
+    IndicatorEngine.calculate_all on the same history.
+    """
+
+    def __init__(self):
+        self._states: Dict[tuple, _IndicatorState] = {}
+
+    @staticmethod
+    def key(symbol: str, timeframe: str, indicator: str, params: Optional[Dict] = None) -> tuple:
+        return (symbol, timeframe, indicator.upper(), tuple(sorted((params or {}).items())))
+
+    def _state(self, symbol: str, timeframe: str, indicator: str, params: Dict) -> Optional[_IndicatorState]:
+        name = indicator.upper()
+        if name not in INCREMENTAL_INDICATORS:
+            return None
+        key = self.key(symbol, timeframe, name, params)
+        if key not in self._states:
+            self._states[key] = _IndicatorState(INCREMENTAL_INDICATORS[name](**params))
+        return self._states[key]
+
+    def update(self, symbol: str, timeframe: str, df: pd.DataFrame,
+               indicators: List[str],
+               params: Optional[Dict[str, Dict]] = None) -> Dict[str, Union[pd.Series, pd.DataFrame]]:
+        """Feed candles and return indicator values for the rows that were new.
+
+        Rows at or before an indicator's last seen timestamp are skipped, so
+        callers can pass overlapping windows. Results are aligned to the new
+        rows' index, shaped like IndicatorEngine.calculate_all.
+        """
+        params = params or {}
+        results = {}
+        for indicator in indicators:
+            state = self._state(symbol, timeframe, indicator, params.get(indicator, {}))
+            if state is None:
+                continue
+
+            new_rows = df if state.last_timestamp is None else df[df['timestamp'] > state.last_timestamp]
+            values = [state.calculator.update(bar) for bar in new_rows.itertuples(index=False)]
+            if len(new_rows):
+                state.last_timestamp = int(new_rows['timestamp'].iloc[-1])
+                state.last_value = values[-1]
+
+            if values and isinstance(values[0], dict):
+                results[indicator] = pd.DataFrame(values, index=new_rows.index)
+            else:
+                results[indicator] = pd.Series(values, index=new_rows.index, dtype=np.float64)
+        return results
+
+    def advance(self, symbol: str, timeframe: str, bars: List[Bar],
+                indicators: List[str], params: Optional[Dict[str, Dict]] = None) -> Dict[str, Any]:
+        """Commit a few bars and return each indicator's latest value.
+
+        Same skipping rules as update(), without building frames, for
+        callers that poll a handful of new candles at a time.
+        """
+        params = params or {}
+        results = {}
+        for indicator in indicators:
+            state = self._state(symbol, timeframe, indicator, params.get(indicator, {}))
+            if state is None:
+                continue
+            for bar in bars:
+                if state.last_timestamp is None or bar.timestamp > state.last_timestamp:
+                    state.last_value = state.calculator.update(bar)
+                    state.last_timestamp = int(bar.timestamp)
+            results[indicator] = state.last_value
+        return results
+
+    def peek(self, symbol: str, timeframe: str, bar: Union[Dict[str, float], Bar],
+             indicators: List[str],
+             params: Optional[Dict[str, Dict]] = None) -> Dict[str, Any]:
+        """Values for an in-progress candle without committing it to state"""
+        params = params or {}
+        candle = SimpleNamespace(**bar) if isinstance(bar, dict) else bar
+        results = {}
+        for indicator in indicators:
+            state = self._state(symbol, timeframe, indicator, params.get(indicator, {}))
+            if state is not None:
+                results[indicator] = copy.deepcopy(state.calculator).update(candle)
+        return results
+
+    def latest(self, symbol: str, timeframe: str, indicator: str,
+               params: Optional[Dict] = None) -> Any:
+        state = self._states.get(self.key(symbol, timeframe, indicator, params))
+        return state.last_value if state else None
+
+    def last_timestamp(self, symbol: str, timeframe: str, indicator: str,
+                       params: Optional[Dict] = None) -> Optional[int]:
+        state = self._states.get(self.key(symbol, timeframe, indicator, params))
+        return state.last_timestamp if state else None
+
+    def reset(self, symbol: Optional[str] = None, timeframe: Optional[str] = None):
+        """Drop state, e.g. after a gap or a history rewrite"""
+        self._states = {
+            key: state for key, state in self._states.items()
+            if (symbol is not None and key[0] != symbol)
+            or (timeframe is not None and key[1] != timeframe)
+        }
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from services.ohlcv_cache import PRICE_COLUMNS
+from services.storage import StorageEngine
+from services.indicators import IndicatorEngine
+from services.timeframes import timeframe_to_ms
+
+logger = logging.getLogger(__name__)
+
+# Time-aligned indicators that can be cached, with their output columns
+# (None for single-Series indicators)
+CACHEABLE_OUTPUTS = {
+    'RSI': None,
+    'ATR': None,
+    'MACD': ['macd', 'signal', 'histogram'],
+    'BB': ['upper', 'middle', 'lower'],
+    'ICHIMOKU': ['tenkan', 'kijun', 'senkou_a', 'senkou_b', 'chikou'],
+}
+# Windows remembered for admission; a window is stored on its second request
+REQUESTED_WINDOWS = 4096
+
+class IndicatorCache:
+    """Read-through cache for IndicatorEngine results backed by indicators_cache.
+
+    Entries are keyed by symbol, timeframe, indicator name and parameters.
+    Rolling and EWM warm-up depends on where a computation started, so each
+    entry holds exactly one computation, with a fingerprint of the candles
+    it read. A request is served from storage only for the same window with
+    the same fingerprint, so gap fills and revised candles are noticed and
+    cached values always equal IndicatorEngine on the same candles. The
+    newest candle may still be forming, so it is only trusted for
+    `storage.cache_ttl_sec` unless it had already closed when computed.
+
+    A window is only written on its second request: a sliding tail (a new
+    candle each call) would otherwise rewrite the series on every call for
+    no hits. Series not recomputed within `storage.auto_cleanup_days` are
+    purged periodically.
+    """
+
+    CLEANUP_INTERVAL_SEC = 3600
+
+    def __init__(self, storage: StorageEngine, config: dict):
+        self.storage = storage
+        storage_config = config.get('storage', {})
+        self.ttl_sec = storage_config.get('cache_ttl_sec', 300)
+        self.cleanup_days = storage_config.get('auto_cleanup_days')
+        self._last_cleanup = 0.0
+        self._requested: "OrderedDict[tuple, None]" = OrderedDict()
+        self._requested_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_name(indicator: str, params: Optional[Dict] = None, column: Optional[str] = None) -> str:
+        """indicator_name column value, e.g. 'MACD[fast=8,slow=21].histogram'"""
+        name = indicator.upper()
+        if params:
+            name += "[" + ",".join(f"{k}={v}" for k, v in sorted(params.items())) + "]"
+        if column:
+            name += f".{column}"
+        return name
+
+    @staticmethod
+    def fingerprint(df: pd.DataFrame) -> str:
+        """Digest of the candles' timestamps and OHLCV values"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.ascontiguousarray(df['timestamp'].to_numpy(dtype=np.int64)).tobytes())
+        for col in PRICE_COLUMNS:
+            digest.update(np.ascontiguousarray(df[col].to_numpy(dtype=np.float64)).tobytes())
+        return digest.hexdigest()
+
+    def _admit(self, key: tuple) -> bool:
+        """True if this window was requested before (recently)"""
+        with self._requested_lock:
+            if key in self._requested:
+                del self._requested[key]
+                return True
+            self._requested[key] = None
+            if len(self._requested) > REQUESTED_WINDOWS:
+                self._requested.popitem(last=False)
+            return False
+
+    def calculate_all(self, symbol: str, timeframe: str, df: pd.DataFrame,
+                      indicators: List[str],
+                      params: Optional[Dict[str, Dict]] = None) -> Dict[str, Union[pd.Series, pd.DataFrame]]:
+        """Drop-in for IndicatorEngine.calculate_all on a symbol's candles"""
+        results = {}
+        if df.empty:
+            return results
+        params = params or {}
+        timestamps = df['timestamp'].to_numpy(dtype=np.int64)
+        now = time.time()
+        fingerprint = None
+
+        computed = {}
+        for indicator in indicators:
+            method_name = f"calc_{indicator.lower()}"
+            if not hasattr(IndicatorEngine, method_name):
+                continue
+            indicator_params = params.get(indicator, {})
+            cacheable = indicator.upper() in CACHEABLE_OUTPUTS
+            if cacheable:
+                fingerprint = fingerprint or self.fingerprint(df)
+                cached = self._load(symbol, timeframe, indicator, indicator_params, df, timestamps,
+                                    fingerprint, now)
+                if cached is not None:
+                    self.hits += 1
+                    results[indicator] = cached
+                    continue
+                self.misses += 1
+            results[indicator] = getattr(IndicatorEngine, method_name)(df, **indicator_params)
+            if cacheable and self._admit((symbol, timeframe, self.cache_name(indicator, indicator_params),
+                                          int(timestamps[0]), int(timestamps[-1]), fingerprint)):
+                computed[indicator] = results[indicator]
+
+        if computed:
+            self._store(symbol, timeframe, computed, params, timestamps, fingerprint, now)
+        return results
+
+    def _names(self, indicator: str, params: Dict) -> Dict[Optional[str], str]:
+        columns = CACHEABLE_OUTPUTS[indicator.upper()] or [None]
+        return {column: self.cache_name(indicator, params, column) for column in columns}
+
+    def _load(self, symbol: str, timeframe: str, indicator: str, params: Dict,
+              df: pd.DataFrame, timestamps: np.ndarray, fingerprint: str, now: float):
+        names = self._names(indicator, params)
+        coverage = self.storage.get_indicator_coverage(symbol, timeframe, list(names.values()))
+        first, last = int(timestamps[0]), int(timestamps[-1])
+        for name in names.values():
+            if name not in coverage:
+                return None
+            start, end, computed_at, cached_fingerprint = coverage[name]
+            if start != first or end != last or cached_fingerprint != fingerprint:
+                return None
+            # The newest cached candle may have been in progress when computed
+            if last == end:
+                closed = end + timeframe_to_ms(timeframe) <= computed_at * 1000
+                if not closed and now - computed_at > self.ttl_sec:
+                    return None
+
+        rows = self.storage.get_indicator_values(symbol, timeframe, list(names.values()), first, last)
+        wide = rows.pivot(index='timestamp', columns='indicator_name', values='value') \
+            if not rows.empty else pd.DataFrame()
+        wide = wide.reindex(index=timestamps, columns=list(names.values()))
+
+        if CACHEABLE_OUTPUTS[indicator.upper()] is None:
+            return pd.Series(wide.iloc[:, 0].to_numpy(dtype=np.float64), index=df.index)
+        return pd.DataFrame({column: wide[name].to_numpy(dtype=np.float64)
+                             for column, name in names.items()}, index=df.index)
+
+    def _store(self, symbol: str, timeframe: str, computed: Dict, params: Dict[str, Dict],
+               timestamps: np.ndarray, fingerprint: str, now: float):
+        rows, coverage = [], {}
+        for indicator, data in computed.items():
+            indicator_params = params.get(indicator, {})
+            metadata = json.dumps({'params': indicator_params}) if indicator_params else None
+            for column, name in self._names(indicator, indicator_params).items():
+                values = (data if column is None else data[column]).to_numpy(dtype=np.float64)
+                # Warmup NaNs are implied by coverage and not stored (value is NOT NULL)
+                valid = ~np.isnan(values)
+                rows.extend(zip([name] * int(valid.sum()), timestamps[valid].tolist(),
+                                values[valid].tolist(), [metadata] * int(valid.sum())))
+                coverage[name] = (int(timestamps[0]), int(timestamps[-1]), fingerprint)
+
+        self.storage.store_indicator_values(symbol, timeframe, rows, coverage, now)
+        self._maybe_cleanup(now)
+
+    def _maybe_cleanup(self, now: float):
+        if not self.cleanup_days or now - self._last_cleanup < self.CLEANUP_INTERVAL_SEC:
+            return
+        self._last_cleanup = now
+        deleted = self.storage.cleanup_indicator_cache(now - self.cleanup_days * 86400)
+        if deleted:
+            logger.info(f"Removed {deleted} cached indicator values not refreshed in {self.cleanup_days} days")
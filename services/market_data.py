@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from services.storage import StorageEngine
+from services.data_fetcher import DataFetcher
+from services.rate_limit import TokenBucket
+from services.timeframes import candle_open, timeframe_to_ms
+
+logger = logging.getLogger(__name__)
+
+class MarketDataService:
+    """Read path for the chart endpoints: storage first, exchange on demand.
+
+    Candles are answered from StorageEngine (and its in-memory LRU) when the
+    stored tail is recent enough for the timeframe and covers the requested
+    window. Otherwise one live fetch refreshes storage; concurrent requests
+    for the same (symbol, timeframe) wait on that single fetch instead of
+    starting their own. Every answer carries how stale it is.
+    """
+
+    def __init__(self, storage: StorageEngine, fetcher: DataFetcher, config: dict,
+                 rate_limiter: Optional[TokenBucket] = None, clock: Callable[[], float] = time.time):
+        self.storage = storage
+        self.fetcher = fetcher
+        self.rate_limiter = rate_limiter
+        self.clock = clock
+        data_sources = config.get('data_sources', {})
+        self.max_stale_sec = data_sources.get(
+            'max_stale_sec', data_sources.get('poll_intervals', {}).get('ohlcv', 60))
+        # When storage was last brought up to date from the exchange, in ms
+        self._refreshed: Dict[Tuple[str, str], int] = {}
+        # Oldest window start a refresh asked the exchange for: candles
+        # missing from storage after it do not exist
+        self._covered: Dict[Tuple[str, str], int] = {}
+        self._in_flight: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Largest limit asked of an in-flight refresh, until its fetch starts
+        self._wanted: Dict[Tuple[str, str], int] = {}
+        # Limit of the fetch an in-flight refresh has started
+        self._fetching: Dict[Tuple[str, str], int] = {}
+        self.storage_hits = 0
+        self.refreshes = 0
+        self.coalesced = 0
+        self.refresh_errors = 0
+
+    def max_stale_ms(self, timeframe: str, max_stale_sec: Optional[float] = None) -> int:
+        """Staleness served without a refresh: one candle, capped by `max_stale_sec`"""
+        if max_stale_sec is None:
+            max_stale_sec = self.max_stale_sec
+        return min(timeframe_to_ms(timeframe), int(max_stale_sec * 1000))
+
+    @staticmethod
+    def window_start(timeframe: str, limit: int, now_ms: int) -> int:
+        """Open time of the oldest of the last `limit` candles up to now"""
+        return candle_open(now_ms, timeframe) - (limit - 1) * timeframe_to_ms(timeframe)
+
+    def _read(self, symbol: str, timeframe: str, limit: int, now_ms: int) -> pd.DataFrame:
+        return self.storage.get_ohlcv(symbol, timeframe, start=self.window_start(timeframe, limit, now_ms))
+
+    def as_of(self, symbol: str, timeframe: str, df: pd.DataFrame) -> Optional[int]:
+        """Latest time the stored candles are known to reflect the exchange.
+
+        A stored candle had opened when it was written, so its open time is a
+        lower bound even for data another process (the collector) wrote.
+        """
+        last_ts = int(df['timestamp'].iloc[-1]) if not df.empty else None
+        refreshed = self._refreshed.get((symbol, timeframe))
+        known = [t for t in (last_ts, refreshed) if t is not None]
+        return max(known) if known else None
+
+    def is_fresh(self, symbol: str, timeframe: str, df: pd.DataFrame, limit: int, now_ms: int,
+                 max_stale_sec: Optional[float] = None) -> bool:
+        as_of = self.as_of(symbol, timeframe, df)
+        if as_of is None or now_ms - as_of > self.max_stale_ms(timeframe, max_stale_sec):
+            return False
+        # A short window is fine if the exchange was asked for at least this
+        # window and had no more
+        covered = self._covered.get((symbol, timeframe))
+        return len(df) >= limit or (covered is not None and covered <= self.window_start(timeframe, limit, now_ms))
+
+    async def get_ohlcv(self, symbol: str, timeframe: str, limit: int = 500,
+                        max_stale_sec: Optional[float] = None) -> Tuple[pd.DataFrame, Dict]:
+        """Candles plus {'source', 'as_of', 'stale_sec'} describing their freshness.
+
+        `max_stale_sec` overrides the configured tolerance, e.g. for live streams.
+        """
+        now_ms = int(self.clock() * 1000)
+        df = await asyncio.to_thread(self._read, symbol, timeframe, limit, now_ms)
+        source = 'storage'
+        if self.is_fresh(symbol, timeframe, df, limit, now_ms, max_stale_sec):
+            self.storage_hits += 1
+        else:
+            source = 'exchange'
+            try:
+                await self.refresh(symbol, timeframe, limit, df)
+            except Exception as e:
+                if df.empty:
+                    raise
+                # Stale candles beat no candles; the staleness says so
+                logger.warning(f"Refresh failed for {symbol} {timeframe}, serving stored data: {e}")
+                source = 'storage'
+            else:
+                df = await asyncio.to_thread(self._read, symbol, timeframe, limit, now_ms)
+
+        as_of = self.as_of(symbol, timeframe, df)
+        now_ms = int(self.clock() * 1000)
+        return df, {
+            'source': source,
+            'as_of': as_of,
+            'stale_sec': max(now_ms - as_of, 0) / 1000 if as_of is not None else None,
+        }
+
+    async def refresh(self, symbol: str, timeframe: str, limit: int, stored: pd.DataFrame):
+        """Fetch from the exchange into storage, at most once at a time per pair.
+
+        Requests arriving before the fetch starts join it and widen it to the
+        largest limit; a longer one arriving after waits, then fetches again.
+        """
+        key = (symbol, timeframe)
+        while True:
+            task = self._in_flight.get(key)
+            if task is None or task.done():
+                self._wanted[key] = limit
+                task = asyncio.ensure_future(self._refresh(symbol, timeframe, stored))
+                self._in_flight[key] = task
+                task.add_done_callback(lambda t: self._finish(key, t))
+                break
+            if self._fetching.get(key, limit) >= limit:
+                self._wanted[key] = max(self._wanted.get(key, limit), limit)
+                self.coalesced += 1
+                break
+            # A cancelled request must not cancel the fetch others are waiting on
+            await asyncio.shield(task)
+        await asyncio.shield(task)
+
+    def _finish(self, key: Tuple[str, str], task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+            self._wanted.pop(key, None)
+            self._fetching.pop(key, None)
+
+    async def _refresh(self, symbol: str, timeframe: str, stored: pd.DataFrame):
+        key = (symbol, timeframe)
+        self.refreshes += 1
+        try:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            limit = self._fetching[key] = self._wanted.pop(key)
+            started_ms = int(self.clock() * 1000)
+            window_start = self.window_start(timeframe, limit, started_ms)
+            since = None
+            if not stored.empty and stored['timestamp'].iloc[0] <= window_start:
+                # Window start already stored: only the tail since the last stored candle
+                since = int(stored['timestamp'].iloc[-1])
+                limit = max((started_ms - since) // timeframe_to_ms(timeframe) + 1, 2)
+            df = await self.fetcher.fetch_ohlcv(symbol, timeframe, limit, since=since)
+            if not df.empty:
+                await asyncio.to_thread(self.storage.store_ohlcv, symbol, timeframe, df)
+            self._refreshed[key] = started_ms
+            self._covered[key] = min(self._covered.get(key, window_start), window_start)
+        except Exception:
+            self.refresh_errors += 1
+            raise
+
+    def stats(self) -> Dict:
+        return {
+            'storage_hits': self.storage_hits,
+            'refreshes': self.refreshes,
+            'coalesced': self.coalesced,
+            'refresh_errors': self.refresh_errors,
+            'in_flight': len(self._in_flight),
+            'max_stale_sec': self.max_stale_sec,
+        }
@@ -1,42 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Tuple
 from services.storage import StorageEngine
 from services.indicators import IndicatorEngine
+from services.divergence import recent_divergences
+from services.timeframes import candle_open
 
 class MultiTimeframeAnalyzer:
-    def __init__(self, storage: StorageEngine):
+    """Trend, strength and alignment of a symbol across timeframes.
+
+    Each timeframe reads its newest `bars` candles and is analysed on a
+    shared thread pool, so the timeframes of a symbol (and the symbols of a
+    batch) are computed concurrently. Results are cached per (symbol,
+    timeframe) until a new candle opens on that timeframe or a newer candle
+    is stored; updates to the in-progress candle do not invalidate them.
+    """
+
+    def __init__(self, storage: StorageEngine, config: Optional[dict] = None,
+                 clock: Callable[[], float] = time.time):
         self.storage = storage
-    
-    def analyze_symbol(self, symbol: str, 
-                      timeframes: List[str] = ['1h', '4h', '1d']):
-        """Cross-timeframe analysis"""
-        results = {}
-        
-        for tf in timeframes:
-            df = self.storage.get_ohlcv(symbol, tf, limit=200)
-            
-            if df.empty:
-                results[tf] = {'trend': 'unknown', 'strength': 0, 'divergences': []}
-                continue
-                
+        self.clock = clock
+        mtf_config = (config or {}).get('multi_timeframe', {})
+        self.timeframes = mtf_config.get('timeframes', ['1h', '4h', '1d'])
+        self.bars = mtf_config.get('bars', 200)
+        self.divergence = {'left': 5, 'right': 5, 'max_gap': 60, 'within': 10,
+                           **mtf_config.get('divergence', {})}
+        self._pool = ThreadPoolExecutor(max_workers=mtf_config.get('max_workers', 8),
+                                        thread_name_prefix="mtf")
+        self._lock = threading.Lock()
+        # (symbol, timeframe) -> ((current candle open, last stored candle), result)
+        self._cache: Dict[Tuple[str, str], Tuple[Tuple[int, Optional[int]], Dict]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def analyze_timeframe(self, symbol: str, timeframe: str) -> Dict:
+        """Trend, strength and divergences of one timeframe, cached per candle"""
+        key = (symbol, timeframe)
+        version = (candle_open(int(self.clock() * 1000), timeframe),
+                   self.storage.get_last_timestamp(symbol, timeframe))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == version:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        df = self.storage.get_ohlcv(symbol, timeframe, limit=self.bars)
+        if df.empty:
+            result = {'trend': 'unknown', 'strength': 0, 'divergences': []}
+        else:
             # Calculate indicators for each timeframe
-            indicators = IndicatorEngine.calculate_all(df, 
-                ['RSI', 'MACD', 'BB'])
-            
-            results[tf] = {
+            indicators = IndicatorEngine.calculate_all(df, ['RSI', 'MACD', 'BB'])
+            result = {
                 'trend': self._determine_trend(df, indicators),
                 'strength': self._calculate_strength(indicators),
                 'divergences': self._detect_divergences(df, indicators)
             }
-        
-        # Cross-timeframe alignment check
-        alignment = self._check_alignment(results)
-        
+        with self._lock:
+            self._cache[key] = (version, result)
+        return result
+
+    def _summarize(self, results: Dict[str, Dict]) -> Dict:
         return {
             'timeframes': results,
-            'alignment': alignment,
+            'alignment': self._check_alignment(results),
             'confluence_score': self._confluence_score(results)
         }
+
+    def analyze_symbol(self, symbol: str, timeframes: Optional[List[str]] = None):
+        """Cross-timeframe analysis"""
+        timeframes = timeframes or self.timeframes
+        analyses = self._pool.map(lambda tf: self.analyze_timeframe(symbol, tf), timeframes)
+        return self._summarize(dict(zip(timeframes, analyses)))
+
+    def analyze_many(self, symbols: List[str], timeframes: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """analyze_symbol for many symbols, all (symbol, timeframe) pairs in parallel"""
+        timeframes = timeframes or self.timeframes
+        pairs = [(symbol, tf) for symbol in symbols for tf in timeframes]
+        analyses = self._pool.map(lambda pair: self.analyze_timeframe(*pair), pairs)
+        by_symbol: Dict[str, Dict] = {symbol: {} for symbol in symbols}
+        for (symbol, tf), analysis in zip(pairs, analyses):
+            by_symbol[symbol][tf] = analysis
+        return {symbol: self._summarize(results) for symbol, results in by_symbol.items()}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses}
     
     def _determine_trend(self, df: pd.DataFrame, indicators: dict) -> str:
         """Trend classification based on multiple indicators"""
@@ -74,10 +126,16 @@ class MultiTimeframeAnalyzer:
         return max(0, min(100, strength))
 
     def _detect_divergences(self, df: pd.DataFrame, indicators: dict) -> List[str]:
-        """Detect simple divergences"""
-        divergences = []
-        # Placeholder logic
-        return divergences
+        """Price/RSI and price/MACD-histogram divergences confirmed in the
+        last `divergence.within` bars, e.g. 'bullish_regular_RSI'"""
+        oscillators = {}
+        if 'RSI' in indicators:
+            oscillators['RSI'] = indicators['RSI'].to_numpy(dtype=np.float64)
+        if 'MACD' in indicators:
+            oscillators['MACD'] = indicators['MACD']['histogram'].to_numpy(dtype=np.float64)
+        found = recent_divergences(df['high'].to_numpy(dtype=np.float64), df['low'].to_numpy(dtype=np.float64),
+                                   oscillators, **self.divergence)
+        return list(dict.fromkeys(f"{d['direction']}_{d['kind']}_{d['indicator']}" for d in found))
 
     def _check_alignment(self, results: Dict) -> str:
         """Check if timeframes are aligned"""
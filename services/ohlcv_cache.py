@@ -0,0 +1,171 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+def last_wins_order(timestamps: np.ndarray) -> np.ndarray:
+    """Indices that sort timestamps, keeping only the last row of duplicates"""
+    order = np.argsort(timestamps, kind='stable')
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = timestamps[order][1:] != timestamps[order][:-1]
+    return order[keep]
+
+@dataclass
+class OHLCVArrays:
+    """A full (symbol, timeframe) series as sorted columnar arrays"""
+    timestamp: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "OHLCVArrays":
+        return cls(
+            timestamp=df['timestamp'].to_numpy(dtype=np.int64),
+            columns={c: df[c].to_numpy(dtype=np.float64) for c in PRICE_COLUMNS},
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamp.nbytes + sum(a.nbytes for a in self.columns.values())
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        return int(self.timestamp[-1]) if len(self.timestamp) else None
+
+    def bounds(self, start: Optional[int] = None, end: Optional[int] = None,
+               limit: Optional[int] = None) -> Tuple[int, int]:
+        """Row range for an inclusive [start, end] time range, narrowed to its
+        newest `limit` rows"""
+        lo = int(np.searchsorted(self.timestamp, start, 'left')) if start else 0
+        hi = int(np.searchsorted(self.timestamp, end, 'right')) if end else len(self.timestamp)
+        if limit:
+            lo = max(lo, hi - limit)
+        return lo, hi
+
+    def slice(self, start: Optional[int] = None, end: Optional[int] = None,
+              limit: Optional[int] = None) -> pd.DataFrame:
+        """Same rows as `get_ohlcv`'s SQL for the range, as a fresh DataFrame"""
+        lo, hi = self.bounds(start, end, limit)
+        data = {'timestamp': self.timestamp[lo:hi]}
+        data.update((c, values[lo:hi]) for c, values in self.columns.items())
+        return pd.DataFrame(data, copy=True)
+
+    def append(self, other: "OHLCVArrays") -> "OHLCVArrays":
+        return OHLCVArrays(
+            timestamp=np.concatenate([self.timestamp, other.timestamp]),
+            columns={c: np.concatenate([self.columns[c], other.columns[c]]) for c in PRICE_COLUMNS},
+        )
+
+    def merge(self, rows: "OHLCVArrays") -> "OHLCVArrays":
+        """The series after upserting sorted, unique `rows`: existing candles
+        before the first row are kept as is, later ones are merged with the
+        rows (rows win). Re-writing the newest candle only touches the tail."""
+        if not len(self.timestamp) or rows.timestamp[0] > self.timestamp[-1]:
+            return self.append(rows)
+        cut = int(np.searchsorted(self.timestamp, rows.timestamp[0], 'left'))
+        timestamps = np.concatenate([self.timestamp[cut:], rows.timestamp])
+        order = last_wins_order(timestamps)
+        return OHLCVArrays(
+            timestamp=np.concatenate([self.timestamp[:cut], timestamps[order]]),
+            columns={c: np.concatenate([self.columns[c][:cut],
+                                        np.concatenate([self.columns[c][cut:], rows.columns[c]])[order]])
+                     for c in PRICE_COLUMNS},
+        )
+
+class OHLCVCache:
+    """LRU of whole OHLCV series, bounded by total array bytes.
+
+    Thread-safe; API handlers call storage from worker threads. Every write
+    bumps a per-key version, and a series loaded from SQLite is only admitted
+    if no write happened while it was being read. Series larger than the
+    whole budget are never admitted.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], OHLCVArrays]" = OrderedDict()
+        self._bytes = 0
+        self._versions: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[OHLCVArrays]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key: Tuple[str, str]) -> Optional[OHLCVArrays]:
+        """Lookup without touching counters or recency"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def version(self, key: Tuple[str, str]) -> int:
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def put(self, key: Tuple[str, str], entry: OHLCVArrays, version: Optional[int] = None):
+        with self._lock:
+            if version is not None and version != self._versions.get(key, 0):
+                return
+            self._remove(key)
+            self._admit(key, entry)
+
+    def write(self, key: Tuple[str, str], rows: OHLCVArrays):
+        """Reflect sorted, unique rows just upserted into SQLite by merging
+        them into the cached series"""
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            entry = self._remove(key)
+            if entry is None:
+                return
+            self._admit(key, entry.merge(rows) if len(rows.timestamp) else entry)
+
+    def invalidate(self, key: Tuple[str, str]):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            for key in self._entries:
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def _admit(self, key: Tuple[str, str], entry: OHLCVArrays):
+        if entry.nbytes > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _remove(self, key: Tuple[str, str]) -> Optional[OHLCVArrays]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+        return entry
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
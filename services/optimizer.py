@@ -0,0 +1,356 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from multiprocessing import shared_memory
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import yaml
+
+from services.backtester import Backtester, simulate_signals, strategy_warmup
+from services.strategy_compiler import CompiledStrategy, DERIVED_PERIODS, compile_strategy
+
+logger = logging.getLogger(__name__)
+
+# Signal context is this many times the longest lookback of the strategy
+CONTEXT_MULTIPLE = 2
+
+# Sweeps are started from API worker threads; forking that process would copy
+# the event loop, SQLite pool and HTTP clients mid-use into every worker
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+def load_strategy_config(name: str, directory: str = "config/strategies") -> dict:
+    """Load config/strategies/<name>.yaml"""
+    with open(os.path.join(directory, f"{name}.yaml"), "r") as f:
+        return yaml.safe_load(f)
+
+def expand_parameter_grid(ranges: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expand parameter ranges into the full list of combinations.
+
+    Each range is either an explicit list of values or a mapping with
+    min/max/step (inclusive), e.g. {min: 20, max: 35, step: 5}.
+    """
+    names, axes = [], []
+    for name, spec in ranges.items():
+        if isinstance(spec, dict):
+            lo, hi, step = spec['min'], spec['max'], spec['step']
+            if step <= 0:
+                raise ValueError(f"Step for {name} must be positive")
+            count = int(round((hi - lo) / step)) + 1
+            values = [round(lo + k * step, 10) for k in range(count)]
+            if all(isinstance(v, int) for v in (lo, hi, step)):
+                values = [int(v) for v in values]
+        elif isinstance(spec, (list, tuple)):
+            values = list(spec)
+        else:
+            values = [spec]
+        names.append(name)
+        axes.append(values)
+
+    return [dict(zip(names, combo)) for combo in itertools.product(*axes)]
+
+def apply_parameters(strategy_config: dict, overrides: Dict[str, Any]) -> dict:
+    strategy = dict(strategy_config.get('strategy', {}))
+    strategy['parameters'] = {**strategy.get('parameters', {}), **overrides}
+    return {**strategy_config, 'strategy': strategy}
+
+def strategy_columns(compiled: CompiledStrategy) -> List[str]:
+    """Rows of the shared float64 block: timestamp, close, then referenced columns"""
+    return ['timestamp', 'close'] + sorted(compiled.columns - {'close'})
+
+def load_strategy_arrays(backtester: Backtester, compiled: CompiledStrategy,
+                         symbol: str, timeframe: str, start_date: int, end_date: int):
+    """(arrays, column_names) with only the indicators the strategy references"""
+    df = backtester.load_frame(symbol, timeframe, start_date, end_date, compiled.indicators,
+                               compiled.parameters)
+    column_names = strategy_columns(compiled)
+    if df.empty:
+        return np.empty((len(column_names), 0)), column_names
+    return df[column_names].to_numpy(dtype=np.float64).T.copy(), column_names
+
+def signal_context_bars(parameters: Dict[str, Any]) -> int:
+    """Bars before a window that are included when evaluating its signals, so
+    rolling expressions such as $avg_volume are warmed up at the window start.
+
+    Scaled from the longest `*_period` parameter (or the indicator warmup)
+    rather than fixed, so long lookbacks in a grid are not cut short.
+    """
+    periods = [int(v) for k, v in {**DERIVED_PERIODS, **parameters}.items()
+               if k.endswith('_period') and isinstance(v, (int, float))]
+    return CONTEXT_MULTIPLE * max([strategy_warmup(parameters)] + periods)
+
+def _simulate_window(arrays: np.ndarray, column_names: List[str],
+                     compiled: CompiledStrategy, start: int, stop: int,
+                     overrides: Dict[str, Any], initial_capital: float,
+                     close_open: bool = False):
+    """Simulate on arrays[:, start:stop]; slices are views, not copies"""
+    context_start = max(0, start - signal_context_bars({**compiled.parameters, **overrides}))
+    view = arrays[:, context_start:stop]
+    signals = compiled.evaluate(dict(zip(column_names, view)), overrides)
+    offset = start - context_start
+    signals = replace(signals, entry=signals.entry[offset:], exit=signals.exit[offset:])
+    # Indicators were computed over the full series, so only the bars before
+    # the series' own warmup need skipping
+    warmup = max(0, strategy_warmup(compiled.parameters) - start)
+    return simulate_signals(
+        view[0, offset:].astype(np.int64), view[1, offset:], signals, initial_capital, warmup,
+        close_open)
+
+def _evaluate(arrays: np.ndarray, column_names: List[str], compiled: CompiledStrategy,
+              start: int, stop: int, overrides: Dict[str, Any],
+              initial_capital: float) -> Dict[str, Any]:
+    trades, capital = _simulate_window(arrays, column_names, compiled, start, stop,
+                                       overrides, initial_capital)
+    metrics = Backtester._calculate_metrics(trades, initial_capital, None)
+    return {
+        'parameters': overrides,
+        'total_trades': metrics.get('total_trades', 0),
+        'win_rate': metrics.get('win_rate', 0),
+        'total_return': metrics.get('total_return', 0),
+        'total_return_pct': metrics.get('total_return_pct', 0),
+        'final_capital': capital,
+    }
+
+# Worker-side state, populated once per process by _init_worker
+_worker_shm = None
+_worker_arrays = None
+_worker_context = None
+
+def _init_worker(shm_name: str, shape: tuple, column_names: List[str],
+                 strategy_config: dict, initial_capital: float):
+    global _worker_shm, _worker_arrays, _worker_context
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_arrays = np.ndarray(shape, dtype=np.float64, buffer=_worker_shm.buf)
+    # Compiled expressions are closures, so each worker compiles its own copy once
+    _worker_context = (column_names, compile_strategy(strategy_config), initial_capital)
+
+def _run_chunk(task: Tuple[int, int, int, List[Dict[str, Any]]]):
+    window_idx, start, stop, combos = task
+    column_names, compiled, initial_capital = _worker_context
+    return window_idx, [_evaluate(_worker_arrays, column_names, compiled, start, stop, c, initial_capital)
+                        for c in combos]
+
+def evaluate_windows(arrays: np.ndarray, column_names: List[str], strategy_config: dict,
+                     windows: List[Tuple[int, int]], combos: List[Dict[str, Any]],
+                     initial_capital: float, max_workers: int) -> List[List[Dict[str, Any]]]:
+    """Evaluate every combo on every [start, stop) window of `arrays`.
+
+    `arrays` holds one row per entry of `column_names`. With more than one
+    worker it is copied once into shared memory; every window of every combo
+    chunk then runs in the same pool. Returns one result list per window.
+    """
+    results = [[] for _ in windows]
+    workers = min(max_workers, len(combos) * len(windows))
+    if workers <= 1:
+        compiled = compile_strategy(strategy_config)
+        for w, (start, stop) in enumerate(windows):
+            results[w] = [_evaluate(arrays, column_names, compiled, start, stop, c, initial_capital)
+                          for c in combos]
+        return results
+
+    shm = shared_memory.SharedMemory(create=True, size=arrays.nbytes)
+    try:
+        np.ndarray(arrays.shape, dtype=np.float64, buffer=shm.buf)[:] = arrays
+
+        # A few chunks per worker keeps cores busy without per-combo IPC
+        chunk_size = max(1, len(combos) * len(windows) // (workers * 4))
+        tasks = [(w, start, stop, combos[i:i + chunk_size])
+                 for w, (start, stop) in enumerate(windows)
+                 for i in range(0, len(combos), chunk_size)]
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT,
+                                 initializer=_init_worker,
+                                 initargs=(shm.name, arrays.shape, column_names,
+                                           strategy_config, initial_capital)) as pool:
+            for window_idx, rows in pool.map(_run_chunk, tasks):
+                results[window_idx].extend(rows)
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+
+def _rank(rows: List[Dict[str, Any]], metric: str) -> List[Dict[str, Any]]:
+    rows.sort(key=lambda r: r[metric], reverse=True)
+    for rank, row in enumerate(rows, start=1):
+        row['rank'] = rank
+    return rows
+
+class ParameterSweep:
+    """Grid search over strategy parameters on a single data load.
+
+    OHLCV and indicators are loaded once, copied into a shared memory block
+    and attached by every worker at start-up, so tasks only carry the
+    parameter combinations they should evaluate.
+    """
+
+    def __init__(self, backtester: Backtester, max_workers: Optional[int] = None):
+        self.backtester = backtester
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def run(self, strategy_config: dict, symbol: str, timeframe: str,
+            start_date: int, end_date: int,
+            parameter_ranges: Optional[Dict[str, Any]] = None,
+            initial_capital: float = 10000.0,
+            metric: Optional[str] = None,
+            top_n: Optional[int] = None) -> Dict:
+        """Evaluate every combination and return rows ranked by `metric`.
+
+        Ranges default to `strategy.optimization.parameters` in the YAML.
+        """
+        optimization = strategy_config.get('strategy', {}).get('optimization', {})
+        ranges = parameter_ranges or optimization.get('parameters', {})
+        metric = metric or optimization.get('metric', 'total_return_pct')
+        if not ranges:
+            return {'error': 'No parameter ranges to sweep'}
+
+        combos = expand_parameter_grid(ranges)
+
+        arrays, column_names = load_strategy_arrays(
+            self.backtester, compile_strategy(strategy_config), symbol, timeframe, start_date, end_date)
+        if arrays.shape[1] == 0:
+            return {'error': 'No data found for backtest range'}
+
+        started = time.perf_counter()
+        results = self.evaluate(arrays, column_names, strategy_config, combos, initial_capital)
+        elapsed = time.perf_counter() - started
+        _rank(results, metric)
+
+        logger.info(f"Sweep of {len(combos)} combinations over {arrays.shape[1]} bars took {elapsed:.2f}s")
+        return {
+            'metric': metric,
+            'combinations': len(combos),
+            'bars': arrays.shape[1],
+            'elapsed_sec': elapsed,
+            'results': results[:top_n] if top_n else results,
+        }
+
+    def evaluate(self, arrays: np.ndarray, column_names: List[str], strategy_config: dict,
+                 combos: List[Dict[str, Any]], initial_capital: float) -> List[Dict[str, Any]]:
+        """Evaluate combos against the full length of `arrays`"""
+        return evaluate_windows(arrays, column_names, strategy_config, [(0, arrays.shape[1])],
+                                combos, initial_capital, self.max_workers)[0]
+
+class WalkForwardOptimizer:
+    """Walk-forward validation: optimize on one window, trade the next.
+
+    Indicators are computed once over the full range and every fold works
+    on views of those arrays. All in-sample grids run in a single process
+    pool; the winning parameters of each fold are then replayed on its
+    out-of-sample window and the results are stitched into one equity curve.
+    A position still open on a test window's last bar is closed there, so
+    each fold's capital is realised before the next one starts; those
+    trades have reason "window_end" and are counted per fold.
+    """
+
+    def __init__(self, backtester: Backtester, max_workers: Optional[int] = None):
+        self.backtester = backtester
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    @staticmethod
+    def build_folds(n_bars: int, train_bars: int, test_bars: int,
+                    step_bars: Optional[int] = None,
+                    anchored: bool = False) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """((train_start, train_stop), (test_start, test_stop)) index pairs.
+
+        Rolling windows keep a fixed train length; anchored windows always
+        train from the first bar.
+        """
+        if train_bars <= 0 or test_bars <= 0:
+            raise ValueError("train_bars and test_bars must be positive")
+        step = step_bars or test_bars
+        folds = []
+        train_stop = train_bars
+        while train_stop + test_bars <= n_bars:
+            train_start = 0 if anchored else train_stop - train_bars
+            folds.append(((train_start, train_stop), (train_stop, train_stop + test_bars)))
+            train_stop += step
+        return folds
+
+    def run(self, strategy_config: dict, symbol: str, timeframe: str,
+            start_date: int, end_date: int,
+            train_bars: Optional[int] = None,
+            test_bars: Optional[int] = None,
+            step_bars: Optional[int] = None,
+            anchored: Optional[bool] = None,
+            parameter_ranges: Optional[Dict[str, Any]] = None,
+            initial_capital: float = 10000.0,
+            metric: Optional[str] = None) -> Dict:
+        """Run every fold and return per-fold metrics plus the stitched
+        out-of-sample equity curve.
+
+        Unset arguments fall back to `strategy.optimization` and its
+        `walk_forward` block in the YAML.
+        """
+        optimization = strategy_config.get('strategy', {}).get('optimization', {})
+        walk_forward = optimization.get('walk_forward', {})
+        ranges = parameter_ranges or optimization.get('parameters', {})
+        metric = metric or optimization.get('metric', 'total_return_pct')
+        train_bars = train_bars or walk_forward.get('train_bars')
+        test_bars = test_bars or walk_forward.get('test_bars')
+        step_bars = step_bars or walk_forward.get('step_bars')
+        anchored = walk_forward.get('anchored', False) if anchored is None else anchored
+        if not ranges:
+            return {'error': 'No parameter ranges to optimize'}
+        if not train_bars or not test_bars:
+            return {'error': 'train_bars and test_bars are required'}
+
+        compiled = compile_strategy(strategy_config)
+        arrays, column_names = load_strategy_arrays(
+            self.backtester, compiled, symbol, timeframe, start_date, end_date)
+        if arrays.shape[1] == 0:
+            return {'error': 'No data found for backtest range'}
+
+        folds = self.build_folds(arrays.shape[1], train_bars, test_bars, step_bars, anchored)
+        if not folds:
+            return {'error': f'Not enough data for one fold ({arrays.shape[1]} bars)'}
+
+        combos = expand_parameter_grid(ranges)
+        started = time.perf_counter()
+        in_sample = evaluate_windows(arrays, column_names, strategy_config, [train for train, _ in folds],
+                                     combos, initial_capital, self.max_workers)
+
+        timestamps = arrays[0]
+        capital = initial_capital
+        equity_curve = [{'timestamp': int(timestamps[folds[0][1][0]]), 'equity': capital}]
+        fold_results, oos_trades = [], []
+        for idx, ((train_start, train_stop), (test_start, test_stop)) in enumerate(folds):
+            best = _rank(in_sample[idx], metric)[0]
+            trades, final_capital = _simulate_window(
+                arrays, column_names, compiled, test_start, test_stop, best['parameters'], capital,
+                close_open=True)
+            oos_metrics = Backtester._calculate_metrics(trades, capital, None)
+
+            for trade in trades:
+                capital += trade.pnl
+                equity_curve.append({'timestamp': trade.exit_time, 'equity': capital})
+            oos_trades.extend(trades)
+
+            fold_results.append({
+                'fold': idx,
+                'train_start': int(timestamps[train_start]),
+                'train_end': int(timestamps[train_stop - 1]),
+                'test_start': int(timestamps[test_start]),
+                'test_end': int(timestamps[test_stop - 1]),
+                'parameters': best['parameters'],
+                'in_sample': {k: best[k] for k in ('total_trades', 'win_rate', 'total_return', 'total_return_pct')},
+                'out_of_sample': oos_metrics,
+                'closed_at_window_end': sum(t.reason == "window_end" for t in trades),
+                'final_capital': final_capital,
+            })
+        elapsed = time.perf_counter() - started
+        equity_curve.append({'timestamp': int(timestamps[folds[-1][1][1] - 1]), 'equity': capital})
+
+        logger.info(f"Walk-forward of {len(folds)} folds x {len(combos)} combinations took {elapsed:.2f}s")
+        return {
+            'metric': metric,
+            'combinations': len(combos),
+            'folds': fold_results,
+            'out_of_sample_metrics': Backtester._calculate_metrics(oos_trades, initial_capital, None),
+            'equity_curve': equity_curve,
+            'final_capital': capital,
+            'elapsed_sec': elapsed,
+        }
@@ -0,0 +1,214 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.storage import StorageEngine
+from services.backtester import (
+    Backtester, Trade, next_true_index, find_exit, exit_reason, strategy_warmup
+)
+from services.strategy_compiler import compile_strategy
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PortfolioTrade(Trade):
+    symbol: str
+    quantity: float
+    fees: float
+
+@dataclass
+class _Position:
+    entry_row: int
+    exit_row: int
+    entry_fill: float
+    quantity: float
+    cost: float
+    entry_fee: float
+
+def watchlist_symbols(watchlists: dict, name: str) -> List[str]:
+    """Symbols of a named watchlist from config/watchlists.yaml"""
+    watchlist = next((w for w in watchlists.get('watchlists', []) if w['name'] == name), None)
+    if watchlist is None:
+        raise KeyError(f"Watchlist not found: {name}")
+    return [asset['symbol'] for asset in watchlist.get('assets', [])]
+
+class PortfolioBacktester:
+    """Compiled strategy across many symbols with shared capital.
+
+    All symbols are loaded with one query and aligned into timestamp x symbol
+    matrices. Entry and exit-signal masks are computed for every asset at
+    once; since a position's exit bar only depends on its own entry, it is
+    resolved when the position opens. The simulation therefore only visits
+    bars where a position opens or closes, and `max_positions`, cash,
+    commission and slippage are applied across the whole book.
+    """
+
+    def __init__(self, storage: StorageEngine, config: dict, backtester: Optional[Backtester] = None):
+        self.storage = storage
+        self.config = config
+        # Indicators are computed (and cached) exactly as for single-symbol runs
+        self.backtester = backtester or Backtester(storage)
+
+    def load_matrices(self, symbols: List[str], timeframe: str,
+                      start_date: int, end_date: int,
+                      columns: List[str], indicators: List[str],
+                      parameters: Optional[Dict] = None) -> Dict[str, pd.DataFrame]:
+        """timestamp x symbol frames per column (NaN where a symbol has no bar)"""
+        df = self.storage.get_ohlcv_many(symbols, timeframe, start_date, end_date)
+        if df.empty:
+            return {}
+
+        # Indicators on each symbol's own series so gaps in other assets don't leak in
+        frames = []
+        for symbol, group in df.groupby('symbol', sort=False):
+            group = group.reset_index(drop=True)
+            frames.append(self.backtester.attach_indicators(symbol, timeframe, group, indicators, parameters))
+        df = pd.concat(frames, ignore_index=True)
+
+        return {
+            column: df.pivot(index='timestamp', columns='symbol', values=column).reindex(columns=symbols)
+            for column in columns
+        }
+
+    def run_backtest(self, strategy_config: dict, symbols: List[str], timeframe: str,
+                     start_date: int, end_date: int,
+                     initial_capital: Optional[float] = None) -> Dict:
+        backtesting = self.config.get('backtesting', {})
+        initial_capital = initial_capital or backtesting.get('default_capital', 10000.0)
+        commission = backtesting.get('commission', 0.0)
+        slippage = backtesting.get('slippage', 0.0)
+
+        compiled = compile_strategy(strategy_config)
+        risk = strategy_config.get('strategy', {}).get('risk_management', {})
+        max_positions = risk.get('max_positions') or len(symbols)
+
+        matrices = self.load_matrices(symbols, timeframe, start_date, end_date,
+                                      sorted(compiled.columns), compiled.indicators, compiled.parameters)
+        if not matrices:
+            return {'error': 'No data found for backtest range'}
+
+        timestamps = matrices['close'].index.to_numpy()
+        # Column-major so each asset's history is contiguous for exit scans
+        columns = {name: np.asfortranarray(frame.to_numpy(dtype=np.float64))
+                   for name, frame in matrices.items()}
+        close = columns['close']
+        n_rows, n_cols = close.shape
+
+        signals = compiled.evaluate(columns)
+        stop_loss = -signals.stop_loss
+        take_profit = signals.take_profit
+        # No entries in each symbol's first warmup bars (its own bars, not
+        # aligned rows), as in single-symbol runs
+        bars_seen = np.cumsum(~np.isnan(close), axis=0)
+        entry_mask = signals.entry & (bars_seen > strategy_warmup(compiled.parameters))
+        next_entry = next_true_index(entry_mask)
+        next_exit_signal = next_true_index(signals.exit)
+
+        cash = initial_capital
+        open_positions: Dict[int, _Position] = {}
+        trades: List[PortfolioTrade] = []
+        equity_curve = [{'timestamp': int(timestamps[0]), 'equity': initial_capital}]
+        flat = np.ones(n_cols, dtype=bool)
+        row = 0
+
+        while True:
+            next_exit = min((p.exit_row for p in open_positions.values()), default=n_rows)
+            next_open = n_rows
+            if len(open_positions) < max_positions and row < n_rows and flat.any():
+                next_open = int(next_entry[row, flat].min())
+            row = min(next_exit, next_open)
+            if row >= n_rows:
+                break
+
+            # Exits first; a symbol closed on this bar may not re-enter on it
+            closed_now = set()
+            for col in [c for c, p in open_positions.items() if p.exit_row == row]:
+                position = open_positions.pop(col)
+                exit_close = close[row, col]
+                exit_fill = exit_close * (1 - slippage)
+                proceeds = position.quantity * exit_fill
+                exit_fee = proceeds * commission
+                cash += proceeds - exit_fee
+
+                entry_close = close[position.entry_row, col]
+                pnl_pct = (exit_close - entry_close) / entry_close
+                trades.append(PortfolioTrade(
+                    entry_time=int(timestamps[position.entry_row]),
+                    entry_price=float(position.entry_fill),
+                    exit_time=int(timestamps[row]),
+                    exit_price=float(exit_fill),
+                    pnl=float(proceeds - exit_fee - position.cost - position.entry_fee),
+                    pnl_pct=float(pnl_pct),
+                    reason=exit_reason(pnl_pct, stop_loss, take_profit),
+                    symbol=symbols[col],
+                    quantity=float(position.quantity),
+                    fees=float(position.entry_fee + exit_fee),
+                ))
+                flat[col] = True
+                closed_now.add(col)
+            if closed_now:
+                book = cash + sum(p.cost for p in open_positions.values())
+                equity_curve.append({'timestamp': int(timestamps[row]), 'equity': book})
+
+            # Entries in watchlist order while slots and cash allow
+            for col in np.flatnonzero(entry_mask[row] & flat):
+                if len(open_positions) >= max_positions:
+                    break
+                if col in closed_now:
+                    continue
+                equity = cash + sum(p.cost for p in open_positions.values())
+                cost = equity * signals.position_size
+                entry_fee = cost * commission
+                if cost + entry_fee > cash:
+                    continue
+                entry_fill = close[row, col] * (1 + slippage)
+                cash -= cost + entry_fee
+                open_positions[col] = _Position(
+                    entry_row=row,
+                    exit_row=find_exit(close[:, col], next_exit_signal[:, col], row,
+                                       stop_loss, take_profit),
+                    entry_fill=entry_fill,
+                    quantity=cost / entry_fill,
+                    cost=cost,
+                    entry_fee=entry_fee,
+                )
+                flat[col] = False
+
+            row += 1
+
+        # Positions still open are marked at each symbol's last available close
+        last_close = matrices['close'].ffill().iloc[-1].to_numpy(dtype=np.float64)
+        open_report = [{
+            'symbol': symbols[col],
+            'entry_time': int(timestamps[p.entry_row]),
+            'entry_price': float(p.entry_fill),
+            'quantity': float(p.quantity),
+            'market_value': float(p.quantity * last_close[col]),
+        } for col, p in open_positions.items()]
+        final_equity = cash + sum(p['market_value'] for p in open_report)
+
+        metrics = Backtester._calculate_metrics(trades, initial_capital, None)
+        metrics['max_positions'] = max_positions
+        metrics['total_fees'] = float(sum(t.fees for t in trades))
+
+        per_symbol = {}
+        for symbol in symbols:
+            symbol_trades = [t for t in trades if t.symbol == symbol]
+            per_symbol[symbol] = {
+                'total_trades': len(symbol_trades),
+                'total_return': float(sum(t.pnl for t in symbol_trades)),
+            }
+
+        logger.info(f"Portfolio backtest over {n_cols} symbols x {n_rows} bars: {len(trades)} trades")
+        return {
+            'symbols': symbols,
+            'trades': [t.__dict__ for t in trades],
+            'metrics': metrics,
+            'per_symbol': per_symbol,
+            'open_positions': open_report,
+            'equity_curve': equity_curve,
+            'final_capital': float(final_equity),
+        }
@@ -0,0 +1,50 @@
+import asyncio
+import time
+from typing import Callable, Dict
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`.
+
+    Waiters are served in arrival order, so one slow caller can't be starved
+    by a stream of newer ones.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        self.waited_sec = 0.0
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens, sleeping until they are available; returns seconds waited"""
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                delay = (tokens - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= tokens
+            self.acquired += 1
+            self.waited_sec += waited
+        return waited
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'rate_per_sec': self.rate,
+            'capacity': self.capacity,
+            'acquired': self.acquired,
+            'waited_sec': round(self.waited_sec, 3),
+        }
@@ -0,0 +1,102 @@
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+from services.ohlcv_cache import PRICE_COLUMNS
+from services.timeframes import candle_open, timeframe_to_ms
+
+def bucket_open(timestamps: np.ndarray, timeframe: str) -> np.ndarray:
+    """Vectorized candle_open over an array of ms timestamps"""
+    duration = timeframe_to_ms(timeframe)
+    offset = candle_open(0, timeframe) % duration  # weekly candles open on Monday
+    return (timestamps - offset) // duration * duration + offset
+
+def resample_ohlcv(timestamps: np.ndarray, prices: Dict[str, np.ndarray],
+                   timeframe: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Aggregate sorted finer candles into `timeframe` candles.
+
+    open/close are the first/last source candle of each bucket, high/low the
+    extremes and volume the sum. The newest bucket may be partial, exactly
+    like the in-progress candle an exchange returns.
+    """
+    if len(timestamps) == 0:
+        return timestamps[:0], {col: prices[col][:0] for col in PRICE_COLUMNS}
+    buckets = bucket_open(timestamps, timeframe)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(timestamps)] - 1
+    return buckets[starts], {
+        'open': prices['open'][starts],
+        'high': np.maximum.reduceat(prices['high'], starts),
+        'low': np.minimum.reduceat(prices['low'], starts),
+        'close': prices['close'][ends],
+        'volume': np.add.reduceat(prices['volume'], starts),
+    }
+
+def bucket_fill(timestamps: np.ndarray, timeframe: str,
+                base_timeframe: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(complete, prefix) flags per bucket of sorted, unique base candles.
+
+    A prefix bucket holds every base candle from its open through its last
+    one, like an in-progress candle; a complete one holds them all.
+    """
+    base_ms = timeframe_to_ms(base_timeframe)
+    buckets = bucket_open(timestamps, timeframe)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(timestamps)])
+    opens = buckets[starts]
+    prefix = (timestamps[starts] == opens) & \
+        ((timestamps[starts + counts - 1] - opens) // base_ms + 1 == counts)
+    return prefix & (counts == timeframe_to_ms(timeframe) // base_ms), prefix
+
+class ResampleRegistry:
+    """Which timeframes are derived from `base_timeframe`, for which symbols,
+    and for each (symbol, timeframe) up to which base candle the stored
+    series is current.
+
+    Only symbols whose base candles are collected (see collect()) are
+    derived; others keep the candles fetched for them. Nothing is
+    materialized until first read; after that, writes to the base series
+    only recompute the buckets they touch.
+    """
+
+    def __init__(self, base_timeframe: str = '1m', timeframes: Iterable[str] = ()):
+        base_ms = timeframe_to_ms(base_timeframe)
+        self.base_timeframe = base_timeframe
+        self.timeframes = set()
+        for timeframe in timeframes:
+            # Calendar months are not a fixed multiple of the base candle
+            if timeframe.endswith('M') or timeframe_to_ms(timeframe) % base_ms \
+                    or timeframe_to_ms(timeframe) <= base_ms:
+                raise ValueError(f"Cannot resample {timeframe} from {base_timeframe}")
+            self.timeframes.add(timeframe)
+        self.symbols: Set[str] = set()
+        self._materialized: Dict[Tuple[str, str], Optional[int]] = {}
+        # Open of the in-progress bucket last written for each pair
+        self._partial: Dict[Tuple[str, str], Optional[int]] = {}
+        self.lock = threading.RLock()
+
+    def is_derived(self, timeframe: str) -> bool:
+        return timeframe in self.timeframes
+
+    def collect(self, symbols: Iterable[str]):
+        """Symbols whose base candles are collected, so whose derived timeframes are built"""
+        self.symbols.update(symbols)
+
+    def derives(self, symbol: str, timeframe: str) -> bool:
+        return timeframe in self.timeframes and symbol in self.symbols
+
+    def materialized_through(self, symbol: str, timeframe: str) -> Optional[int]:
+        """Last base timestamp folded into the stored series, None if never built"""
+        return self._materialized.get((symbol, timeframe))
+
+    def partial_bucket(self, symbol: str, timeframe: str) -> Optional[int]:
+        """Open of the in-progress bucket the stored series holds from the base, if any"""
+        return self._partial.get((symbol, timeframe))
+
+    def mark(self, symbol: str, timeframe: str, base_timestamp: int, partial: Optional[int] = None):
+        self._materialized[(symbol, timeframe)] = base_timestamp
+        self._partial[(symbol, timeframe)] = partial
+
+    def materialized_for(self, symbol: str):
+        return [tf for (s, tf) in self._materialized if s == symbol]
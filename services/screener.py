@@ -0,0 +1,145 @@
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.storage import StorageEngine
+from services.ohlcv_cache import PRICE_COLUMNS
+from services.strategy_compiler import compile_conditions, indicator_for_column, rolling_mean
+from services.timeframes import candle_open, timeframe_to_ms
+
+logger = logging.getLogger(__name__)
+
+# Same formulas as IndicatorEngine, applied to bars x symbols matrices so
+# every symbol is computed by one array operation. Leading NaN rows (short
+# histories) stay NaN through each indicator's warm-up.
+
+def matrix_rsi(cols: Dict[str, np.ndarray], period: int = 14) -> Dict[str, np.ndarray]:
+    close = cols['close']
+    delta = np.diff(close, axis=0, prepend=np.nan)
+    padding = np.isnan(close)
+    gain = np.where(padding, np.nan, np.where(delta > 0, delta, 0.0))
+    loss = np.where(padding, np.nan, np.where(delta < 0, -delta, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = rolling_mean(gain, period) / rolling_mean(loss, period)
+        return {'RSI': 100 - (100 / (1 + rs))}
+
+def _ewm(values: np.ndarray, span: int) -> np.ndarray:
+    return pd.DataFrame(values).ewm(span=span, adjust=False).mean().to_numpy()
+
+def matrix_macd(cols: Dict[str, np.ndarray], fast: int = 12, slow: int = 26,
+                signal: int = 9) -> Dict[str, np.ndarray]:
+    macd = _ewm(cols['close'], fast) - _ewm(cols['close'], slow)
+    signal_line = _ewm(macd, signal)
+    return {'MACD_macd': macd, 'MACD_signal': signal_line, 'MACD_histogram': macd - signal_line}
+
+def matrix_bb(cols: Dict[str, np.ndarray], period: int = 20, std_dev: float = 2.0) -> Dict[str, np.ndarray]:
+    sma = rolling_mean(cols['close'], period)
+    std = pd.DataFrame(cols['close']).rolling(window=period).std().to_numpy()
+    return {'BB_upper': sma + std * std_dev, 'BB_middle': sma, 'BB_lower': sma - std * std_dev}
+
+def matrix_atr(cols: Dict[str, np.ndarray], period: int = 14) -> Dict[str, np.ndarray]:
+    prev_close = np.vstack([np.full((1, cols['close'].shape[1]), np.nan), cols['close'][:-1]])
+    true_range = np.fmax(cols['high'] - cols['low'],
+                         np.fmax(np.abs(cols['high'] - prev_close), np.abs(cols['low'] - prev_close)))
+    return {'ATR': rolling_mean(true_range, period)}
+
+MATRIX_INDICATORS: Dict[str, Callable[..., Dict[str, np.ndarray]]] = {
+    'RSI': matrix_rsi,
+    'MACD': matrix_macd,
+    'BB': matrix_bb,
+    'ATR': matrix_atr,
+}
+
+def stack_latest(df: pd.DataFrame, symbols: List[str], bars: int) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """bars x symbols matrices of each symbol's latest `bars` candles.
+
+    Rows are aligned from the newest candle backwards (not by timestamp), so
+    the last row is every symbol's current bar; shorter histories are padded
+    with leading NaN. Also returns each symbol's last timestamp (-1 if none).
+    """
+    codes = pd.Categorical(df['symbol'], categories=symbols).codes
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    counts = np.bincount(codes[codes >= 0], minlength=len(symbols))
+    starts = np.cumsum(counts) - counts
+    valid = codes >= 0
+    rank = np.arange(len(codes)) - starts[np.where(valid, codes, 0)]
+    rows = bars - counts[np.where(valid, codes, 0)] + rank
+    keep = valid & (rows >= 0)
+    rows, codes, order = rows[keep], codes[keep], order[keep]
+
+    matrices = {}
+    for col in ('timestamp',) + PRICE_COLUMNS:
+        matrix = np.full((bars, len(symbols)), np.nan)
+        matrix[rows, codes] = df[col].to_numpy(dtype=np.float64)[order]
+        matrices[col] = matrix
+    last_timestamp = np.where(counts > 0, np.nan_to_num(matrices.pop('timestamp')[-1], nan=-1), -1).astype(np.int64)
+    return matrices, last_timestamp
+
+class Screener:
+    """Indicator conditions evaluated across many symbols at once.
+
+    Conditions use the strategy YAML grammar (e.g. RSI < 30, MACD_histogram
+    crosses_above 0). The latest `bars` candles of every symbol come from one
+    storage query and are stacked into bars x symbols matrices; indicators
+    and conditions then run once over whole matrices and the last row
+    decides the matches. Indicator parameters are `indicators.defaults`.
+    """
+
+    def __init__(self, storage: StorageEngine, config: dict):
+        self.storage = storage
+        defaults = config.get('indicators', {}).get('defaults', {})
+        self.indicator_params = {name.upper(): params for name, params in defaults.items()}
+
+    def indicator_matrices(self, cols: Dict[str, np.ndarray], indicators: List[str]) -> Dict[str, np.ndarray]:
+        out = {}
+        for name in indicators:
+            if name not in MATRIX_INDICATORS:
+                raise ValueError(f"Indicator not supported by the screener: {name}")
+            out.update(MATRIX_INDICATORS[name](cols, **self.indicator_params.get(name, {})))
+        return out
+
+    def screen(self, symbols: List[str], timeframe: str, conditions: List[dict],
+               parameters: Optional[Dict[str, Any]] = None, bars: int = 200,
+               as_of: Optional[int] = None) -> Dict:
+        """Symbols whose latest candle (at or before `as_of`, ms) meets every condition"""
+        started = time.perf_counter()
+        if not conditions:
+            return {'error': 'Provide at least one condition'}
+        expressions, columns = compile_conditions(conditions)
+        indicators = sorted({indicator_for_column(c) for c in columns} - {None})
+
+        now_ms = as_of if as_of is not None else int(time.time() * 1000)
+        start = candle_open(now_ms, timeframe) - (bars - 1) * timeframe_to_ms(timeframe)
+        df = self.storage.get_ohlcv_many(symbols, timeframe, start, as_of)
+        cols, last_timestamp = stack_latest(df, symbols, bars)
+        cols.update(self.indicator_matrices(cols, indicators))
+
+        params = parameters or {}
+        matched = last_timestamp >= 0
+        for expression in expressions:
+            mask = expression(cols, params)
+            if mask is not None:
+                matched &= np.broadcast_to(mask, cols['close'].shape)[-1]
+
+        reported = sorted(c for c in columns if c != 'close')
+        matches = []
+        for j in np.flatnonzero(matched):
+            values = {c: float(cols[c][-1, j]) for c in reported}
+            matches.append({
+                'symbol': symbols[j],
+                'timestamp': int(last_timestamp[j]),
+                'close': float(cols['close'][-1, j]),
+                'values': {c: (None if np.isnan(v) else v) for c, v in values.items()},
+            })
+        elapsed = time.perf_counter() - started
+        logger.info(f"Screened {len(symbols)} symbols on {timeframe}: {len(matches)} matches in {elapsed * 1000:.0f}ms")
+        return {
+            'timeframe': timeframe,
+            'evaluated': int((last_timestamp >= 0).sum()),
+            'matches': matches,
+            'elapsed_ms': elapsed * 1000,
+        }
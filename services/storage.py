@@ -1,31 +1,138 @@
 import sqlite3
 import pandas as pd
 from contextlib import contextmanager
-import json
+import logging
 import os
-from typing import Optional, List, Dict, Any
+import queue
+import threading
+import time
+from itertools import chain
+from typing import Optional, List, Dict, Iterator
+
+import numpy as np
+
+from services.ohlcv_cache import PRICE_COLUMNS, OHLCVArrays, OHLCVCache, last_wins_order
+from services.resampler import ResampleRegistry, bucket_fill, bucket_open, resample_ohlcv
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OHLCV_CACHE_BYTES = 256 * 1024 * 1024
+DEFAULT_POOL_SIZE = 8
+
+# Applied to every pooled connection. WAL lets readers proceed while the
+# collector writes; NORMAL sync is durable across app crashes in WAL mode.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",      # 64 MiB page cache per connection
+    "PRAGMA mmap_size=268435456",    # 256 MiB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+STATEMENT_CACHE_SIZE = 256
+
+INGEST_BATCH_ROWS = 100_000
+EXPORT_CHUNK_ROWS = 100_000
+ROWS_PER_STATEMENT = 100
+
+def _upsert_ohlcv_sql(n_rows: int) -> str:
+    """Multi-row upsert; ?1/?2 are symbol/timeframe, then 6 values per row.
+
+    A conflicting candle is only rewritten when a value actually differs.
+    """
+    values = ", ".join(
+        "(?1, ?2, " + ", ".join(f"?{3 + 6 * i + j}" for j in range(6)) + ")"
+        for i in range(n_rows)
+    )
+    return f"""
+        INSERT INTO ohlcv (symbol, timeframe, timestamp, open, high, low, close, volume)
+        VALUES {values}
+        ON CONFLICT(symbol, timeframe, timestamp) DO UPDATE SET
+            open = excluded.open,
+            high = excluded.high,
+            low = excluded.low,
+            close = excluded.close,
+            volume = excluded.volume
+        WHERE open IS NOT excluded.open OR high IS NOT excluded.high OR low IS NOT excluded.low
+           OR close IS NOT excluded.close OR volume IS NOT excluded.volume
+    """
+
+UPSERT_OHLCV = _upsert_ohlcv_sql(1)
+UPSERT_OHLCV_MANY = _upsert_ohlcv_sql(ROWS_PER_STATEMENT)
 
 class StorageEngine:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, ohlcv_cache_bytes: int = DEFAULT_OHLCV_CACHE_BYTES,
+                 pool_size: int = DEFAULT_POOL_SIZE, resampler: Optional[ResampleRegistry] = None):
         self.db_path = db_path
         # Ensure directory exists
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Idle connections are reused; extra ones are opened under load and
+        # closed on release once pool_size are already idle
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=pool_size)
+        self._pool_pid = os.getpid()
+        self._pool_lock = threading.Lock()
         self._init_schema()
+        # Whole series are cached on first read; 0 disables the cache
+        self.ohlcv_cache = OHLCVCache(ohlcv_cache_bytes) if ohlcv_cache_bytes else None
+        # Higher timeframes built locally from the base series
+        self.resampler = resampler
+        if resampler is not None:
+            self._load_resampled()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        # Connections must not cross a fork (e.g. process pool workers)
+        if self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool_pid != os.getpid():
+                    self._pool = queue.LifoQueue(maxsize=self._pool.maxsize)
+                    self._pool_pid = os.getpid()
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+    
+    def _release(self, conn: sqlite3.Connection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
     
     @contextmanager
     def get_conn(self):
-        conn = sqlite3.connect(self.db_path)
+        """Pooled connection; commits on success, rolls back on error"""
+        conn = self._acquire()
         try:
             yield conn
             conn.commit()
         except Exception:
-            conn.rollback()
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self._release(conn)
             raise
-        finally:
-            conn.close()
+        self._release(conn)
+    
+    def close(self):
+        """Close idle pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
             
     def _init_schema(self):
         with self.get_conn() as conn:
+            # Journal mode is persistent, so it only needs setting once
+            conn.execute("PRAGMA journal_mode=WAL")
+
             # Historical OHLCV storage
             conn.execute("""
             CREATE TABLE IF NOT EXISTS ohlcv (
@@ -42,7 +149,20 @@ class StorageEngine:
                 UNIQUE(symbol, timeframe, timestamp)
             );
             """)
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_ohlcv_symbol_tf_ts ON ohlcv(symbol, timeframe, timestamp DESC);")
+            # The UNIQUE constraint's index already serves range scans in both
+            # directions; a second copy only slowed down every insert
+            conn.execute("DROP INDEX IF EXISTS idx_ohlcv_symbol_tf_ts;")
+
+            # Last base candle each derived timeframe was built through
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS ohlcv_resampled (
+                symbol TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                through_ts INTEGER NOT NULL,
+                partial_ts INTEGER,
+                PRIMARY KEY(symbol, timeframe)
+            );
+            """)
 
             # Pre-calculated indicators cache
             conn.execute("""
@@ -58,6 +178,25 @@ class StorageEngine:
             );
             """)
 
+            # Timestamp range each cached indicator series was computed for,
+            # and a digest of those candles. Warmup NaNs are not stored, so
+            # coverage can't be inferred from rows.
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS indicators_cache_coverage (
+                symbol TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                indicator_name TEXT NOT NULL,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER NOT NULL,
+                computed_at REAL NOT NULL,
+                fingerprint TEXT,
+                PRIMARY KEY(symbol, timeframe, indicator_name)
+            );
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(indicators_cache_coverage)")}
+            if 'fingerprint' not in columns:
+                conn.execute("ALTER TABLE indicators_cache_coverage ADD COLUMN fingerprint TEXT")
+
             # Strategy backtest results
             conn.execute("""
             CREATE TABLE IF NOT EXISTS backtest_results (
@@ -89,42 +228,146 @@ class StorageEngine:
             );
             """)
     
-    def store_ohlcv(self, symbol: str, timeframe: str, df: pd.DataFrame):
-        """Bulk insert with conflict resolution"""
+    def store_ohlcv(self, symbol: str, timeframe: str, df: pd.DataFrame) -> Dict[str, float]:
+        """Bulk upsert; rows whose values are unchanged are left untouched.
+
+        Values are taken straight from the column arrays, bound
+        ROWS_PER_STATEMENT rows per statement, and committed every
+        INGEST_BATCH_ROWS so long backfills don't hold the write lock in one
+        go. Returns row count and throughput.
+        """
         if df.empty:
-            return
+            return {'rows': 0, 'elapsed_sec': 0.0, 'rows_per_sec': 0.0}
             
         # Ensure required columns exist
         required_cols = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
         if not all(col in df.columns for col in required_cols):
             raise ValueError(f"DataFrame missing required columns: {required_cols}")
-            
-        # Add symbol and timeframe columns for storage
-        df_to_store = df.copy()
-        df_to_store['symbol'] = symbol
-        df_to_store['timeframe'] = timeframe
         
-        # Select only relevant columns
-        cols = ['symbol', 'timeframe'] + required_cols
-        df_to_store = df_to_store[cols]
+        started = time.perf_counter()
+        timestamps = df['timestamp'].to_numpy(dtype=np.int64)
+        prices = {col: df[col].to_numpy(dtype=np.float64) for col in PRICE_COLUMNS}
+        self._write_ohlcv(symbol, timeframe, timestamps, prices)
         
-        with self.get_conn() as conn:
-            # Use replace or ignore logic? 
-            # The user requested "Bulk insert with conflict resolution".
-            # Pandas to_sql doesn't support UPSERT easily without SQLAlchemy engine or custom method.
-            # We'll use a custom method for SQLite UPSERT (INSERT OR REPLACE/IGNORE)
-            
-            # Convert to list of tuples
-            data = df_to_store.to_dict('records')
-            
-            conn.executemany("""
-                INSERT OR REPLACE INTO ohlcv (symbol, timeframe, timestamp, open, high, low, close, volume)
-                VALUES (:symbol, :timeframe, :timestamp, :open, :high, :low, :close, :volume)
-            """, data)
+        # Write-through once committed (last duplicate wins, as in the upsert)
+        if self.ohlcv_cache is not None:
+            order = last_wins_order(timestamps)
+            self.ohlcv_cache.write((symbol, timeframe), OHLCVArrays(
+                timestamp=timestamps[order],
+                columns={col: values[order] for col, values in prices.items()},
+            ))
+        
+        if self.resampler is not None and timeframe == self.resampler.base_timeframe:
+            self._update_resampled(symbol, int(timestamps.min()))
+        
+        elapsed = time.perf_counter() - started
+        stats = {
+            'rows': len(timestamps),
+            'elapsed_sec': elapsed,
+            'rows_per_sec': len(timestamps) / elapsed if elapsed > 0 else float('inf'),
+        }
+        if len(timestamps) >= INGEST_BATCH_ROWS:
+            logger.info(f"Stored {stats['rows']} {symbol} {timeframe} rows at {stats['rows_per_sec']:.0f} rows/s")
+        return stats
+    
+    def _write_ohlcv(self, symbol: str, timeframe: str,
+                     timestamps: np.ndarray, prices: Dict[str, np.ndarray]):
+        width = 6 * ROWS_PER_STATEMENT
+        for lo in range(0, len(timestamps), INGEST_BATCH_ROWS):
+            hi = lo + INGEST_BATCH_ROWS
+            # Flat [ts, o, h, l, c, v, ts, ...] straight from the arrays
+            flat = list(chain.from_iterable(zip(
+                timestamps[lo:hi].tolist(), *(prices[col][lo:hi].tolist() for col in PRICE_COLUMNS))))
+            full = len(flat) // width * width
+            with self.get_conn() as conn:
+                conn.executemany(UPSERT_OHLCV_MANY, (
+                    (symbol, timeframe, *flat[i:i + width]) for i in range(0, full, width)))
+                conn.executemany(UPSERT_OHLCV, (
+                    (symbol, timeframe, *flat[i:i + 6]) for i in range(full, len(flat), 6)))
     
+    def _refresh_resampled(self, symbol: str, timeframe: str):
+        """Materialize a derived timeframe on first read, or catch it up with
+        base candles written since (e.g. by another process)"""
+        if self.resampler is None or not self.resampler.derives(symbol, timeframe):
+            return
+        with self.resampler.lock:
+            through = self.resampler.materialized_through(symbol, timeframe)
+            base_last = self.get_last_timestamp(symbol, self.resampler.base_timeframe)
+            if base_last is None or (through is not None and through >= base_last):
+                return
+            start = None if through is None else int(bucket_open(np.int64(through), timeframe))
+            self._resample(symbol, timeframe, start)
+
+    def _update_resampled(self, symbol: str, earliest: int):
+        """Recompute the buckets of materialized timeframes that new base rows touch"""
+        with self.resampler.lock:
+            for timeframe in self.resampler.materialized_for(symbol):
+                if self.resampler.derives(symbol, timeframe):
+                    self._resample(symbol, timeframe, int(bucket_open(np.int64(earliest), timeframe)))
+
+    def _resample(self, symbol: str, timeframe: str, start: Optional[int]):
+        """Rebuild the buckets from `start` on that the base candles cover.
+
+        Buckets with missing base candles (a leading partial hour, a gap)
+        are left as stored. The newest bucket may be in progress; it is only
+        written over a candle this resampler wrote, or where there is none.
+        """
+        base = self.get_ohlcv(symbol, self.resampler.base_timeframe, start=start)
+        if base.empty:
+            return
+        base_ts = base['timestamp'].to_numpy(dtype=np.int64)
+        timestamps, prices = resample_ohlcv(
+            base_ts, {col: base[col].to_numpy(dtype=np.float64) for col in PRICE_COLUMNS}, timeframe)
+        keep, prefix = bucket_fill(base_ts, timeframe, self.resampler.base_timeframe)
+        partial = None
+        if prefix[-1] and not keep[-1]:
+            newest = int(timestamps[-1])
+            keep[-1] = self.resampler.partial_bucket(symbol, timeframe) == newest or \
+                not len(self.get_timestamps(symbol, timeframe, newest, newest))
+            partial = newest if keep[-1] else None
+        if keep.any():
+            self.store_ohlcv(symbol, timeframe, pd.DataFrame(
+                {'timestamp': timestamps[keep], **{col: values[keep] for col, values in prices.items()}}))
+        self._mark_resampled(symbol, timeframe, int(base_ts[-1]), partial)
+
+    def _mark_resampled(self, symbol: str, timeframe: str, through: int, partial: Optional[int]):
+        self.resampler.mark(symbol, timeframe, through, partial)
+        with self.get_conn() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO ohlcv_resampled (symbol, timeframe, through_ts, partial_ts)
+                VALUES (?, ?, ?, ?)
+            """, (symbol, timeframe, through, partial))
+
+    def _load_resampled(self):
+        """Materialized state from earlier runs, so a restart resumes it"""
+        with self.get_conn() as conn:
+            rows = conn.execute("SELECT symbol, timeframe, through_ts, partial_ts FROM ohlcv_resampled").fetchall()
+        for symbol, timeframe, through, partial in rows:
+            if self.resampler.is_derived(timeframe):
+                self.resampler.mark(symbol, timeframe, through, partial)
+
     def get_ohlcv(self, symbol: str, timeframe: str, 
                   start: int = None, end: int = None, limit: int = None) -> pd.DataFrame:
-        """Retrieve with optional time range"""
+        """Retrieve with optional time range; `limit` keeps its newest candles"""
+        self._refresh_resampled(symbol, timeframe)
+        if self.ohlcv_cache is not None:
+            series = self._cached_series(symbol, timeframe)
+            if series is not None:
+                return series.slice(start, end, limit)
+        return self._query_ohlcv(symbol, timeframe, start, end, limit)
+
+    def _cached_series(self, symbol: str, timeframe: str) -> Optional[OHLCVArrays]:
+        """Whole series from the LRU, loading it from SQLite on a miss"""
+        key = (symbol, timeframe)
+        series = self.ohlcv_cache.get(key)
+        if series is None:
+            version = self.ohlcv_cache.version(key)
+            series = OHLCVArrays.from_frame(self._query_ohlcv(symbol, timeframe))
+            self.ohlcv_cache.put(key, series, version)
+        return series
+
+    def _query_ohlcv(self, symbol: str, timeframe: str,
+                     start: int = None, end: int = None, limit: int = None) -> pd.DataFrame:
         query = """
             SELECT timestamp, open, high, low, close, volume
             FROM ohlcv
@@ -139,15 +382,222 @@ class StorageEngine:
             query += " AND timestamp <= ?"
             params.append(end)
         
-        query += " ORDER BY timestamp ASC"
-        
         if limit:
-            query += f" LIMIT {limit}"
+            # Newest rows first, walking the (symbol, timeframe, timestamp)
+            # index backwards, then back into ascending order. Bound rather
+            # than formatted in, so the prepared statement is reused
+            query = f"SELECT * FROM ({query} ORDER BY timestamp DESC LIMIT ?) ORDER BY timestamp ASC"
+            params.append(int(limit))
+        else:
+            query += " ORDER BY timestamp ASC"
         
         with self.get_conn() as conn:
             return pd.read_sql(query, conn, params=params)
 
+    def get_ohlcv_many(self, symbols: List[str], timeframe: str,
+                       start: int = None, end: int = None) -> pd.DataFrame:
+        """Retrieve several symbols in one query, long format with a symbol column"""
+        if not symbols:
+            return pd.DataFrame(columns=['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        for symbol in symbols:
+            self._refresh_resampled(symbol, timeframe)
+        
+        placeholders = ", ".join("?" for _ in symbols)
+        query = f"""
+            SELECT symbol, timestamp, open, high, low, close, volume
+            FROM ohlcv
+            WHERE symbol IN ({placeholders}) AND timeframe = ?
+        """
+        params = list(symbols) + [timeframe]
+        
+        if start:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end:
+            query += " AND timestamp <= ?"
+            params.append(end)
+        
+        query += " ORDER BY symbol, timestamp ASC"
+        
+        with self.get_conn() as conn:
+            return pd.read_sql(query, conn, params=params)
+
+    def iter_ohlcv(self, symbol: str, timeframe: str, start: int = None, end: int = None,
+                   chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """The [start, end] range in timestamp order, `chunk_rows` candles at a
+        time, so arbitrarily long ranges are read in constant memory.
+
+        A series already in the LRU is sliced from it; otherwise chunks come
+        straight from the backend without loading (or caching) the series.
+        """
+        self._refresh_resampled(symbol, timeframe)
+        series = self.ohlcv_cache.peek((symbol, timeframe)) if self.ohlcv_cache is not None else None
+        if series is None:
+            yield from self._iter_ohlcv(symbol, timeframe, start, end, chunk_rows)
+            return
+        lo, hi = series.bounds(start, end)
+        for offset in range(lo, hi, chunk_rows):
+            stop = min(offset + chunk_rows, hi)
+            data = {'timestamp': series.timestamp[offset:stop]}
+            data.update((c, values[offset:stop]) for c, values in series.columns.items())
+            yield pd.DataFrame(data, copy=True)
+
+    def _iter_ohlcv(self, symbol: str, timeframe: str, start: int = None, end: int = None,
+                    chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        # Keyset pagination on the (symbol, timeframe, timestamp) index; the
+        # connection goes back to the pool between chunks
+        query = """
+            SELECT timestamp, open, high, low, close, volume
+            FROM ohlcv
+            WHERE symbol = ? AND timeframe = ? AND timestamp >= ? AND timestamp <= ?
+            ORDER BY timestamp ASC
+            LIMIT ?
+        """
+        after = start or np.iinfo(np.int64).min
+        end = end or np.iinfo(np.int64).max
+        while True:
+            with self.get_conn() as conn:
+                chunk = pd.read_sql(query, conn, params=[symbol, timeframe, int(after), int(end), chunk_rows])
+            if chunk.empty:
+                return
+            yield chunk
+            if len(chunk) < chunk_rows:
+                return
+            after = int(chunk['timestamp'].iloc[-1]) + 1
+
+    def store_indicator_values(self, symbol: str, timeframe: str,
+                               rows: List[tuple], coverage: Dict[str, tuple],
+                               computed_at: float):
+        """Bulk write cached indicator values and record what range they cover.
+
+        rows are (indicator_name, timestamp, value, metadata) tuples; coverage
+        maps indicator_name -> (start_ts, end_ts, fingerprint). Each write replaces the
+        indicator's earlier values and coverage: values from computations
+        with a different start are not interchangeable.
+        """
+        with self.get_conn() as conn:
+            conn.executemany("""
+                DELETE FROM indicators_cache WHERE symbol = ? AND timeframe = ? AND indicator_name = ?
+            """, ((symbol, timeframe, name) for name in coverage))
+            conn.executemany("""
+                INSERT OR REPLACE INTO indicators_cache (symbol, timeframe, indicator_name, timestamp, value, metadata)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, ((symbol, timeframe, name, ts, value, metadata) for name, ts, value, metadata in rows))
+            conn.executemany("""
+                INSERT OR REPLACE INTO indicators_cache_coverage
+                (symbol, timeframe, indicator_name, start_ts, end_ts, computed_at, fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, ((symbol, timeframe, name, start, end, computed_at, fingerprint)
+                  for name, (start, end, fingerprint) in coverage.items()))
+
+    def get_indicator_coverage(self, symbol: str, timeframe: str,
+                               names: List[str]) -> Dict[str, tuple]:
+        """indicator_name -> (start_ts, end_ts, computed_at, fingerprint)"""
+        placeholders = ", ".join("?" for _ in names)
+        with self.get_conn() as conn:
+            cursor = conn.execute(f"""
+                SELECT indicator_name, start_ts, end_ts, computed_at, fingerprint
+                FROM indicators_cache_coverage
+                WHERE symbol = ? AND timeframe = ? AND indicator_name IN ({placeholders})
+            """, [symbol, timeframe] + list(names))
+            return {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+    def get_indicator_values(self, symbol: str, timeframe: str, names: List[str],
+                             start: int, end: int) -> pd.DataFrame:
+        placeholders = ", ".join("?" for _ in names)
+        query = f"""
+            SELECT indicator_name, timestamp, value
+            FROM indicators_cache
+            WHERE symbol = ? AND timeframe = ? AND indicator_name IN ({placeholders})
+              AND timestamp >= ? AND timestamp <= ?
+        """
+        with self.get_conn() as conn:
+            return pd.read_sql(query, conn, params=[symbol, timeframe] + list(names) + [start, end])
+
+    def cleanup_indicator_cache(self, computed_before: float) -> int:
+        """Delete cached indicator series last computed before the given epoch seconds"""
+        with self.get_conn() as conn:
+            deleted = conn.execute("""
+                DELETE FROM indicators_cache
+                WHERE EXISTS (
+                    SELECT 1 FROM indicators_cache_coverage c
+                    WHERE c.symbol = indicators_cache.symbol
+                      AND c.timeframe = indicators_cache.timeframe
+                      AND c.indicator_name = indicators_cache.indicator_name
+                      AND c.computed_at < ?
+                )
+            """, (computed_before,)).rowcount
+            conn.execute("DELETE FROM indicators_cache_coverage WHERE computed_at < ?", (computed_before,))
+            return deleted
+
+    def add_alert_rule(self, symbol: str, condition: str, webhook_url: Optional[str] = None) -> int:
+        with self.get_conn() as conn:
+            cursor = conn.execute("INSERT INTO alerts (symbol, condition, webhook_url) VALUES (?, ?, ?)",
+                                  (symbol, condition, webhook_url))
+            return cursor.lastrowid
+
+    def get_alert_rules(self) -> List[Dict]:
+        """Enabled rows of the alerts table"""
+        with self.get_conn() as conn:
+            rows = conn.execute("""
+                SELECT id, symbol, condition, webhook_url, last_triggered
+                FROM alerts WHERE enabled = 1 ORDER BY id
+            """).fetchall()
+        return [{'id': r[0], 'symbol': r[1], 'condition': r[2], 'webhook_url': r[3], 'last_triggered': r[4]}
+                for r in rows]
+
+    def mark_alerts_triggered(self, alert_ids: List[int], triggered_at: float):
+        """Record when stored alerts last fired (epoch seconds)"""
+        with self.get_conn() as conn:
+            conn.executemany("UPDATE alerts SET last_triggered = ? WHERE id = ?",
+                             [(triggered_at, alert_id) for alert_id in alert_ids])
+
     def get_last_timestamp(self, symbol: str, timeframe: str) -> Optional[int]:
+        self._refresh_resampled(symbol, timeframe)
+        if self.ohlcv_cache is not None:
+            series = self.ohlcv_cache.peek((symbol, timeframe))
+            if series is not None:
+                return series.last_timestamp
+        return self._query_last_timestamp(symbol, timeframe)
+
+    def get_symbols(self, timeframe: str) -> List[str]:
+        """Symbols with stored candles for `timeframe`, or for its resampling base"""
+        symbols = set(self._query_symbols(timeframe))
+        if self.resampler is not None and self.resampler.is_derived(timeframe):
+            symbols.update(symbol for symbol in self._query_symbols(self.resampler.base_timeframe)
+                           if self.resampler.derives(symbol, timeframe))
+        return sorted(symbols)
+
+    def _query_symbols(self, timeframe: str) -> List[str]:
+        with self.get_conn() as conn:
+            rows = conn.execute("SELECT DISTINCT symbol FROM ohlcv WHERE timeframe = ?", (timeframe,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_timestamps(self, symbol: str, timeframe: str,
+                       start: int = None, end: int = None) -> np.ndarray:
+        """Sorted candle open times in [start, end], e.g. for gap scans"""
+        if self.ohlcv_cache is not None:
+            series = self._cached_series(symbol, timeframe)
+            lo, hi = series.bounds(start, end)
+            return series.timestamp[lo:hi].copy()
+        return self._query_timestamps(symbol, timeframe, start, end)
+
+    def _query_timestamps(self, symbol: str, timeframe: str,
+                          start: int = None, end: int = None) -> np.ndarray:
+        query = "SELECT timestamp FROM ohlcv WHERE symbol = ? AND timeframe = ?"
+        params = [symbol, timeframe]
+        if start:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end:
+            query += " AND timestamp <= ?"
+            params.append(end)
+        query += " ORDER BY timestamp ASC"
+        with self.get_conn() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+
+    def _query_last_timestamp(self, symbol: str, timeframe: str) -> Optional[int]:
         query = """
             SELECT MAX(timestamp) 
             FROM ohlcv 
@@ -157,3 +607,29 @@ class StorageEngine:
             cursor = conn.execute(query, (symbol, timeframe))
             result = cursor.fetchone()
             return result[0] if result else None
+
+def create_storage(config: dict) -> StorageEngine:
+    """StorageEngine for the `storage:` config section.
+
+    backend: sqlite (default) keeps candles in the ohlcv table; backend:
+    columnar keeps them in Arrow files under columnar_dir and uses the
+    database for everything else.
+    """
+    storage_config = config['storage']
+    kwargs = {
+        'ohlcv_cache_bytes': int(storage_config.get('ohlcv_cache_mb', 256) * 1024 * 1024),
+    }
+    resample = storage_config.get('resample')
+    if resample:
+        kwargs['resampler'] = ResampleRegistry(resample.get('base_timeframe', '1m'),
+                                               resample.get('timeframes', []))
+    backend = storage_config.get('backend', 'sqlite')
+    if backend == 'columnar':
+        # pyarrow is only needed for this backend
+        from services.columnar_storage import ColumnarStorageEngine
+        return ColumnarStorageEngine(storage_config['database'],
+                                     storage_config.get('columnar_dir', 'data/ohlcv'),
+                                     max_deltas=storage_config.get('columnar_max_deltas', 8), **kwargs)
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return StorageEngine(storage_config['database'], **kwargs)
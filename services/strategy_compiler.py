@@ -0,0 +1,317 @@
+import ast
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.indicators import IndicatorEngine
+
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+COMPARISONS = {
+    '<': np.less,
+    '>': np.greater,
+    '<=': np.less_equal,
+    '>=': np.greater_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+CROSSOVERS = ('crosses_above', 'crosses_below')
+
+_BINARY_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+}
+
+_PARAM_PREFIX = '__param_'
+
+# An expression takes the column arrays and the resolved parameters
+Expr = Callable[[Dict[str, np.ndarray], Dict[str, Any]], Any]
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Rolling mean down axis 0 for 1D series or bars x assets matrices"""
+    frame = pd.DataFrame(values.reshape(len(values), -1))
+    return frame.rolling(window=int(window)).mean().to_numpy().reshape(values.shape)
+
+# Lookback parameters of the derived series and their defaults
+DERIVED_PERIODS = {'volume_avg_period': 20}
+
+# $names that refer to series derived from columns rather than parameters:
+# name -> (columns needed, builder)
+DERIVED_SERIES = {
+    'avg_volume': (('volume',), lambda cols, params: rolling_mean(
+        cols['volume'], params.get('volume_avg_period', DERIVED_PERIODS['volume_avg_period']))),
+}
+
+def shift(values: np.ndarray) -> np.ndarray:
+    """Previous bar's value (NaN on the first bar)"""
+    shifted = np.empty_like(values, dtype=np.float64)
+    shifted[0] = np.nan
+    shifted[1:] = values[:-1]
+    return shifted
+
+def crosses(left, right, above: bool) -> np.ndarray:
+    left, right = np.broadcast_arrays(np.asarray(left, dtype=np.float64),
+                                      np.asarray(right, dtype=np.float64))
+    prev_left, prev_right = shift(left), shift(right)
+    if above:
+        return (left > right) & (prev_left <= prev_right)
+    return (left < right) & (prev_left >= prev_right)
+
+def indicator_for_column(column: str) -> Optional[str]:
+    """IndicatorEngine name behind a frame column, e.g. MACD_histogram -> MACD"""
+    if column in OHLCV_COLUMNS:
+        return None
+    name = column.split('_', 1)[0].upper()
+    if not hasattr(IndicatorEngine, f"calc_{name.lower()}"):
+        raise ValueError(f"Unknown indicator column: {column}")
+    return name
+
+class _ExpressionCompiler:
+    """Compiles one arithmetic expression into a closure over NumPy arrays.
+
+    Grammar: numbers, column names (RSI, MACD_histogram, close, ...),
+    $parameters or derived series ($avg_volume), + - * /, unary minus and
+    parentheses. Parsing happens once; evaluation is pure array math.
+    """
+
+    def __init__(self):
+        self.columns: Set[str] = set()
+
+    def compile(self, source: Any) -> Expr:
+        if isinstance(source, bool):
+            raise ValueError(f"Unsupported expression: {source!r}")
+        if isinstance(source, (int, float)):
+            value = float(source)
+            return lambda cols, params: value
+        text = re.sub(r'\$(\w+)', lambda m: _PARAM_PREFIX + m.group(1), str(source).strip())
+        try:
+            tree = ast.parse(text, mode='eval').body
+        except SyntaxError as e:
+            raise ValueError(f"Invalid expression {source!r}: {e.msg}") from e
+        return self._node(tree, source)
+
+    def _node(self, node: ast.AST, source: Any) -> Expr:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            value = float(node.value)
+            return lambda cols, params: value
+
+        if isinstance(node, ast.Name):
+            return self._name(node.id)
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._node(node.operand, source)
+            if isinstance(node.op, ast.USub):
+                return lambda cols, params: np.negative(operand(cols, params))
+            return operand
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            op = _BINARY_OPS[type(node.op)]
+            left, right = self._node(node.left, source), self._node(node.right, source)
+            return lambda cols, params: op(left(cols, params), right(cols, params))
+
+        raise ValueError(f"Unsupported expression: {source!r}")
+
+    def _name(self, name: str) -> Expr:
+        if name.startswith(_PARAM_PREFIX):
+            name = name[len(_PARAM_PREFIX):]
+            if name in DERIVED_SERIES:
+                needed, builder = DERIVED_SERIES[name]
+                self.columns.update(needed)
+                return builder
+
+            def parameter(cols, params):
+                if name not in params:
+                    raise KeyError(f"Unknown strategy parameter: ${name}")
+                return params[name]
+            return parameter
+
+        indicator_for_column(name)  # validate early
+        self.columns.add(name)
+        return lambda cols, params: cols[name]
+
+@dataclass
+class Signals:
+    entry: np.ndarray
+    exit: np.ndarray
+    stop_loss: float
+    take_profit: float
+    position_size: float
+
+@dataclass
+class CompiledStrategy:
+    """Entry/exit conditions compiled once, evaluated per parameter set.
+
+    All entry conditions must hold to open a position; any indicator exit
+    condition closes it, as do the stop_loss / take_profit thresholds.
+    """
+    entry: List[Expr]
+    exit: List[Expr]
+    stop_loss: Optional[Expr]
+    take_profit: Optional[Expr]
+    position_size: Expr
+    parameters: Dict[str, Any]
+    columns: Set[str]
+
+    @property
+    def indicators(self) -> List[str]:
+        """IndicatorEngine names the conditions reference"""
+        names = {indicator_for_column(c) for c in self.columns}
+        return sorted(n for n in names if n)
+
+    def evaluate(self, columns: Dict[str, np.ndarray],
+                 overrides: Optional[Dict[str, Any]] = None) -> Signals:
+        """Masks over the given column arrays (1D series or bars x assets)"""
+        params = {**self.parameters, **(overrides or {})}
+        shape = columns['close'].shape
+
+        entry = np.ones(shape, dtype=bool)
+        for condition in self.entry:
+            mask = condition(columns, params)
+            if mask is not None:
+                entry &= mask
+        exit_mask = np.zeros(shape, dtype=bool)
+        for condition in self.exit:
+            mask = condition(columns, params)
+            if mask is not None:
+                exit_mask |= mask
+
+        # Without a stop / target the pnl thresholds can never be crossed
+        stop_loss = float(self.stop_loss(columns, params)) if self.stop_loss else np.inf
+        take_profit = float(self.take_profit(columns, params)) if self.take_profit else np.inf
+        return Signals(entry, exit_mask, stop_loss, take_profit,
+                       float(self.position_size(columns, params)))
+
+def _compile_condition(condition: dict, compiler: _ExpressionCompiler) -> Expr:
+    """Compile one condition; it evaluates to None when switched off via
+    `enabled: false` or `enabled: "$flag"`"""
+    operator = condition.get('operator')
+    left = compiler.compile(condition['indicator'])
+    right = compiler.compile(condition['value'])
+
+    if operator in COMPARISONS:
+        compare = COMPARISONS[operator]
+        check = lambda cols, params: compare(left(cols, params), right(cols, params))
+    elif operator in CROSSOVERS:
+        above = operator == 'crosses_above'
+        check = lambda cols, params: crosses(left(cols, params), right(cols, params), above)
+    else:
+        raise ValueError(f"Unsupported operator: {operator}")
+
+    enabled = condition.get('enabled', True)
+    if enabled is True:
+        return check
+    if enabled is False:
+        return lambda cols, params: None
+    flag = re.fullmatch(r'\$(\w+)', str(enabled))
+    if not flag:
+        raise ValueError(f"enabled must be a boolean or $parameter, got {enabled!r}")
+    name = flag.group(1)
+    return lambda cols, params: check(cols, params) if params.get(name, True) else None
+
+# Defaults match the original hardcoded RSI mean reversion logic
+DEFAULT_RULES = {
+    'rsi_oversold': 30,
+    'rsi_exit': 50,
+    'stop_loss': 0.02,
+    'take_profit': 0.05,
+    'position_size': 0.1,
+}
+
+def resolve_rules(strategy_config: dict) -> Dict[str, float]:
+    """Collect the thresholds the RSI mean reversion simulation needs.
+
+    Values come from exit_conditions / risk_management in the strategy YAML,
+    and any key also present under `parameters` overrides them (this is how
+    parameter sweeps inject candidate values).
+    """
+    strategy = strategy_config.get('strategy', {})
+    params = strategy.get('parameters', {})
+    rules = dict(DEFAULT_RULES)
+    
+    # "$param" values are picked up from parameters below
+    for condition in strategy.get('exit_conditions', []):
+        value = condition.get('value')
+        if not isinstance(value, (int, float)):
+            continue
+        if condition.get('type') in ('stop_loss', 'take_profit'):
+            rules[condition['type']] = float(value)
+        elif condition.get('indicator') == 'RSI' and condition.get('operator') == '>':
+            rules['rsi_exit'] = float(value)
+    
+    position_size = strategy.get('risk_management', {}).get('position_size')
+    if isinstance(position_size, (int, float)):
+        rules['position_size'] = float(position_size)
+    
+    for key in rules:
+        if key in params:
+            rules[key] = params[key]
+    return rules
+
+def default_conditions(rules: Dict[str, Any], parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Entry/exit conditions equivalent to the built-in RSI mean reversion
+    rules; the strategy's other `parameters` (e.g. rsi_period) are kept"""
+    return {
+        'parameters': {**(parameters or {}), **rules},
+        'entry_conditions': [
+            {'indicator': 'RSI', 'operator': '<', 'value': '$rsi_oversold'},
+        ],
+        'exit_conditions': [
+            {'indicator': 'RSI', 'operator': '>', 'value': '$rsi_exit'},
+            {'type': 'stop_loss', 'value': '$stop_loss'},
+            {'type': 'take_profit', 'value': '$take_profit'},
+        ],
+        'risk_management': {'position_size': '$position_size'},
+    }
+
+def compile_expression(source: Any) -> Tuple[Expr, Set[str]]:
+    """Compile one arithmetic expression; returns it and the columns it reads"""
+    compiler = _ExpressionCompiler()
+    return compiler.compile(source), compiler.columns
+
+def compile_conditions(conditions: List[dict]) -> Tuple[List[Expr], Set[str]]:
+    """Compile a bare list of conditions (e.g. screener filters); returns the
+    expressions and the frame columns they reference"""
+    compiler = _ExpressionCompiler()
+    return [_compile_condition(c, compiler) for c in conditions], compiler.columns
+
+def compile_strategy(strategy_config: dict) -> CompiledStrategy:
+    """Compile `entry_conditions` / `exit_conditions` from a strategy YAML.
+
+    Strategies without entry_conditions compile to the built-in RSI mean
+    reversion rules (see resolve_rules).
+    """
+    strategy = strategy_config.get('strategy', {})
+    if not strategy.get('entry_conditions'):
+        strategy = default_conditions(resolve_rules(strategy_config), strategy.get('parameters'))
+
+    compiler = _ExpressionCompiler()
+    entry = [_compile_condition(c, compiler) for c in strategy['entry_conditions']]
+    exit_conditions, stop_loss, take_profit = [], None, None
+    for condition in strategy.get('exit_conditions', []):
+        if condition.get('type') == 'stop_loss':
+            stop_loss = compiler.compile(condition['value'])
+        elif condition.get('type') == 'take_profit':
+            take_profit = compiler.compile(condition['value'])
+        else:
+            exit_conditions.append(_compile_condition(condition, compiler))
+
+    position_size = compiler.compile(
+        strategy.get('risk_management', {}).get('position_size', 0.1))
+
+    parameters = dict(strategy.get('parameters', {}))
+    compiler.columns.add('close')
+    return CompiledStrategy(
+        entry=entry,
+        exit=exit_conditions,
+        stop_loss=stop_loss,
+        take_profit=take_profit,
+        position_size=position_size,
+        parameters=parameters,
+        columns=compiler.columns,
+    )
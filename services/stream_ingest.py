@@ -0,0 +1,173 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+from websockets.asyncio.client import connect
+
+from services.storage import StorageEngine
+from services.backfill import Backfiller
+from services.ohlcv_cache import PRICE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_URL = "wss://stream.binance.com:9443"
+
+def stream_name(symbol: str, timeframe: str) -> str:
+    """Binance kline stream for a CCXT symbol, e.g. 'btcusdt@kline_1m'"""
+    return f"{symbol.replace('/', '').lower()}@kline_{timeframe}"
+
+class StreamIngestor:
+    """Keeps watchlist candles current from the exchange's WebSocket feed.
+
+    One connection carries a kline stream per (symbol, timeframe) pair.
+    Every kline event holds the exchange's full state of the candle, so
+    updates are idempotent; they are merged per candle in memory and written
+    to StorageEngine in micro-batches every `flush_interval_ms`. Higher
+    timeframes configured under `storage.resample` are not subscribed;
+    they are rebuilt locally from the base candles as those are stored. On
+    every (re)connect the gap since the last stored candle is backfilled
+    over REST before buffered events are applied. Reconnects back off
+    exponentially up to `reconnect_max_sec`. Speaks the Binance combined
+    stream format; `url` can point at any compatible feed.
+    """
+
+    def __init__(self, storage: StorageEngine, backfiller: Backfiller, config: dict,
+                 pairs: Iterable[Tuple[str, str]], clock: Callable[[], float] = time.time):
+        self.storage = storage
+        self.backfiller = backfiller
+        self.clock = clock
+        stream_config = config.get('data_sources', {}).get('stream', {})
+        self.url = stream_config.get('url', DEFAULT_STREAM_URL).rstrip('/')
+        self.flush_interval_sec = stream_config.get('flush_interval_ms', 250) / 1000
+        self.reconnect_min_sec = stream_config.get('reconnect_min_sec', 1.0)
+        self.reconnect_max_sec = stream_config.get('reconnect_max_sec', 60.0)
+        self.streams = {stream_name(symbol, timeframe): (symbol, timeframe) for symbol, timeframe in sorted(pairs)}
+        self._pending: Dict[Tuple[str, str], Dict[int, tuple]] = {}
+        self.running = False
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+        self.connections = 0
+        self.messages = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.backfilled_rows = 0
+        self.last_latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def stream_url(self) -> str:
+        return f"{self.url}/stream?streams=" + "/".join(self.streams)
+
+    def covers(self, symbol: str, timeframe: str) -> bool:
+        """Whether the feed is currently keeping this pair up to date"""
+        return self.connected and stream_name(symbol, timeframe) in self.streams
+
+    def ingest(self, raw: str) -> bool:
+        """Buffer one feed message; False if it isn't a kline we subscribed to"""
+        message = json.loads(raw)
+        data = message.get('data', message)
+        key = self.streams.get(message.get('stream', ''))
+        if data.get('e') != 'kline' or key is None:
+            return False
+        kline = data['k']
+        row = (float(kline['o']), float(kline['h']), float(kline['l']), float(kline['c']), float(kline['v']))
+        # Later events for the same candle supersede earlier ones
+        self._pending.setdefault(key, {})[int(kline['t'])] = row
+        self.messages += 1
+        if 'E' in data:
+            self.last_latency_ms = self.clock() * 1000 - data['E']
+        return True
+
+    async def flush(self) -> int:
+        """Write buffered candles, one store_ohlcv call per pair"""
+        pending, self._pending = self._pending, {}
+        written = 0
+        for (symbol, timeframe), rows in pending.items():
+            timestamps = sorted(rows)
+            df = pd.DataFrame([rows[ts] for ts in timestamps], columns=list(PRICE_COLUMNS))
+            df.insert(0, 'timestamp', timestamps)
+            await asyncio.to_thread(self.storage.store_ohlcv, symbol, timeframe, df)
+            written += len(df)
+        if written:
+            self.flushes += 1
+            self.rows_written += written
+        return written
+
+    async def backfill_gaps(self):
+        """REST-fill every pair from its last stored candle (inclusive: it was
+        likely still in progress when the socket dropped) up to now"""
+        # Events buffered before the drop must not land over the REST data
+        await self.flush()
+        for symbol, timeframe in self.streams.values():
+            last_ts = await asyncio.to_thread(self.storage.get_last_timestamp, symbol, timeframe)
+            if last_ts is None:
+                continue  # initial history is the collector's job
+            result = await self.backfiller.backfill(symbol, timeframe, last_ts)
+            self.backfilled_rows += result['rows']
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_sec)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Stream flush failed: {e}")
+
+    async def run_forever(self):
+        """Connect, backfill, consume; reconnect with backoff until stopped"""
+        if not self.streams:
+            return
+        self.running = True
+        self._task = asyncio.current_task()
+        flusher = asyncio.create_task(self._flush_loop())
+        attempt = 0
+        try:
+            while self.running:
+                try:
+                    async with connect(self.stream_url()) as ws:
+                        self.connections += 1
+                        logger.info(f"Stream connected: {len(self.streams)} streams")
+                        # Events arriving meanwhile wait in the socket buffer and
+                        # are applied after the REST data, so newer values win
+                        await self.backfill_gaps()
+                        self.connected = True
+                        attempt = 0
+                        async for raw in ws:
+                            self.ingest(raw)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.warning(f"Stream disconnected: {e}")
+                finally:
+                    self.connected = False
+                if not self.running:
+                    break
+                delay = min(self.reconnect_min_sec * 2 ** attempt, self.reconnect_max_sec)
+                attempt += 1
+                await asyncio.sleep(delay)
+        finally:
+            flusher.cancel()
+            await self.flush()
+            self.running = False
+
+    def stop(self):
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+
+    def metrics(self) -> Dict:
+        return {
+            'running': self.running,
+            'connected': self.connected,
+            'streams': len(self.streams),
+            'connections': self.connections,
+            'messages': self.messages,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'backfilled_rows': self.backfilled_rows,
+            'last_latency_ms': self.last_latency_ms,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,29 @@
+import re
+
+_UNIT_MS = {
+    'm': 60_000,
+    'h': 3_600_000,
+    'd': 86_400_000,
+    'w': 604_800_000,
+    'M': 2_592_000_000,  # 30 days, close enough for scheduling and gap maths
+}
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """Candle duration in milliseconds for CCXT-style timeframes ('1m', '4h', '1d')"""
+    match = re.fullmatch(r'(\d+)([mhdwM])', timeframe)
+    if not match:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return int(match.group(1)) * _UNIT_MS[match.group(2)]
+
+# Exchange weeks open on Monday; the Unix epoch fell on a Thursday
+_WEEK_OFFSET_MS = 4 * _UNIT_MS['d']
+
+def candle_open(timestamp_ms: int, timeframe: str) -> int:
+    """Open time of the candle containing timestamp_ms"""
+    duration = timeframe_to_ms(timeframe)
+    offset = _WEEK_OFFSET_MS if timeframe.endswith('w') else 0
+    return (timestamp_ms - offset) // duration * duration + offset
+
+def next_candle_close(timestamp_ms: int, timeframe: str) -> int:
+    """Close time (= next open) of the candle containing timestamp_ms"""
+    return candle_open(timestamp_ms, timeframe) + timeframe_to_ms(timeframe)
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DISCORD_MAX_CONTENT = 2000
+
+@dataclass
+class Notification:
+    title: str
+    message: str
+    key: str
+
+def webhook_targets(webhooks: Dict[str, str]) -> Dict[str, str]:
+    """Configured webhook URLs by name, skipping unset ${VAR} placeholders and
+    values that are not URLs (e.g. a bare bot token)"""
+    return {name: url for name, url in (webhooks or {}).items()
+            if url and "${" not in url and url.startswith(("http://", "https://"))}
+
+def is_discord(name: str, url: str) -> bool:
+    return "discord" in name or "discord" in url
+
+def format_batch(batch: List[Notification], counts: Dict[str, int]) -> str:
+    if len(batch) == 1 and counts[batch[0].key] == 1:
+        return f"**{batch[0].title}**\n{batch[0].message}"
+    lines = []
+    for n in batch:
+        repeat = f" (x{counts[n.key]})" if counts[n.key] > 1 else ""
+        lines.append(f"**{n.title}**{repeat}: {n.message}")
+    return "\n".join(lines)
+
+def split_content(content: str, limit: int = DISCORD_MAX_CONTENT) -> List[str]:
+    """Split on line boundaries into chunks of at most `limit` characters"""
+    chunks, current = [], ""
+    for line in content.split("\n"):
+        line = line[:limit]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+class WebhookDispatcher:
+    """Delivers alert notifications to webhooks off the evaluation path.
+
+    submit() only enqueues, so a slow endpoint never holds up whoever raised
+    the alert. A worker collects bursts for `batch_window_ms` (up to
+    `max_batch`), collapses duplicates and sends one combined message per
+    webhook. Posts share one pooled httpx client, with at most
+    `max_concurrency` in flight per webhook. Failed posts (connection
+    errors, 429, 5xx) are retried with exponential backoff, honouring
+    Retry-After, up to `max_retries` times. Settings live under
+    `alerts.delivery`; targets are `alerts.webhooks` or a per-alert URL.
+    """
+
+    def __init__(self, config: dict):
+        alerts_config = config.get('alerts', {})
+        delivery = alerts_config.get('delivery', {})
+        self.targets = webhook_targets(alerts_config.get('webhooks', {}))
+        self.batch_window_sec = delivery.get('batch_window_ms', 500) / 1000
+        self.max_batch = delivery.get('max_batch', 20)
+        self.max_concurrency = delivery.get('max_concurrency', 2)
+        self.max_retries = delivery.get('max_retries', 5)
+        self.retry_base_sec = delivery.get('retry_base_sec', 1.0)
+        self.retry_max_sec = delivery.get('retry_max_sec', 60.0)
+        self.timeout_sec = delivery.get('timeout_sec', 10.0)
+        self.max_queue = delivery.get('max_queue', 10000)
+        self.max_connections = delivery.get('max_connections', 20)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._sending: Set[asyncio.Task] = set()
+        self._undispatched = 0
+        self.submitted = 0
+        self.dropped = 0
+        self.batches = 0
+        self.posts = 0
+        self.retries = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.last_error: Optional[str] = None
+
+    def submit(self, title: str, message: str, url: Optional[str] = None, key: Optional[str] = None) -> bool:
+        """Queue a notification for every configured webhook (or only `url`);
+        False if there is nowhere to send it or the queue is full. Must be
+        called from the event loop."""
+        targets = {url: url} if url else self.targets
+        if not targets:
+            logger.info(f"ALERT: {title} - {message}")
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((targets, Notification(title, message, key or f"{title}\n{message}")))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Alert queue full, dropped: {title}")
+            return False
+        self.submitted += 1
+        self._undispatched += 1
+        return True
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue(self.max_queue)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        self._client = self._client or httpx.AsyncClient(
+            timeout=self.timeout_sec, limits=httpx.Limits(max_connections=self.max_connections))
+        while True:
+            batch = [await self._queue.get()]
+            # Give a burst time to arrive, then take what is queued
+            deadline = asyncio.get_running_loop().time() + self.batch_window_sec
+            while len(batch) < self.max_batch:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            self._undispatched -= len(batch)
+            by_url: Dict[str, tuple] = {}
+            for targets, notification in batch:
+                for name, url in targets.items():
+                    by_url.setdefault(url, (name, []))[1].append(notification)
+            for url, (name, notifications) in by_url.items():
+                task = asyncio.create_task(self._deliver(name, url, notifications))
+                self._sending.add(task)
+                task.add_done_callback(self._sending.discard)
+
+    async def _deliver(self, name: str, url: str, notifications: List[Notification]):
+        counts: Dict[str, int] = {}
+        unique = []
+        for n in notifications:
+            if n.key not in counts:
+                unique.append(n)
+            counts[n.key] = counts.get(n.key, 0) + 1
+        content = format_batch(unique, counts)
+        limit = self._limits.setdefault(url, asyncio.Semaphore(self.max_concurrency))
+        async with limit:
+            if is_discord(name, url):
+                payloads = [{"content": chunk} for chunk in split_content(content)]
+            else:
+                payloads = [{"text": content}]
+            for payload in payloads:
+                await self._post(name, url, payload)
+
+    async def _post(self, name: str, url: str, payload: dict) -> bool:
+        for attempt in range(self.max_retries + 1):
+            delay = min(self.retry_base_sec * 2 ** attempt, self.retry_max_sec)
+            self.in_flight += 1
+            try:
+                response = await self._client.post(url, json=payload)
+                if response.status_code < 400:
+                    self.posts += 1
+                    return True
+                self.last_error = f"{name}: HTTP {response.status_code}"
+                if response.status_code != 429 and response.status_code < 500:
+                    break  # the request itself is wrong; retrying won't help
+                retry_after = response.headers.get('Retry-After')
+                if retry_after is not None:
+                    try:
+                        delay = min(float(retry_after), self.retry_max_sec)
+                    except ValueError:
+                        pass
+            except httpx.HTTPError as e:
+                self.last_error = f"{name}: {e!r}"
+            finally:
+                self.in_flight -= 1
+            if attempt < self.max_retries:
+                self.retries += 1
+                await asyncio.sleep(delay)
+        self.failed += 1
+        logger.error(f"Failed to send webhook to {name}: {self.last_error}")
+        return False
+
+    async def drain(self):
+        """Wait until everything queued so far has been delivered or given up on"""
+        while self._undispatched or self._sending:
+            if self._sending:
+                await asyncio.gather(*list(self._sending), return_exceptions=True)
+            else:
+                await asyncio.sleep(0.01)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        if self._sending:
+            await asyncio.gather(*list(self._sending), return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._queue = None
+        self._undispatched = 0
+        self._limits = {}
+
+    def stats(self) -> Dict:
+        return {
+            'targets': sorted(self.targets),
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'posts': self.posts,
+            'retries': self.retries,
+            'failed': self.failed,
+            'in_flight': self.in_flight,
+            'last_error': self.last_error,
+        }
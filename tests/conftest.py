@@ -1,6 +1,13 @@
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
 import pytest
 from fastapi.testclient import TestClient
 from api.main import app
+from services.storage import StorageEngine
+from services.timeframes import candle_open, timeframe_to_ms
 
 @pytest.fixture
 def client():
@@ -8,3 +15,51 @@ def client():
     Fixture for FastAPI TestClient.
     """
     return TestClient(app)
+
+def make_ohlcv(n: int, seed: int = 7, start: int = 1_600_000_000_000, step: int = 60_000) -> pd.DataFrame:
+    """Random-walk candles with enough volatility to hit stops and targets"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.004, n)) * close
+    return pd.DataFrame({
+        'timestamp': start + np.arange(n, dtype=np.int64) * step,
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.uniform(10, 100, n),
+    })
+
+@pytest.fixture
+def storage(tmp_path):
+    engine = StorageEngine(str(tmp_path / "test.db"))
+    engine.store_ohlcv("BTC/USDT", "1m", make_ohlcv(5000))
+    return engine
+
+class FakeFetcher:
+    """Exchange stand-in serving random-walk candles on the timeframe grid up
+    to the current time, honouring `since` and `limit`"""
+
+    def __init__(self, delay: float = 0.0, now=time.time, outage=None):
+        self.delay = delay
+        self.now = now
+        self.outage = outage or (0, 0)  # [from, to) ms with no data on the exchange
+        self.calls = []
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+    async def fetch_ohlcv(self, symbol, timeframe, limit=500, since=None):
+        self.calls.append((symbol, timeframe, limit, since))
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        await asyncio.sleep(self.delay)
+        self.concurrent -= 1
+
+        interval = timeframe_to_ms(timeframe)
+        last_open = candle_open(int(self.now() * 1000), timeframe)
+        first = since if since is not None else last_open - (limit - 1) * interval
+        first = candle_open(first, timeframe) + (interval if candle_open(first, timeframe) < first else 0)
+        count = max(min(limit, (last_open - first) // interval + 1), 0)
+        df = make_ohlcv(count, start=first, step=interval) if count else make_ohlcv(0)
+        return df[(df['timestamp'] < self.outage[0]) | (df['timestamp'] >= self.outage[1])].reset_index(drop=True)
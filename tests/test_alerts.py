@@ -0,0 +1,142 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from services.alerts import AlertEngine, RuleBook, compile_rule, parse_condition
+from services.indicators import IndicatorEngine
+from services.strategy_compiler import compile_expression
+from services.storage import StorageEngine
+from tests.conftest import make_ohlcv
+
+START = 1_600_000_000_000
+
+def book(*conditions):
+    rules = [compile_rule({'symbol': 'BTC/USDT', 'condition': c}) for c in conditions]
+    sources = {s for r in rules for clause in r.clauses for atom, _ in clause for s in atom[1:]}
+    return RuleBook(rules, {s: compile_expression(s)[0] for s in sources})
+
+def test_conditions_compile_to_clauses():
+    clauses, columns = parse_condition("RSI < 30 AND (MACD_histogram crosses_above 0 or price > BB_upper * 1.01)")
+    assert columns == {'RSI', 'MACD_histogram', 'close', 'BB_upper'}
+    assert clauses == [
+        [(('<', 'RSI', '30'), False), (('crosses_above', 'MACD_histogram', '0'), False)],
+        [(('<', 'RSI', '30'), False), (('>', 'close', 'BB_upper * 1.01'), False)],
+    ]
+    # not (a and b) -> not a or not b
+    clauses, _ = parse_condition("not (RSI > 70 and close > 100)")
+    assert clauses == [[(('>', 'RSI', '70'), True)], [(('>', 'close', '100'), True)]]
+
+    for bad in ("RSI <", "__import__('os').system('x')", "FOO > 1", "RSI < $oversold", "RSI + 1",
+                "SMA_20 > close"):
+        with pytest.raises(ValueError):
+            compile_rule({'symbol': 'BTC/USDT', 'condition': bad})
+
+def test_rule_book_evaluates_every_rule_in_one_pass():
+    rules = book("RSI < 30", "RSI < 30 and close > 100", "MACD_histogram crosses_above 0 or RSI > 70",
+                 "not (close > 50)", "MACD_histogram crosses_below 0", "20 < RSI < 40")
+    cols = {'RSI': np.array([35.0, 25.0]), 'close': np.array([99.0, 101.0]),
+            'MACD_histogram': np.array([-0.5, 0.2])}
+    assert rules.evaluate(cols).tolist() == [True, True, True, False, False, True]
+    # RSI < 30 and its operands are shared between the first two rules
+    assert len(rules.values) == 10 and len(rules.left) == 8 and len(rules.literal_atoms) == 9
+    assert len(rules.operands) == 3  # only RSI, close and MACD_histogram are read per tick
+
+    cols['RSI'] = np.array([25.0, np.nan])  # warm-up values never match
+    assert rules.evaluate(cols).tolist() == [False, False, True, False, False, False]
+
+def test_alerts_fire_on_transitions_with_cooldown():
+    rules = book("close > 100")
+    rules.cooldown[:] = 60
+    above, below = np.array([True]), np.array([False])
+    assert rules.fire(above, 0.0).tolist() == [0]
+    assert rules.fire(above, 10.0).tolist() == []   # still true, already fired
+    assert rules.fire(below, 20.0).tolist() == []
+    assert rules.fire(above, 30.0).tolist() == []   # within the cooldown
+    rules.fire(below, 40.0)
+    assert rules.fire(above, 90.0).tolist() == [0]
+
+@pytest.fixture
+def engine(tmp_path):
+    storage = StorageEngine(str(tmp_path / "alerts.db"))
+    storage.store_ohlcv('ETH/USDT', '1m', make_ohlcv(400, start=START))
+    config = {'alerts': {'check_interval_sec': 1, 'default_timeframe': '1m', 'rules': [
+        {'name': 'always', 'symbol': 'ETH/USDT', 'timeframe': '1m', 'condition': 'RSI > 0'},
+        {'name': 'never', 'symbol': 'ETH/USDT', 'timeframe': '1m', 'condition': 'RSI > 100 or close < 0'},
+    ]}}
+    clock = [(START + 399 * 60_000 + 30_000) / 1000]
+    sent = []
+
+    class Dispatcher:
+        def submit(self, title, message, url=None, key=None):
+            sent.append((title, message))
+
+    engine = AlertEngine(storage, config, dispatcher=Dispatcher(), clock=lambda: clock[0])
+    engine.clock_value, engine.sent = clock, sent
+    return engine
+
+def test_engine_uses_incremental_indicators(engine):
+    engine.load_rules()
+    assert engine.evaluate() and engine.evaluated_books == 1
+    cols = engine._columns(('ETH/USDT', '1m'), engine.books[('ETH/USDT', '1m')], 0)
+    assert cols is None  # nothing changed since the last tick
+
+    # A new candle: the previous one is committed, the new one peeked
+    df = make_ohlcv(401, start=START)
+    engine.storage.store_ohlcv('ETH/USDT', '1m', df.tail(1))
+    cols = engine._columns(('ETH/USDT', '1m'), engine.books[('ETH/USDT', '1m')], 0)
+    rsi = IndicatorEngine.calc_rsi(engine.storage.get_ohlcv('ETH/USDT', '1m', start=START + 100 * 60_000))
+    assert cols['RSI'] == pytest.approx(rsi.iloc[-2:].to_numpy())
+    assert cols['close'].tolist() == df['close'].iloc[-2:].tolist()
+
+def test_tick_notifies_and_records_stored_rules(engine):
+    alert_id = engine.storage.add_alert_rule('ETH/USDT', 'close > 0 and volume > 0')
+
+    async def run():
+        task = asyncio.create_task(engine.run_forever())
+        while engine.ticks < 1:
+            await asyncio.sleep(0.01)
+        engine.stop()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert [title for title, _ in engine.sent] == ['always', 'ETH/USDT close > 0 and volume > 0']
+    assert engine.sent[0][1].startswith('ETH/USDT 1m: RSI > 0 (RSI=')
+    (stored,) = engine.storage.get_alert_rules()
+    assert stored['id'] == alert_id and stored['last_triggered'] == engine.clock_value[0]
+    metrics = engine.metrics()
+    assert metrics['rules'] == 3 and metrics['triggered'] == 2 and not metrics['running']
+
+    # Still true on the next tick, so nothing is resent
+    engine.storage.store_ohlcv('ETH/USDT', '1m', make_ohlcv(401, start=START).tail(1))
+    assert asyncio.run(engine.tick()) == 0
+
+def test_stored_rules_resume_their_cooldown(engine):
+    engine.cooldown_sec = 300
+    now = engine.clock_value[0]
+    recent = engine.storage.add_alert_rule('ETH/USDT', 'close > 0')
+    stale = engine.storage.add_alert_rule('ETH/USDT', 'volume > 0')
+    engine.storage.mark_alerts_triggered([recent], now - 60)
+    engine.storage.mark_alerts_triggered([stale], now - 600)
+
+    assert asyncio.run(engine.tick()) == 2
+    assert sorted(title for title, _ in engine.sent) == ['ETH/USDT volume > 0', 'always']
+    stored = {row['id']: row['last_triggered'] for row in engine.storage.get_alert_rules()}
+    assert stored == {recent: now - 60, stale: now}
+
+def test_thousands_of_rules_evaluate_in_milliseconds(tmp_path):
+    storage = StorageEngine(str(tmp_path / "many.db"))
+    symbols = [f"S{i}/USDT" for i in range(200)]
+    for i, symbol in enumerate(symbols):
+        storage.store_ohlcv(symbol, '1m', make_ohlcv(60, seed=i, start=START))
+    conditions = ["RSI < {}", "close > {} and RSI > 50", "MACD_histogram crosses_above 0 or RSI < {}",
+                  "BB_lower > close * {}", "not (RSI > {} or ATR > 5)"]
+    rules = [{'symbol': s, 'timeframe': '1m', 'condition': c.format(20 + k)}
+             for s in symbols for k, c in enumerate(conditions * 2)]
+    engine = AlertEngine(storage, {'alerts': {'rules': rules, 'warmup_bars': 60}},
+                         clock=lambda: (START + 59 * 60_000) / 1000)
+    engine.load_rules()
+    assert engine.rule_count == 2000 and not engine.invalid
+    engine.evaluate()
+    assert engine.evaluated_books == 200
+    assert engine.last_eval_ms < 200
@@ -0,0 +1,54 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+import api.main
+from services.market_data import MarketDataService
+from services.storage import StorageEngine
+from tests.conftest import FakeFetcher
+
+@pytest.fixture
+def market_data(tmp_path, monkeypatch):
+    service = MarketDataService(StorageEngine(str(tmp_path / "api.db")), FakeFetcher(), {})
+    monkeypatch.setattr(api.main, 'market_data', service)
+    return service
+
+def test_formats_carry_the_same_candles(client, market_data):
+    url = "/api/v1/ohlcv/BTC/USDT/1h"
+    rows = client.get(url, params={'limit': 50}).json()['data']
+    columnar = client.get(url, params={'limit': 50, 'format': 'columnar'})
+    arrow = client.get(url, params={'limit': 50, 'format': 'arrow'})
+
+    data = columnar.json()['data']
+    assert columnar.json()['success'] is True
+    assert data['symbol'] == 'BTC/USDT' and data['lastUpdate'] == rows['lastUpdate']
+    assert data['ohlcv']['timestamp'] == [r['timestamp'] for r in rows['ohlcv']]
+    assert data['ohlcv']['close'] == [r['close'] for r in rows['ohlcv']]
+    assert columnar.headers['X-Data-Source'] == 'storage'
+
+    assert arrow.headers['content-type'] == 'application/vnd.apache.arrow.stream'
+    table = pa.ipc.open_stream(arrow.content).read_all()
+    assert table.schema.metadata[b'timeframe'] == b'1h'
+    np.testing.assert_array_equal(table.column('timestamp').to_numpy(), data['ohlcv']['timestamp'])
+    np.testing.assert_array_equal(table.column('volume').to_numpy(), data['ohlcv']['volume'])
+
+def test_unknown_format_is_rejected(client, market_data):
+    assert client.get("/api/v1/ohlcv/BTC/USDT/1h", params={'format': 'xml'}).status_code == 422
+
+def test_indicators_rows_and_columnar_tail(client, market_data):
+    url = "/api/v1/indicators/BTC/USDT/1h"
+    full = client.get(url, params={'indicators': 'RSI,MACD'}).json()['data']
+    assert len(full['RSI']) == 500
+    # Warm-up NaNs come back as null
+    assert full['RSI'][0]['value'] is None and full['RSI'][-1]['value'] is not None
+    assert set(full['MACD'][-1]) == {'timestamp', 'macd', 'signal', 'histogram'}
+
+    since = full['RSI'][-10]['timestamp']
+    tail = client.get(url, params={'indicators': 'RSI,MACD', 'since': since}).json()['data']
+    assert tail['RSI'] == full['RSI'][-10:]
+    assert tail['MACD'] == full['MACD'][-10:]
+
+    columnar = client.get(url, params={'indicators': 'RSI,MACD', 'limit': 3, 'format': 'columnar'}).json()['data']
+    assert columnar['timestamp'] == [p['timestamp'] for p in full['RSI'][-3:]]
+    assert columnar['indicators']['RSI']['value'] == [p['value'] for p in full['RSI'][-3:]]
+    assert columnar['indicators']['MACD']['signal'] == [p['signal'] for p in full['MACD'][-3:]]
@@ -0,0 +1,67 @@
+import asyncio
+
+import numpy as np
+
+from services.backfill import Backfiller, missing_ranges
+from services.rate_limit import TokenBucket
+from tests.conftest import FakeFetcher, make_ohlcv
+
+M = 60_000
+START = 1_599_999_960_000  # on the 1m grid
+
+def test_missing_ranges():
+    ts = START + M * np.array([2, 3, 4, 7, 8, 12], dtype=np.int64)
+    assert missing_ranges(ts, M, START, START + 15 * M) == [
+        (START, START + 2 * M),
+        (START + 5 * M, START + 7 * M),
+        (START + 9 * M, START + 12 * M),
+        (START + 13 * M, START + 15 * M),
+    ]
+    assert missing_ranges(ts[:0], M, START, START + 5 * M) == [(START, START + 5 * M)]
+    assert missing_ranges(START + M * np.arange(5), M, START, START + 5 * M) == []
+    # The newest stored candle may be incomplete
+    assert missing_ranges(ts, M, START, START + 15 * M, include_last=True) == [
+        (START, START + 2 * M),
+        (START + 5 * M, START + 7 * M),
+        (START + 9 * M, START + 15 * M),
+    ]
+    assert missing_ranges(START + M * np.arange(5), M, START, START + 5 * M, include_last=True) == [
+        (START + 4 * M, START + 5 * M)]
+
+def test_backfill_pages_through_gaps(storage):
+    # 5000 stored candles with two interior holes
+    df = make_ohlcv(5000, start=START)
+    holes = ((df['timestamp'] >= START + 100 * M) & (df['timestamp'] < START + 350 * M)) \
+        | (df['timestamp'] == START + 4000 * M)
+    storage.store_ohlcv('SOL/USDT', '1m', df[~holes])
+
+    end = START + 8000 * M
+    fetcher = FakeFetcher(now=lambda: end / 1000, outage=(START + 7000 * M, START + 7100 * M))
+    backfiller = Backfiller(storage, fetcher, TokenBucket(rate=1000), page_limit=1000, max_concurrency=3)
+
+    result = asyncio.run(backfiller.backfill('SOL/USDT', '1m', START, end))
+    assert result['gaps'] == 3
+    assert result['missing_candles'] == 250 + 1 + 3000
+    # 1 page + 1 page + 4 pages for the tail, which starts at the last stored candle
+    assert result['pages'] == 6 and len(fetcher.calls) == 6
+    assert fetcher.max_concurrent <= 3
+    assert all(call[3] is not None and call[2] == 1000 for call in fetcher.calls)
+    assert result['unfilled_candles'] == 100
+    assert result['rows'] == 250 + 1 + 3000 - 100 + 1
+
+    ts = storage.get_timestamps('SOL/USDT', '1m', START, end - 1)
+    assert len(ts) == 8000 - 100
+    assert missing_ranges(ts, M, START, end) == [(START + 7000 * M, START + 7100 * M)]
+
+    # Only the outage and the newest candle are fetched next time
+    fetcher.calls.clear()
+    result = asyncio.run(backfiller.backfill('SOL/USDT', '1m', START, end))
+    assert result['pages'] == 2 and result['rows'] == 1 and result['unfilled_candles'] == 100
+
+def test_backfill_into_empty_storage_writes_page_by_page(storage):
+    end = START + 2500 * M
+    fetcher = FakeFetcher(now=lambda: end / 1000)
+    backfiller = Backfiller(storage, fetcher, TokenBucket(rate=1000), page_limit=1000)
+    result = asyncio.run(backfiller.backfill('ETH/USDT', '1m', START, end))
+    assert result['expected_candles'] == 2500 and result['pages'] == 3
+    assert len(storage.get_ohlcv('ETH/USDT', '1m')) == 2500
@@ -0,0 +1,139 @@
+import pytest
+
+from dataclasses import replace
+
+from services.backtester import Backtester, simulate_signals
+from services.optimizer import (
+    ParameterSweep, WalkForwardOptimizer, expand_parameter_grid, load_strategy_config, apply_parameters,
+    load_strategy_arrays, signal_context_bars, _simulate_window
+)
+from services.strategy_compiler import compile_strategy
+
+@pytest.mark.parametrize("oversold", [25, 30, 40])
+def test_vectorized_engine_matches_loop(storage, oversold):
+    backtester = Backtester(storage)
+    config = {'strategy': {'parameters': {'rsi_oversold': oversold}}}
+
+    loop = backtester.run_backtest(config, "BTC/USDT", "1m", None, None, engine="loop")
+    vectorized = backtester.run_backtest(config, "BTC/USDT", "1m", None, None, engine="vectorized")
+
+    assert loop['metrics']['total_trades'] > 0
+    assert vectorized['trades'] == loop['trades']
+    assert vectorized['metrics'] == loop['metrics']
+    assert vectorized['final_capital'] == loop['final_capital']
+
+@pytest.mark.parametrize("overrides", [{}, {'volume_threshold_multiplier': 1.0}, {'rsi_period': 7}])
+def test_engines_agree_on_shipped_strategy(storage, overrides):
+    backtester = Backtester(storage)
+    config = apply_parameters(load_strategy_config("rsi_mean_reversion"), {'rsi_oversold': 40, **overrides})
+
+    loop = backtester.run_backtest(config, "BTC/USDT", "1m", None, None, engine="loop")
+    vectorized = backtester.run_backtest(config, "BTC/USDT", "1m", None, None, engine="vectorized")
+
+    assert loop['metrics']['total_trades'] > 0
+    assert vectorized['trades'] == loop['trades']
+    assert vectorized['final_capital'] == loop['final_capital']
+
+def test_rsi_period_is_honoured(storage):
+    backtester = Backtester(storage)
+    config = load_strategy_config("rsi_mean_reversion")
+    default = backtester.run_backtest(apply_parameters(config, {'rsi_oversold': 40}), "BTC/USDT", "1m", None, None)
+    short = backtester.run_backtest(apply_parameters(config, {'rsi_oversold': 40, 'rsi_period': 7}),
+                                    "BTC/USDT", "1m", None, None)
+    assert short['trades'] != default['trades']
+
+def test_legacy_strategy_keeps_rsi_period(storage):
+    backtester = Backtester(storage)
+    legacy = {'strategy': {'parameters': {'rsi_oversold': 40, 'rsi_period': 7}}}
+    explicit = apply_parameters(load_strategy_config("rsi_mean_reversion"),
+                                {'rsi_oversold': 40, 'rsi_period': 7, 'volume_confirmation': False})
+    expected = backtester.run_backtest(explicit, "BTC/USDT", "1m", None, None)
+    for engine in ("vectorized", "loop"):
+        result = backtester.run_backtest(legacy, "BTC/USDT", "1m", None, None, engine=engine)
+        assert result['metrics']['total_trades'] > 0
+        assert result['trades'] == expected['trades']
+    default = backtester.run_backtest({'strategy': {'parameters': {'rsi_oversold': 40}}}, "BTC/USDT", "1m", None, None)
+    assert default['trades'] != expected['trades']
+
+def test_unknown_engine_rejected(storage):
+    with pytest.raises(ValueError):
+        Backtester(storage).run_backtest({}, "BTC/USDT", "1m", None, None, engine="numba")
+
+def test_empty_range_returns_error(storage):
+    result = Backtester(storage).run_backtest({}, "ETH/USDT", "1m", None, None)
+    assert 'error' in result
+
+def test_expand_parameter_grid():
+    combos = expand_parameter_grid({
+        'rsi_oversold': {'min': 20, 'max': 30, 'step': 5},
+        'stop_loss': {'min': 0.01, 'max': 0.02, 'step': 0.005},
+        'take_profit': [0.05],
+    })
+    assert len(combos) == 9
+    assert combos[0] == {'rsi_oversold': 20, 'stop_loss': 0.01, 'take_profit': 0.05}
+    assert {c['stop_loss'] for c in combos} == {0.01, 0.015, 0.02}
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_sweep_matches_individual_backtests(storage, max_workers):
+    backtester = Backtester(storage)
+    config = load_strategy_config("rsi_mean_reversion")
+    ranges = {'rsi_oversold': [25, 35], 'stop_loss': [0.01, 0.03]}
+
+    sweep = ParameterSweep(backtester, max_workers=max_workers).run(
+        config, "BTC/USDT", "1m", None, None, parameter_ranges=ranges)
+
+    assert sweep['combinations'] == 4
+    returns = [row['total_return_pct'] for row in sweep['results']]
+    assert returns == sorted(returns, reverse=True)
+
+    for row in sweep['results']:
+        single = backtester.run_backtest(
+            apply_parameters(config, row['parameters']), "BTC/USDT", "1m", None, None)
+        assert row['final_capital'] == pytest.approx(single['final_capital'])
+        assert row['total_trades'] == single['metrics']['total_trades']
+
+def test_walk_forward_folds():
+    rolling = WalkForwardOptimizer.build_folds(1000, train_bars=400, test_bars=200)
+    assert rolling == [((0, 400), (400, 600)), ((200, 600), (600, 800)), ((400, 800), (800, 1000))]
+    anchored = WalkForwardOptimizer.build_folds(1000, train_bars=400, test_bars=300, anchored=True)
+    assert anchored == [((0, 400), (400, 700)), ((0, 700), (700, 1000))]
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_walk_forward_stitches_out_of_sample(storage, max_workers):
+    config = load_strategy_config("rsi_mean_reversion")
+    result = WalkForwardOptimizer(Backtester(storage), max_workers=max_workers).run(
+        config, "BTC/USDT", "1m", None, None, train_bars=1500, test_bars=500,
+        parameter_ranges={'rsi_oversold': [25, 35], 'take_profit': [0.02, 0.05]})
+
+    assert len(result['folds']) == 7
+    for prev, fold in zip(result['folds'], result['folds'][1:]):
+        assert fold['test_start'] > prev['test_end']
+    curve = result['equity_curve']
+    assert [p['timestamp'] for p in curve] == sorted(p['timestamp'] for p in curve)
+    assert curve[-1]['equity'] == pytest.approx(result['final_capital'])
+    assert result['final_capital'] == pytest.approx(result['folds'][-1]['final_capital'])
+
+def test_signal_context_covers_the_longest_period(storage):
+    assert signal_context_bars({}) == 40
+    assert signal_context_bars({'rsi_period': 7, 'volume_avg_period': 600}) == 1200
+
+    compiled = compile_strategy(load_strategy_config("rsi_mean_reversion"))
+    arrays, column_names = load_strategy_arrays(Backtester(storage), compiled, "BTC/USDT", "1m", None, None)
+    overrides = {'rsi_oversold': 40, 'volume_avg_period': 600, 'volume_threshold_multiplier': 1.0}
+    full = compiled.evaluate(dict(zip(column_names, arrays)), overrides)
+    window = replace(full, entry=full.entry[2000:3000], exit=full.exit[2000:3000])
+    expected = simulate_signals(arrays[0, 2000:3000].astype('int64'), arrays[1, 2000:3000], window, 10000.0, 0)
+
+    assert expected[0]
+    assert _simulate_window(arrays, column_names, compiled, 2000, 3000, overrides, 10000.0) == expected
+
+def test_walk_forward_closes_positions_at_fold_end(storage):
+    config = load_strategy_config("rsi_mean_reversion")
+    result = WalkForwardOptimizer(Backtester(storage), max_workers=1).run(
+        config, "BTC/USDT", "1m", None, None, train_bars=1500, test_bars=500,
+        parameter_ranges={'rsi_oversold': [40], 'rsi_exit': [101], 'stop_loss': [0.99], 'take_profit': [10.0]})
+
+    for fold in result['folds']:
+        assert fold['closed_at_window_end'] == fold['out_of_sample']['total_trades'] == 1
+    assert result['out_of_sample_metrics']['total_trades'] == len(result['folds'])
+    assert result['equity_curve'][-1]['equity'] == pytest.approx(result['final_capital'])
@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.columnar_storage import ColumnarStorageEngine
+from services.storage import StorageEngine, create_storage
+from tests.conftest import make_ohlcv
+
+START = 1_600_000_000_000  # 2020-09-13, so 5m bars span several months
+
+@pytest.fixture
+def engines(tmp_path):
+    df = make_ohlcv(40_000, step=300_000)
+    sqlite = StorageEngine(str(tmp_path / "sqlite.db"), ohlcv_cache_bytes=0)
+    columnar = ColumnarStorageEngine(str(tmp_path / "meta.db"), str(tmp_path / "ohlcv"), ohlcv_cache_bytes=0)
+    for engine in (sqlite, columnar):
+        engine.store_ohlcv('BTC/USDT', '5m', df)
+    return sqlite, columnar
+
+def test_partitions_are_monthly_files(engines):
+    _, columnar = engines
+    with columnar.get_conn() as conn:
+        partitions = [row[0] for row in conn.execute(
+            "SELECT partition FROM ohlcv_partitions ORDER BY start_ts").fetchall()]
+    assert partitions[:2] == ['2020-09', '2020-10'] and partitions[-1] == '2021-01'
+    assert os.path.exists(columnar.partition_path('BTC/USDT', '5m', '2020-10'))
+
+def test_reads_match_sqlite(engines):
+    sqlite, columnar = engines
+    rng = np.random.default_rng(1)
+    cases = [(None, None, None), (None, None, 700)]
+    for _ in range(20):
+        a, b = sorted(rng.integers(START - 10**9, START + 40_000 * 300_000 + 10**9, 2))
+        cases.append((int(a), int(b), int(rng.choice([0, 1, 5000]))))
+    for start, end, limit in cases:
+        expected = sqlite.get_ohlcv('BTC/USDT', '5m', start, end, limit)
+        actual = columnar.get_ohlcv('BTC/USDT', '5m', start, end, limit)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    assert columnar.get_last_timestamp('BTC/USDT', '5m') == sqlite.get_last_timestamp('BTC/USDT', '5m')
+    assert columnar.get_last_timestamp('ETH/USDT', '5m') is None
+    assert columnar.get_ohlcv('ETH/USDT', '5m').empty
+
+def test_overlapping_writes_merge_and_unchanged_partitions_are_kept(engines):
+    sqlite, columnar = engines
+    path = columnar.partition_path('BTC/USDT', '5m', '2020-09')
+    mtime = os.stat(path).st_mtime_ns
+
+    # Re-storing identical rows rewrites nothing
+    same = sqlite.get_ohlcv('BTC/USDT', '5m').head(100)
+    columnar.store_ohlcv('BTC/USDT', '5m', same)
+    assert os.stat(path).st_mtime_ns == mtime
+
+    # Overwrite across a month boundary and append past the end
+    update = make_ohlcv(5000, seed=9, start=START + 4000 * 300_000, step=300_000)
+    for engine in engines:
+        engine.store_ohlcv('BTC/USDT', '5m', update)
+        engine.store_ohlcv('BTC/USDT', '5m', make_ohlcv(10, seed=2, start=START + 40_000 * 300_000, step=300_000))
+    pd.testing.assert_frame_equal(columnar.get_ohlcv('BTC/USDT', '5m'),
+                                  sqlite.get_ohlcv('BTC/USDT', '5m'), check_dtype=False)
+
+def test_updates_go_to_deltas_until_compaction(tmp_path):
+    sqlite = StorageEngine(str(tmp_path / "sqlite.db"), ohlcv_cache_bytes=0)
+    columnar = ColumnarStorageEngine(str(tmp_path / "meta.db"), str(tmp_path / "ohlcv"),
+                                     ohlcv_cache_bytes=0, max_deltas=4)
+    df = make_ohlcv(2000, step=300_000)
+    for engine in (sqlite, columnar):
+        engine.store_ohlcv('BTC/USDT', '5m', df)
+    path = columnar.partition_path('BTC/USDT', '5m', '2020-09')
+    mtime = os.stat(path).st_mtime_ns
+
+    # The in-progress candle is re-written on every tick
+    last = df.tail(1).copy()
+    for tick in range(3):
+        last['close'] += 1.0
+        for engine in (sqlite, columnar):
+            engine.store_ohlcv('BTC/USDT', '5m', last)
+        assert os.stat(path).st_mtime_ns == mtime  # the partition itself is untouched
+        assert len(columnar._delta_paths(path)) == tick + 1
+        pd.testing.assert_frame_equal(columnar.get_ohlcv('BTC/USDT', '5m'),
+                                      sqlite.get_ohlcv('BTC/USDT', '5m'), check_dtype=False)
+
+    # An unchanged re-write adds nothing; a new candle is a delta too
+    columnar.store_ohlcv('BTC/USDT', '5m', last)
+    assert len(columnar._delta_paths(path)) == 3
+    newer = make_ohlcv(1, seed=5, start=START + 2000 * 300_000, step=300_000)
+    for engine in (sqlite, columnar):
+        engine.store_ohlcv('BTC/USDT', '5m', newer)
+    assert columnar.get_last_timestamp('BTC/USDT', '5m') == START + 2000 * 300_000
+
+    # The fourth delta triggers compaction
+    assert columnar._delta_paths(path) == [] and os.stat(path).st_mtime_ns != mtime
+    with columnar.get_conn() as conn:
+        assert conn.execute("SELECT rows FROM ohlcv_partitions").fetchone()[0] == 2001
+    pd.testing.assert_frame_equal(columnar.get_ohlcv('BTC/USDT', '5m'),
+                                  sqlite.get_ohlcv('BTC/USDT', '5m'), check_dtype=False)
+    pd.testing.assert_frame_equal(pd.concat(columnar.iter_ohlcv('BTC/USDT', '5m', chunk_rows=500), ignore_index=True),
+                                  sqlite.get_ohlcv('BTC/USDT', '5m'), check_dtype=False)
+
+def test_get_ohlcv_many_and_factory(tmp_path):
+    config = {'storage': {'database': str(tmp_path / "meta.db"), 'backend': 'columnar',
+                          'columnar_dir': str(tmp_path / "ohlcv")}}
+    engine = create_storage(config)
+    assert isinstance(engine, ColumnarStorageEngine)
+    engine.store_ohlcv('A', '1d', make_ohlcv(400, step=86_400_000))
+    engine.store_ohlcv('B', '1d', make_ohlcv(300, step=86_400_000))
+    many = engine.get_ohlcv_many(['A', 'B'], '1d', end=START + 350 * 86_400_000)
+    assert many.groupby('symbol').size().to_dict() == {'A': 351, 'B': 300}
+    assert sorted(os.listdir(os.path.dirname(engine.partition_path('A', '1d', '2020')))) == ['2020.arrow', '2021.arrow']
+
+    with pytest.raises(ValueError):
+        create_storage({'storage': {'database': str(tmp_path / "x.db"), 'backend': 'nope'}})
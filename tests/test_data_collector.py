@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import pytest
+
+from services.data_collector import DataCollector, exchange_request_rate
+from services.rate_limit import TokenBucket
+from services.timeframes import candle_open, next_candle_close
+from tests.conftest import FakeFetcher
+
+WATCHLISTS = [{'name': 'test', 'assets': [
+    {'symbol': 'BTC/USDT', 'timeframes': ['1m', '5m', '1h', '1d']},
+    {'symbol': 'ETH/USDT', 'timeframes': ['1m', '4h']},
+]}]
+
+def make_collector(storage, fetcher, clock=time.time, **collector_config):
+    config = {'watchlists': WATCHLISTS,
+              'data_sources': {'collector': {'max_requests_per_sec': 1000, **collector_config}}}
+    return DataCollector(storage, fetcher, config, clock=clock)
+
+def test_candle_close_schedule(storage):
+    collector = make_collector(storage, FakeFetcher(), close_delay_sec=2)
+    now = 1_700_000_123.4  # 2023-11-14 22:15:23 UTC
+    assert collector.next_run('1m', now) == 1_700_000_160 + 2
+    assert collector.next_run('1h', now) == 1_700_002_800 + 2
+    assert collector.next_run('1d', now) == 1_700_006_400 + 2
+    # Weekly candles close on Monday 00:00 UTC
+    assert next_candle_close(int(now * 1000), '1w') == 1_700_438_400_000
+
+def test_fetch_limit_covers_missed_candles(storage):
+    collector = make_collector(storage, FakeFetcher())
+    now = 1_700_000_000.0
+    assert collector.fetch_limit('1m', int(now * 1000) - 30_000, now) == 2
+    assert collector.fetch_limit('1h', int(now * 1000) - 10 * 3_600_000, now) == 11
+    assert collector.fetch_limit('1m', int(now * 1000) - 5000 * 60_000, now) == 5001
+
+def test_due_tasks_run_concurrently_and_reschedule(storage):
+    now = [1_700_000_123.0]
+    fetcher = FakeFetcher(delay=0.2, now=lambda: now[0])
+    collector = make_collector(storage, fetcher, clock=lambda: now[0])
+
+    async def run():
+        collector.build_tasks(now[0])
+        started = time.perf_counter()
+        await asyncio.gather(*collector.launch_due(now[0]))
+        elapsed = time.perf_counter() - started
+        # 1m tasks come due again after the next minute close; others do not
+        now[0] = 1_700_000_165.0
+        again = collector.launch_due(now[0])
+        await asyncio.gather(*again)
+        return elapsed, len(again)
+
+    elapsed, rerun = asyncio.run(run())
+    assert len(fetcher.calls) == 6 + 2
+    assert fetcher.max_concurrent == 6
+    assert elapsed < 0.6  # not 6 x 0.2s in sequence
+    assert rerun == 2
+
+    metrics = collector.metrics()
+    btc = metrics['tasks']['BTC/USDT 1m']
+    # First pass backfilled 500 candles; the next one fetched from the last stored
+    assert btc['last_backfill']['rows'] == 500 and btc['last_backfill']['unfilled_candles'] == 0
+    assert fetcher.calls[-1][3] == candle_open(1_700_000_123_000, '1m')
+    assert btc['runs'] == 2 and btc['errors'] == 0 and btc['last_rows'] == 2
+    assert btc['last_latency_sec'] is not None and btc['last_lag_sec'] >= 0
+    assert list(metrics['tasks'])[:4] == ['BTC/USDT 1m', 'BTC/USDT 5m', 'BTC/USDT 1h', 'BTC/USDT 1d']
+    assert storage.get_last_timestamp('ETH/USDT', '4h') is not None
+    # One rate limiter token per exchange request, backfill pages included
+    assert metrics['rate_limiter']['acquired'] == len(fetcher.calls)
+
+def test_restart_refreshes_a_partial_last_candle(storage):
+    now = 1_700_000_123.0
+    fetcher = FakeFetcher(now=lambda: now - 600)
+    stored = asyncio.run(fetcher.fetch_ohlcv('XRP/USDT', '1m', 300))
+    # Written while the newest candle was still forming
+    stored.loc[stored.index[-1], ['close', 'volume']] = [-1.0, 0.0]
+    storage.store_ohlcv('XRP/USDT', '1m', stored)
+    last_ts = int(stored['timestamp'].iloc[-1])
+
+    fetcher.now = lambda: now
+    config = {'watchlists': [{'name': 'test', 'assets': [{'symbol': 'XRP/USDT', 'timeframes': ['1m']}]}],
+              'data_sources': {'collector': {'max_requests_per_sec': 1000}}}
+    collector = DataCollector(storage, fetcher, config, clock=lambda: now)
+
+    async def run():
+        collector.build_tasks(now)
+        await asyncio.gather(*collector.launch_due(now))
+
+    asyncio.run(run())
+    assert any(since == last_ts for _, _, _, since in fetcher.calls)
+    candle = storage.get_ohlcv('XRP/USDT', '1m', start=last_ts, end=last_ts).iloc[0]
+    assert candle['close'] > 0 and candle['volume'] > 0
+
+def test_concurrency_limit_and_errors(storage):
+    class Failing(FakeFetcher):
+        async def fetch_ohlcv(self, symbol, timeframe, limit=500, since=None):
+            if timeframe == '1d':
+                raise RuntimeError("exchange down")
+            return await super().fetch_ohlcv(symbol, timeframe, limit, since)
+
+    fetcher = Failing(delay=0.05)
+    collector = make_collector(storage, fetcher, max_concurrency=2)
+
+    async def run():
+        collector.build_tasks(time.time())
+        await asyncio.gather(*collector.launch_due(time.time()))
+
+    asyncio.run(run())
+    assert fetcher.max_concurrent == 2
+    task = collector.tasks[('BTC/USDT', '1d')]
+    assert task.errors == 1 and task.last_error == "exchange down" and not task.running
+
+def test_token_bucket_limits_rate():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=5)
+        started = time.perf_counter()
+        for _ in range(15):
+            await bucket.acquire()
+        return time.perf_counter() - started, bucket
+
+    elapsed, bucket = asyncio.run(run())
+    # 5 burst tokens, then 10 more at 50/s
+    assert elapsed == pytest.approx(0.2, abs=0.08)
+    assert bucket.stats()['acquired'] == 15
+
+def test_request_rate_from_exchange():
+    class Exchange:
+        rateLimit = 50  # ms, i.e. 20 req/s
+
+    class Fetcher:
+        exchange = Exchange()
+
+    assert exchange_request_rate(Fetcher(), {}) == pytest.approx(16.0)
+    assert exchange_request_rate(Fetcher(), {'max_requests_per_sec': 3}) == 3.0
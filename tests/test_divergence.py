@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from services.divergence import find_divergences, find_pivots, recent_divergences
+from services.multi_timeframe import MultiTimeframeAnalyzer
+
+def loop_pivots(values, left, right, highs):
+    found = []
+    for i in range(left, len(values) - right):
+        window = values[i - left:i + right + 1]
+        if np.isnan(values[i]):
+            continue
+        cleaned = np.where(np.isnan(window), -np.inf if highs else np.inf, window)
+        extreme = cleaned.argmax() if highs else cleaned.argmin()
+        if extreme == left:
+            found.append(i)
+    return found
+
+def test_pivots_match_a_per_bar_scan():
+    rng = np.random.default_rng(3)
+    values = np.round(np.cumsum(rng.normal(size=2000)), 1)  # rounding makes plateaus
+    values[[100, 101, 500]] = np.nan
+    for left, right in ((5, 5), (3, 8)):
+        for highs in (True, False):
+            assert find_pivots(values, left, right, highs).tolist() == loop_pivots(values, left, right, highs)
+    assert find_pivots(values[:10]).size == 0
+
+    plateau = np.array([0, 1, 3, 3, 1, 0, 0], dtype=float)
+    assert find_pivots(plateau, 2, 2).tolist() == [2]  # only the first bar of a plateau
+
+def swings(points, length=80, base=100.0):
+    """A series that is `base` except for V-shaped dips at `points` {index: depth}"""
+    series = np.full(length, base)
+    for i, depth in points.items():
+        series[i - 3:i + 4] = np.minimum(series[i - 3:i + 4], base - depth + np.abs(np.arange(-3, 4)))
+    return series
+
+def test_regular_and_hidden_divergences():
+    low = swings({20: 10, 45: 15})               # lower low
+    high = 200 - swings({20: 10, 45: 5})         # lower high
+    rsi = np.full(80, 50.0)
+    rsi[20], rsi[45] = 25.0, 30.0                # rising oscillator at both swings
+    found = find_divergences(high, low, {'RSI': rsi, 'MACD': rsi / 10 - 5})
+    assert [(d['indicator'], d['direction'], d['kind']) for d in found] == [
+        ('MACD', 'bearish', 'hidden'), ('MACD', 'bullish', 'regular'),
+        ('RSI', 'bearish', 'hidden'), ('RSI', 'bullish', 'regular'),
+    ]
+    assert found[-1] == {'indicator': 'RSI', 'direction': 'bullish', 'kind': 'regular',
+                         'start': 20, 'end': 45, 'confirmed': 50}
+
+    # A higher low with a lower RSI is hidden bullish; a higher high with a
+    # lower oscillator regular bearish
+    low, high = swings({20: 15, 45: 10}), 200 - swings({20: 5, 45: 10})
+    rsi[20], rsi[45] = 30.0, 25.0
+    kinds = {(d['indicator'], d['direction'], d['kind'])
+             for d in find_divergences(high, low, {'RSI': rsi})}
+    assert kinds == {('RSI', 'bullish', 'hidden'), ('RSI', 'bearish', 'regular')}
+
+    # Too far apart, or confirmed too long ago
+    assert find_divergences(high, low, {'RSI': rsi}, max_gap=20) == []
+    assert recent_divergences(high, low, {'RSI': rsi}, within=30) != []
+    assert recent_divergences(high, low, {'RSI': rsi}, within=29) == []
+
+    rsi[45] = np.nan  # warm-up values never diverge
+    assert find_divergences(high, low, {'RSI': rsi}) == []
+
+def test_analyzer_reports_recent_divergences():
+    analyzer = MultiTimeframeAnalyzer(None, {'multi_timeframe': {'divergence': {'within': 40}}})
+    low = swings({20: 10, 45: 15})
+    df = pd.DataFrame({'high': low + 2, 'low': low})
+    rsi = np.full(80, 50.0)
+    rsi[20], rsi[45] = 25.0, 30.0
+    indicators = {'RSI': pd.Series(rsi), 'MACD': pd.DataFrame({'histogram': -rsi})}
+    assert analyzer._detect_divergences(df, indicators) == ['bullish_regular_RSI']
+    analyzer.divergence['within'] = 10
+    assert analyzer._detect_divergences(df, indicators) == []
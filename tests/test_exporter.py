@@ -0,0 +1,100 @@
+import io
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import api.main
+from services.columnar_storage import ColumnarStorageEngine
+from services.exporter import DataExporter, stream_frames
+from services.storage import StorageEngine
+from tests.conftest import make_ohlcv
+
+START = 1_600_000_000_000
+
+def read_export(data: bytes, format: str, compression=None) -> pd.DataFrame:
+    if format == 'parquet':
+        return pq.read_table(io.BytesIO(data)).to_pandas()
+    if compression:
+        data = pa.input_stream(pa.BufferReader(data), compression=compression).read()
+    return pd.read_csv(io.BytesIO(data)) if format == 'csv' else pd.DataFrame(json.loads(data))
+
+def test_chunked_reads_match_a_whole_read(tmp_path):
+    df = make_ohlcv(2500, step=300_000)
+    engines = [StorageEngine(str(tmp_path / "nocache.db"), ohlcv_cache_bytes=0),
+               StorageEngine(str(tmp_path / "cached.db")),
+               ColumnarStorageEngine(str(tmp_path / "meta.db"), str(tmp_path / "ohlcv"), ohlcv_cache_bytes=0)]
+    for engine in engines:
+        engine.store_ohlcv('BTC/USDT', '5m', df)
+    engines[1].get_ohlcv('BTC/USDT', '5m')  # now served from the LRU
+    for engine in engines:
+        for start, end in ((None, None), (START + 300_000 * 10, START + 300_000 * 2000), (START * 2, None)):
+            chunks = list(engine.iter_ohlcv('BTC/USDT', '5m', start, end, chunk_rows=400))
+            assert all(len(chunk) <= 400 for chunk in chunks)
+            whole = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+            expected = engine.get_ohlcv('BTC/USDT', '5m', start, end)
+            if expected.empty:
+                assert whole.empty
+            else:
+                pd.testing.assert_frame_equal(whole, expected, check_dtype=False)
+    # SQLite pages through the index rather than caching the series
+    assert engines[0].ohlcv_cache is None and len(list(engines[0].iter_ohlcv('BTC/USDT', '5m', chunk_rows=1000))) == 3
+
+@pytest.mark.parametrize("format", ['csv', 'json', 'parquet'])
+@pytest.mark.parametrize("compression", [None, 'gzip', 'zstd'])
+def test_streamed_exports_round_trip(format, compression):
+    df = make_ohlcv(1000)
+    data = b"".join(stream_frames((df.iloc[i:i + 300] for i in range(0, 1000, 300)), format, compression))
+    pd.testing.assert_frame_equal(read_export(data, format, compression), df, check_exact=False)
+    if format == 'parquet':
+        parquet = pq.ParquetFile(io.BytesIO(data))
+        assert parquet.num_row_groups == 4
+        assert parquet.metadata.row_group(0).column(0).compression == (compression or 'snappy').upper()
+
+def test_exports_are_written_in_chunks(tmp_path, storage):
+    exporter = DataExporter(storage, {'export': {'dir': str(tmp_path), 'chunk_rows': 1000}})
+    path = exporter.export_ohlcv('BTC/USDT', '1m', format='parquet', compression='zstd')
+    assert path == str(tmp_path / "BTC_USDT_1m_start_end.parquet")
+    assert pq.ParquetFile(path).num_row_groups == 5
+    pd.testing.assert_frame_equal(pq.read_table(path).to_pandas(), storage.get_ohlcv('BTC/USDT', '1m'))
+    assert exporter.export_ohlcv('BTC/USDT', '1m', start=START * 2) == ""
+
+    trades = [{'entry_time': i, 'pnl': float(i)} for i in range(2500)]
+    trades_path, metrics_path = exporter.export_backtest_results(
+        {'trades': trades, 'metrics': {'total_trades': 2500}}, compression='gzip')
+    assert trades_path.endswith("_trades.csv.gz")
+    with open(trades_path, 'rb') as f:
+        assert read_export(f.read(), 'csv', 'gzip').to_dict('records') == trades
+
+def test_download_endpoint_streams(client, storage, monkeypatch):
+    monkeypatch.setattr(api.main, 'storage', storage)
+    monkeypatch.setattr(api.main, 'exporter', DataExporter(storage, {'export': {'chunk_rows': 700}}))
+    end = START + 3999 * 60_000
+    with client.stream("GET", f"/api/v1/export/BTC/USDT/1m?end={end}&format=csv&compression=gzip") as response:
+        assert response.headers['content-type'] == 'application/gzip'
+        assert response.headers['content-disposition'] == f'attachment; filename="BTC_USDT_1m_start_{end}.csv.gz"'
+        data = b"".join(response.iter_bytes())
+    pd.testing.assert_frame_equal(read_export(data, 'csv', 'gzip'), storage.get_ohlcv('BTC/USDT', '1m', end=end),
+                                  check_exact=False)
+
+    response = client.get("/api/v1/export/BTC/USDT/1m?format=json")
+    assert response.headers['content-type'] == 'application/json'
+    assert len(response.json()) == 5000
+
+    assert client.get("/api/v1/export/NOPE/USDT/1m").json()['error']['code'] == 'NOT_FOUND'
+    assert client.get("/api/v1/export/BTC/USDT/1m?format=xlsx").status_code == 422
+
+@pytest.mark.parametrize("format", ['csv', 'json', 'parquet'])
+def test_empty_range_is_a_valid_empty_file(client, storage, monkeypatch, format):
+    monkeypatch.setattr(api.main, 'storage', storage)
+    monkeypatch.setattr(api.main, 'exporter', DataExporter(storage))
+    response = client.get(f"/api/v1/export/BTC/USDT/1m?start={START * 2}&format={format}")
+    assert response.status_code == 200
+    df = read_export(response.content, format)
+    assert df.empty
+    if format != 'json':
+        assert list(df.columns) == ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+    if format == 'parquet':
+        assert pq.read_schema(io.BytesIO(response.content)).field('close').type == pa.float64()
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.incremental import IncrementalIndicatorEngine
+from services.indicators import IndicatorEngine
+from tests.conftest import make_ohlcv
+
+INDICATORS = ["RSI", "MACD", "BB", "ATR", "ICHIMOKU"]
+
+def assert_matches_batch(incremental, batch):
+    if isinstance(batch, pd.DataFrame):
+        for col in batch.columns:
+            assert_matches_batch(incremental[col], batch[col])
+        return
+    np.testing.assert_allclose(incremental.to_numpy(), batch.to_numpy(), rtol=1e-9, atol=1e-9)
+
+def test_bar_by_bar_matches_batch():
+    df = make_ohlcv(1500)
+    engine = IncrementalIndicatorEngine()
+
+    # Seed with history, then stream the rest in small overlapping batches
+    parts = [engine.update("BTC/USDT", "1m", df.iloc[:300], INDICATORS)]
+    for start in range(300, len(df), 7):
+        parts.append(engine.update("BTC/USDT", "1m", df.iloc[max(0, start - 3):start + 7], INDICATORS))
+
+    batch = IndicatorEngine.calculate_all(df, INDICATORS)
+    for name in ["RSI", "MACD", "BB", "ATR"]:
+        streamed = pd.concat([p[name] for p in parts])
+        assert streamed.index.tolist() == df.index.tolist()
+        assert_matches_batch(streamed, batch[name])
+
+    ichimoku = pd.concat([p["ICHIMOKU"] for p in parts])
+    assert_matches_batch(ichimoku.drop(columns="chikou"), batch["ICHIMOKU"].drop(columns="chikou"))
+
+def test_macd_is_exact():
+    df = make_ohlcv(800)
+    engine = IncrementalIndicatorEngine()
+    for i in range(len(df)):
+        engine.update("ETH/USDT", "1h", df.iloc[i:i + 1], ["MACD"])
+    assert engine.latest("ETH/USDT", "1h", "MACD") == IndicatorEngine.calc_macd(df).iloc[-1].to_dict()
+
+def test_peek_does_not_commit():
+    df = make_ohlcv(100)
+    engine = IncrementalIndicatorEngine()
+    engine.update("BTC/USDT", "1m", df.iloc[:-1], ["RSI"])
+    last = df.iloc[-1].to_dict()
+
+    peeked = engine.peek("BTC/USDT", "1m", last, ["RSI"])["RSI"]
+    assert engine.last_timestamp("BTC/USDT", "1m", "RSI") == df['timestamp'].iloc[-2]
+    assert peeked == pytest.approx(IndicatorEngine.calc_rsi(df).iloc[-1])
+
+def test_params_and_reset_keep_separate_state():
+    df = make_ohlcv(200)
+    engine = IncrementalIndicatorEngine()
+    engine.update("BTC/USDT", "1m", df, ["RSI"], params={"RSI": {"period": 7}})
+    assert engine.latest("BTC/USDT", "1m", "RSI", {"period": 7}) == pytest.approx(
+        IndicatorEngine.calc_rsi(df, period=7).iloc[-1])
+    assert engine.latest("BTC/USDT", "1m", "RSI") is None
+
+    engine.reset(symbol="BTC/USDT")
+    assert engine.last_timestamp("BTC/USDT", "1m", "RSI", {"period": 7}) is None
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+from services.indicators import IndicatorEngine
+from services.indicator_cache import IndicatorCache
+from tests.conftest import make_ohlcv
+
+INDICATORS = ['RSI', 'MACD', 'BB', 'ATR', 'ICHIMOKU']
+
+def make_cache(storage, ttl=300, cleanup_days=None):
+    return IndicatorCache(storage, {'storage': {'cache_ttl_sec': ttl, 'auto_cleanup_days': cleanup_days}})
+
+def assert_same(cached, expected):
+    for name in INDICATORS:
+        np.testing.assert_allclose(np.asarray(cached[name], dtype=float),
+                                   np.asarray(expected[name], dtype=float), equal_nan=True)
+
+def test_repeated_request_is_served_from_cache(storage):
+    cache = make_cache(storage)
+    df = storage.get_ohlcv('BTC/USDT', '1m', 0, 2**62, limit=None).tail(500).reset_index(drop=True)
+    expected = IndicatorEngine.calculate_all(df, INDICATORS)
+
+    assert_same(cache.calculate_all('BTC/USDT', '1m', df, INDICATORS), expected)
+    assert cache.misses == len(INDICATORS) and cache.hits == 0
+    # Admitted on its second request, served from the third
+    assert not storage.get_indicator_coverage('BTC/USDT', '1m', ['RSI'])
+    cache.calculate_all('BTC/USDT', '1m', df, INDICATORS)
+    assert storage.get_indicator_coverage('BTC/USDT', '1m', ['RSI'])
+
+    cached = cache.calculate_all('BTC/USDT', '1m', df, INDICATORS)
+    assert cache.hits == len(INDICATORS)
+    assert_same(cached, expected)
+    assert isinstance(cached['RSI'], pd.Series)
+    assert list(cached['MACD'].columns) == ['macd', 'signal', 'histogram']
+
+def test_shifted_and_overlapping_windows_match_a_fresh_calculation(storage):
+    cache = make_cache(storage)
+    full = storage.get_ohlcv('BTC/USDT', '1m')
+    windows = [(0, 800), (0, 800), (100, 600), (0, 800), (0, 600), (100, 600), (100, 600), (100, 900)]
+    for lo, hi in windows:
+        df = full.iloc[lo:hi].reset_index(drop=True)
+        assert_same(cache.calculate_all('BTC/USDT', '1m', df, INDICATORS),
+                    IndicatorEngine.calculate_all(df, INDICATORS))
+    # Only the exact window of the stored computation is a hit
+    assert cache.hits == 2 * len(INDICATORS)
+    assert cache.misses == len(windows) * len(INDICATORS) - cache.hits
+
+def test_revised_interior_candle_invalidates(storage):
+    cache = make_cache(storage)
+    df = make_ohlcv(300)
+    for _ in range(2):
+        cache.calculate_all('ETH/USDT', '1m', df, INDICATORS)
+
+    revised = df.copy()
+    revised.loc[150, ['high', 'close']] = [revised.loc[150, 'high'] * 1.2, revised.loc[150, 'close'] * 1.1]
+    assert_same(cache.calculate_all('ETH/USDT', '1m', revised, INDICATORS),
+                IndicatorEngine.calculate_all(revised, INDICATORS))
+    assert cache.hits == 0
+    # The original candles are still a hit
+    cache.calculate_all('ETH/USDT', '1m', df, INDICATORS)
+    assert cache.hits == len(INDICATORS)
+
+def test_sliding_window_is_not_written(storage, monkeypatch):
+    cache = make_cache(storage)
+    writes = []
+    monkeypatch.setattr(storage, 'store_indicator_values', lambda *args: writes.append(args))
+    full = make_ohlcv(400)
+    for lo in range(0, 100, 10):
+        df = full.iloc[lo:lo + 300].reset_index(drop=True)
+        assert_same(cache.calculate_all('ETH/USDT', '1m', df, INDICATORS),
+                    IndicatorEngine.calculate_all(df, INDICATORS))
+    assert writes == [] and cache.hits == 0
+
+def test_new_candle_and_ttl_invalidate(storage, monkeypatch):
+    cache = make_cache(storage, ttl=300)
+    df = make_ohlcv(300)
+    # Last candle looks in progress: computed right after it opened
+    now = df['timestamp'].iloc[-1] / 1000 + 10
+    monkeypatch.setattr('services.indicator_cache.time.time', lambda: now)
+    cache.calculate_all('ETH/USDT', '1m', df, ['RSI'])
+    cache.calculate_all('ETH/USDT', '1m', df, ['RSI'])
+
+    now += 100
+    cache.calculate_all('ETH/USDT', '1m', df, ['RSI'])
+    assert cache.hits == 1
+
+    now += 300
+    cache.calculate_all('ETH/USDT', '1m', df, ['RSI'])
+    assert cache.hits == 1 and cache.misses == 3
+
+    # A newer candle than the cached range forces a recompute
+    longer = make_ohlcv(301)
+    result = cache.calculate_all('ETH/USDT', '1m', longer, ['RSI'])
+    assert cache.misses == 4
+    np.testing.assert_allclose(result['RSI'], IndicatorEngine.calc_rsi(longer), equal_nan=True)
+
+def test_params_are_part_of_the_key(storage):
+    cache = make_cache(storage)
+    df = make_ohlcv(300)
+    cache.calculate_all('ETH/USDT', '1m', df, ['RSI'])
+    result = cache.calculate_all('ETH/USDT', '1m', df, ['RSI'], {'RSI': {'period': 7}})
+    assert cache.misses == 2
+    np.testing.assert_allclose(result['RSI'], IndicatorEngine.calc_rsi(df, period=7), equal_nan=True)
+
+def test_cleanup_removes_stale_series(storage, monkeypatch):
+    cache = make_cache(storage, cleanup_days=1)
+    df = make_ohlcv(300)
+    now = 1_700_000_000.0
+    monkeypatch.setattr('services.indicator_cache.time.time', lambda: now)
+    for _ in range(2):
+        cache.calculate_all('ETH/USDT', '1m', df, ['RSI'])
+    assert storage.get_indicator_coverage('ETH/USDT', '1m', ['RSI'])
+
+    now += 2 * 86400
+    for _ in range(2):
+        cache.calculate_all('ETH/USDT', '1m', df, ['ATR'])
+    assert not storage.get_indicator_coverage('ETH/USDT', '1m', ['RSI'])
+    assert storage.get_indicator_coverage('ETH/USDT', '1m', ['ATR'])
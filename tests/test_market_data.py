@@ -0,0 +1,119 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from services.market_data import MarketDataService
+from services.storage import StorageEngine
+from tests.conftest import FakeFetcher
+
+NOW = 1_700_000_010.0  # 30s into a minute
+
+def make_service(tmp_path, fetcher, **data_sources):
+    engine = StorageEngine(str(tmp_path / "market.db"))
+    config = {'data_sources': {'max_stale_sec': 60, **data_sources}}
+    return MarketDataService(engine, fetcher, config, clock=lambda: NOW)
+
+def test_fresh_storage_answers_without_exchange(tmp_path):
+    fetcher = FakeFetcher(now=lambda: NOW)
+    service = make_service(tmp_path, fetcher)
+    # What the collector would have stored, up to the forming candle
+    service.storage.store_ohlcv('BTC/USDT', '1m', asyncio.run(fetcher.fetch_ohlcv('BTC/USDT', '1m', 300)))
+    fetcher.calls.clear()
+
+    df, freshness = asyncio.run(service.get_ohlcv('BTC/USDT', '1m', 200))
+    assert len(df) == 200
+    assert fetcher.calls == []
+    assert freshness['source'] == 'storage'
+    assert freshness['stale_sec'] == pytest.approx(30.0)
+
+def test_stale_or_short_data_refreshes_once_for_concurrent_requests(tmp_path):
+    fetcher = FakeFetcher(delay=0.05, now=lambda: NOW)
+    service = make_service(tmp_path, fetcher)
+
+    async def run():
+        return await asyncio.gather(*(service.get_ohlcv('BTC/USDT', '1h', 100) for _ in range(20)))
+
+    results = asyncio.run(run())
+    assert len(fetcher.calls) == 1
+    assert service.stats()['coalesced'] == 19
+    assert all(len(df) == 100 and freshness['source'] == 'exchange' for df, freshness in results)
+    # Stored now, so the next read is local
+    _, freshness = asyncio.run(service.get_ohlcv('BTC/USDT', '1h', 100))
+    assert freshness['source'] == 'storage'
+    assert len(fetcher.calls) == 1
+
+def test_short_history_is_fresh_only_for_the_window_fetched(tmp_path):
+    # Listed 10 candles ago: the exchange has nothing older
+    listed = int(NOW // 60 * 60 * 1000) - 9 * 60_000
+    fetcher = FakeFetcher(now=lambda: NOW, outage=(0, listed))
+    service = make_service(tmp_path, fetcher)
+
+    df, _ = asyncio.run(service.get_ohlcv('BTC/USDT', '1m', 50))
+    assert len(df) == 10 and len(fetcher.calls) == 1
+    for limit in (50, 20):
+        _, freshness = asyncio.run(service.get_ohlcv('BTC/USDT', '1m', limit))
+        assert freshness['source'] == 'storage'
+    # A longer window was never asked for
+    _, freshness = asyncio.run(service.get_ohlcv('BTC/USDT', '1m', 100))
+    assert freshness['source'] == 'exchange'
+    assert fetcher.calls[-1][2] == 100
+
+def test_concurrent_refreshes_fetch_the_largest_window(tmp_path):
+    fetcher = FakeFetcher(delay=0.05, now=lambda: NOW)
+    service = make_service(tmp_path, fetcher)
+    empty = pd.DataFrame()
+
+    async def joined():
+        # All three ask before the fetch starts
+        await asyncio.gather(*(service.refresh('BTC/USDT', '1h', limit, empty) for limit in (10, 100, 50)))
+        return await asyncio.gather(*(service.get_ohlcv('BTC/USDT', '1h', limit) for limit in (10, 100, 50)))
+
+    results = asyncio.run(joined())
+    assert [limit for _, _, limit, _ in fetcher.calls] == [100]
+    assert service.stats()['coalesced'] == 2
+    assert [(len(df), freshness['source']) for df, freshness in results] == [(10, 'storage'), (100, 'storage'),
+                                                                             (50, 'storage')]
+
+    async def late():
+        short = asyncio.ensure_future(service.refresh('ETH/USDT', '1h', 10, empty))
+        while ('ETH/USDT', '1h') not in service._fetching:
+            await asyncio.sleep(0.001)
+        # The short fetch has started when the long request arrives
+        await asyncio.gather(short, service.refresh('ETH/USDT', '1h', 200, empty))
+        return await service.get_ohlcv('ETH/USDT', '1h', 200)
+
+    df, freshness = asyncio.run(late())
+    assert [limit for _, _, limit, _ in fetcher.calls[1:]] == [10, 200]
+    assert len(df) == 200 and freshness['source'] == 'storage'
+
+def test_refresh_fetches_only_the_tail_when_window_is_covered(tmp_path):
+    fetcher = FakeFetcher(now=lambda: NOW - 600)
+    service = make_service(tmp_path, fetcher)
+    service.storage.store_ohlcv('BTC/USDT', '1m', asyncio.run(fetcher.fetch_ohlcv('BTC/USDT', '1m', 300)))
+    fetcher.calls.clear()
+    fetcher.now = lambda: NOW
+
+    df, freshness = asyncio.run(service.get_ohlcv('BTC/USDT', '1m', 200))
+    (_, _, limit, since), = fetcher.calls
+    assert since is not None and limit == 11
+    assert int(df['timestamp'].iloc[-1]) == int(NOW // 60 * 60 * 1000)
+    assert freshness['source'] == 'exchange'
+
+def test_failed_refresh_serves_stale_data(tmp_path):
+    class DownFetcher(FakeFetcher):
+        async def fetch_ohlcv(self, symbol, timeframe, limit=500, since=None):
+            raise ConnectionError("exchange down")
+
+    seed = FakeFetcher(now=lambda: NOW - 3600)
+    service = make_service(tmp_path, DownFetcher())
+    service.storage.store_ohlcv('BTC/USDT', '1m', asyncio.run(seed.fetch_ohlcv('BTC/USDT', '1m', 300)))
+
+    df, freshness = asyncio.run(service.get_ohlcv('BTC/USDT', '1m', 100))
+    assert len(df) > 0
+    assert freshness['source'] == 'storage'
+    assert freshness['stale_sec'] > 3600
+    assert service.stats()['refresh_errors'] == 1
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(service.get_ohlcv('ETH/USDT', '1m', 100))
@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+import api.main
+from services.indicators import IndicatorEngine
+from services.multi_timeframe import MultiTimeframeAnalyzer
+from services.storage import StorageEngine
+from tests.conftest import make_ohlcv
+
+START = 1_600_000_000_000 - 1_600_000_000_000 % 86_400_000
+STEPS = {'1h': 3_600_000, '4h': 14_400_000, '1d': 86_400_000}
+
+@pytest.fixture
+def analyzer(tmp_path):
+    storage = StorageEngine(str(tmp_path / "mtf.db"))
+    for seed, symbol in enumerate(('BTC/USDT', 'ETH/USDT', 'SOL/USDT')):
+        for tf, step in STEPS.items():
+            storage.store_ohlcv(symbol, tf, make_ohlcv(300, seed=seed, start=START, step=step))
+    clock = [(START + 299 * 86_400_000 + 1000) / 1000]
+    analyzer = MultiTimeframeAnalyzer(storage, {'multi_timeframe': {'bars': 200}}, clock=lambda: clock[0])
+    analyzer.clock_value = clock
+    return analyzer
+
+def test_limit_returns_the_newest_candles(analyzer):
+    storage = analyzer.storage
+    expected = make_ohlcv(300, seed=0, start=START, step=STEPS['1h']).tail(200).reset_index(drop=True)
+    for read in (storage.get_ohlcv, storage._query_ohlcv):
+        pd.testing.assert_frame_equal(read('BTC/USDT', '1h', limit=200), expected, check_dtype=False)
+    in_range = storage._query_ohlcv('BTC/USDT', '1h', end=START + 9 * STEPS['1h'], limit=3)
+    assert in_range['timestamp'].tolist() == [START + i * STEPS['1h'] for i in (7, 8, 9)]
+
+    with storage.get_conn() as conn:
+        plan = [row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM (SELECT timestamp, close FROM ohlcv WHERE symbol = ? "
+            "AND timeframe = ? ORDER BY timestamp DESC LIMIT ?) ORDER BY timestamp ASC",
+            ('BTC/USDT', '1h', 200)).fetchall()]
+    # The index is walked backwards; only the 200 rows are re-sorted
+    assert any(step.startswith('SEARCH ohlcv USING INDEX') for step in plan)
+    assert sum('TEMP B-TREE' in step for step in plan) == 1
+
+def test_analysis_uses_latest_bars_and_is_cached_per_candle(analyzer):
+    result = analyzer.analyze_symbol('BTC/USDT')
+    df = analyzer.storage.get_ohlcv('BTC/USDT', '1h', limit=200)
+    rsi = IndicatorEngine.calc_rsi(df).iloc[-1]
+    assert result['timeframes']['1h']['strength'] == pytest.approx(max(0, min(100, rsi)))
+    assert list(result['timeframes']) == ['1h', '4h', '1d']
+    assert analyzer.stats() == {'entries': 3, 'hits': 0, 'misses': 3}
+
+    assert analyzer.analyze_symbol('BTC/USDT') == result
+    assert analyzer.stats()['hits'] == 3
+
+    # A new 1h candle only invalidates 1h
+    analyzer.storage.store_ohlcv('BTC/USDT', '1h', make_ohlcv(301, seed=0, start=START, step=STEPS['1h']).tail(1))
+    analyzer.analyze_symbol('BTC/USDT')
+    assert analyzer.stats()['misses'] == 4
+
+    # So does the clock crossing into a new candle, even before one is stored
+    analyzer.clock_value[0] += 3600
+    analyzer.analyze_symbol('BTC/USDT')
+    assert analyzer.stats()['misses'] == 5
+
+def test_batch_matches_single_symbol_analysis(analyzer):
+    symbols = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT', 'NEW/USDT']
+    batch = analyzer.analyze_many(symbols, ['1h', '1d'])
+    assert list(batch) == symbols
+    for symbol in symbols:
+        assert batch[symbol] == analyzer.analyze_symbol(symbol, ['1h', '1d'])
+    assert batch['NEW/USDT']['timeframes']['1h']['trend'] == 'unknown'
+
+def test_batch_endpoint(client, analyzer, monkeypatch):
+    monkeypatch.setattr(api.main, 'mtf_analyzer', analyzer)
+    body = client.post("/api/v1/multi-timeframe", json={'symbols': ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']}).json()
+    assert body['success']
+    results = body['data']['results']
+    assert sorted(r['symbol'] for r in results) == ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+    scores = [r['confluenceScore'] for r in results]
+    assert scores == sorted(scores, reverse=True)
+    assert set(results[0]['timeframes']) == {'1h', '4h', '1d'}
+
+    missing = client.post("/api/v1/multi-timeframe", json={'watchlist': 'nope'}).json()
+    assert missing['error']['code'] == 'NOT_FOUND'
+    bad = client.post("/api/v1/multi-timeframe", json={'symbols': ['BTC/USDT'], 'timeframes': ['7x']}).json()
+    assert bad['error']['code'] == 'INVALID_REQUEST'
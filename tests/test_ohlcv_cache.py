@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from services.ohlcv_cache import OHLCVArrays, OHLCVCache
+from services.storage import StorageEngine
+from tests.conftest import make_ohlcv
+
+START = 1_600_000_000_000
+
+@pytest.mark.parametrize("start,end,limit", [
+    (None, None, None),
+    (START + 60_000 * 100, None, None),
+    (None, START + 60_000 * 250, None),
+    (START + 60_000 * 100, START + 60_000 * 250, 20),
+    (START + 30_000, START + 60_000 * 3 + 1, None),  # bounds between candles
+    (START + 60_000 * 10_000, None, None),           # past the end
+])
+def test_slices_match_sql(storage, start, end, limit):
+    cached = storage.get_ohlcv('BTC/USDT', '1m', start, end, limit)
+    expected = storage._query_ohlcv('BTC/USDT', '1m', start, end, limit)
+    assert len(cached) == len(expected)
+    pd.testing.assert_frame_equal(cached, expected, check_dtype=False)
+
+def test_hot_series_reads_skip_sqlite(storage, monkeypatch):
+    storage.get_ohlcv('BTC/USDT', '1m')
+    assert storage.ohlcv_cache.stats()['misses'] == 1
+
+    def no_sql(*args, **kwargs):
+        raise AssertionError("SQLite hit on a cached read")
+    monkeypatch.setattr(storage, '_query_ohlcv', no_sql)
+    monkeypatch.setattr(storage, 'get_conn', no_sql)
+
+    df = storage.get_ohlcv('BTC/USDT', '1m', limit=10)
+    assert len(df) == 10
+    assert storage.get_last_timestamp('BTC/USDT', '1m') == START + 4999 * 60_000
+    assert storage.ohlcv_cache.stats()['hits'] == 1
+
+    # Callers may mutate what they get back
+    df['close'] = 0.0
+    assert storage.get_ohlcv('BTC/USDT', '1m', limit=10)['close'].gt(0).all()
+
+def test_store_merges_into_the_cached_series(storage):
+    storage.get_ohlcv('BTC/USDT', '1m')
+    newer = make_ohlcv(10, seed=3, start=START + 5000 * 60_000)
+    storage.store_ohlcv('BTC/USDT', '1m', newer)
+    assert storage.ohlcv_cache.peek(('BTC/USDT', '1m')) is not None
+    tail = storage.get_ohlcv('BTC/USDT', '1m', start=START + 5000 * 60_000)
+    pd.testing.assert_frame_equal(tail, newer, check_dtype=False)
+
+    # Re-writing the in-progress candle keeps the entry, with the new close
+    last = storage.get_ohlcv('BTC/USDT', '1m', limit=1)
+    last['close'] = 123.0
+    storage.store_ohlcv('BTC/USDT', '1m', last)
+    assert storage.ohlcv_cache.stats()['entries'] == 1
+    misses = storage.ohlcv_cache.stats()['misses']
+    assert storage.get_ohlcv('BTC/USDT', '1m', limit=1)['close'].tolist() == [123.0]
+    assert storage.ohlcv_cache.stats()['misses'] == misses
+
+    # Rewriting sparse history merges too, matching SQLite row for row
+    rewrite = make_ohlcv(5, seed=4, start=START).iloc[[0, 2, 4]]
+    storage.store_ohlcv('BTC/USDT', '1m', rewrite)
+    assert storage.ohlcv_cache.peek(('BTC/USDT', '1m')) is not None
+    pd.testing.assert_frame_equal(storage.get_ohlcv('BTC/USDT', '1m'), storage._query_ohlcv('BTC/USDT', '1m'),
+                                  check_dtype=False)
+    assert len(storage.get_ohlcv('BTC/USDT', '1m')) == 5010
+
+def test_lru_is_bounded_by_bytes(tmp_path):
+    per_series = OHLCVArrays.from_frame(make_ohlcv(100)).nbytes
+    storage = StorageEngine(str(tmp_path / "db.sqlite"), ohlcv_cache_bytes=2 * per_series)
+    for symbol in ('A', 'B', 'C'):
+        storage.store_ohlcv(symbol, '1m', make_ohlcv(100))
+
+    storage.get_ohlcv('A', '1m')
+    storage.get_ohlcv('B', '1m')
+    storage.get_ohlcv('A', '1m')  # A is now most recent
+    storage.get_ohlcv('C', '1m')  # evicts B
+    stats = storage.ohlcv_cache.stats()
+    assert stats['evictions'] == 1 and stats['entries'] == 2
+    assert stats['bytes'] <= stats['max_bytes']
+    assert storage.ohlcv_cache.peek(('B', '1m')) is None
+    assert storage.ohlcv_cache.peek(('A', '1m')) is not None
+
+def test_stale_load_is_not_admitted():
+    cache = OHLCVCache(10**6)
+    key = ('A', '1m')
+    version = cache.version(key)
+    cache.write(key, OHLCVArrays.from_frame(make_ohlcv(3)))
+    cache.put(key, OHLCVArrays.from_frame(make_ohlcv(2)), version)
+    assert cache.peek(key) is None
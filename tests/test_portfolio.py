@@ -0,0 +1,68 @@
+import pytest
+
+from services.backtester import Backtester
+from services.indicator_cache import IndicatorCache
+from services.portfolio import PortfolioBacktester, watchlist_symbols
+from services.storage import StorageEngine
+from tests.conftest import make_ohlcv
+
+SYMBOLS = ["BTC/USDT", "ETH/USDT", "SOL/USDT", "ADA/USDT"]
+
+@pytest.fixture
+def storage(tmp_path):
+    engine = StorageEngine(str(tmp_path / "test.db"))
+    for seed, symbol in enumerate(SYMBOLS):
+        engine.store_ohlcv(symbol, "1h", make_ohlcv(3000, seed=seed))
+    return engine
+
+def strategy(max_positions=None):
+    risk = {'position_size': 0.1}
+    if max_positions:
+        risk['max_positions'] = max_positions
+    return {'strategy': {'risk_management': risk}}
+
+def test_unconstrained_portfolio_matches_single_symbol_runs(storage):
+    config = {'backtesting': {'default_capital': 10000.0, 'commission': 0.0, 'slippage': 0.0}}
+    result = PortfolioBacktester(storage, config).run_backtest(strategy(), SYMBOLS, "1h", None, None)
+
+    for symbol in SYMBOLS:
+        single = Backtester(storage).run_backtest(strategy(), symbol, "1h", None, None)
+        portfolio_trades = [t for t in result['trades'] if t['symbol'] == symbol]
+        assert [(t['entry_time'], t['exit_time'], t['reason']) for t in portfolio_trades] == \
+            [(t['entry_time'], t['exit_time'], t['reason']) for t in single['trades']]
+
+def test_single_symbol_portfolio_honours_parameters_and_cache(storage):
+    config = {'backtesting': {'default_capital': 10000.0, 'commission': 0.0, 'slippage': 0.0}}
+    short_rsi = {'strategy': {'parameters': {'rsi_oversold': 40, 'rsi_period': 7},
+                              'risk_management': {'position_size': 0.1}}}
+    backtester = Backtester(storage, IndicatorCache(storage, {}))
+    portfolio = PortfolioBacktester(storage, config, backtester)
+
+    expected = backtester.run_backtest(short_rsi, "BTC/USDT", "1h", None, None)
+    default = backtester.run_backtest(strategy(), "BTC/USDT", "1h", None, None)
+    assert expected['trades'] and expected['trades'] != default['trades']
+    for _ in range(2):
+        result = portfolio.run_backtest(short_rsi, ["BTC/USDT"], "1h", None, None)
+        assert [(t['entry_time'], t['exit_time'], t['reason']) for t in result['trades']] == \
+            [(t['entry_time'], t['exit_time'], t['reason']) for t in expected['trades']]
+    assert backtester.indicator_cache.hits > 0
+
+def test_max_positions_and_costs_enforced(storage):
+    config = {'backtesting': {'default_capital': 10000.0, 'commission': 0.001, 'slippage': 0.0005}}
+    result = PortfolioBacktester(storage, config).run_backtest(strategy(2), SYMBOLS, "1h", None, None)
+
+    events = sorted([(t['entry_time'], 1) for t in result['trades']] +
+                    [(t['exit_time'], -1) for t in result['trades']], key=lambda e: (e[0], e[1]))
+    open_count = peak = 0
+    for _, delta in events:
+        open_count += delta
+        peak = max(peak, open_count)
+    assert 0 < peak <= 2
+    assert result['metrics']['total_fees'] > 0
+    assert all(t['entry_price'] > 0 and t['fees'] > 0 for t in result['trades'])
+
+def test_watchlist_symbols():
+    watchlists = {'watchlists': [{'name': 'Majors', 'assets': [{'symbol': 'BTC/USDT'}, {'symbol': 'ETH/USDT'}]}]}
+    assert watchlist_symbols(watchlists, 'Majors') == ['BTC/USDT', 'ETH/USDT']
+    with pytest.raises(KeyError):
+        watchlist_symbols(watchlists, 'Missing')
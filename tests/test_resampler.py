@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.data_collector import DataCollector
+from services.ohlcv_cache import PRICE_COLUMNS
+from services.resampler import ResampleRegistry, resample_ohlcv
+from services.storage import StorageEngine
+from tests.conftest import FakeFetcher, make_ohlcv
+
+START = 1_599_999_960_000  # on the 1m grid, mid-hour
+
+def pandas_resample(df: pd.DataFrame, rule: str) -> pd.DataFrame:
+    frame = df.set_index(pd.to_datetime(df['timestamp'], unit='ms'))
+    out = frame.resample(rule).agg({'open': 'first', 'high': 'max', 'low': 'min',
+                                    'close': 'last', 'volume': 'sum'}).dropna()
+    out.insert(0, 'timestamp', (out.index - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1))
+    return out.reset_index(drop=True)
+
+def make_engine(tmp_path, timeframes=('5m', '1h'), symbols=('BTC/USDT',)):
+    resampler = ResampleRegistry('1m', timeframes)
+    resampler.collect(symbols)
+    return StorageEngine(str(tmp_path / "resample.db"), resampler=resampler)
+
+def test_resample_matches_pandas():
+    df = make_ohlcv(1000, start=START)
+    timestamps, prices = resample_ohlcv(df['timestamp'].to_numpy(),
+                                        {col: df[col].to_numpy() for col in PRICE_COLUMNS}, '1h')
+    expected = pandas_resample(df, '1h')
+    np.testing.assert_array_equal(timestamps, expected['timestamp'].to_numpy())
+    for col in PRICE_COLUMNS:
+        np.testing.assert_allclose(prices[col], expected[col].to_numpy())
+
+def test_materialized_on_first_read(tmp_path):
+    engine = make_engine(tmp_path)
+    base = make_ohlcv(600, start=START)
+    engine.store_ohlcv('BTC/USDT', '1m', base)
+    assert engine.resampler.materialized_through('BTC/USDT', '1h') is None
+
+    hourly = engine.get_ohlcv('BTC/USDT', '1h')
+    # The base starts mid-hour, so the first hour is not built
+    expected = pandas_resample(base, '1h').iloc[1:]
+    np.testing.assert_array_equal(hourly['timestamp'].to_numpy(), expected['timestamp'].to_numpy())
+    np.testing.assert_allclose(hourly['volume'].to_numpy(), expected['volume'].to_numpy())
+    assert engine.resampler.materialized_through('BTC/USDT', '1h') == int(base['timestamp'].iloc[-1])
+    # 5m was never read, so it was never built
+    assert engine.resampler.materialized_through('BTC/USDT', '5m') is None
+
+def test_incremental_update_from_new_base_candles(tmp_path):
+    engine = make_engine(tmp_path)
+    full = make_ohlcv(900, start=START)
+    engine.store_ohlcv('BTC/USDT', '1m', full.iloc[:600])
+    before = engine.get_ohlcv('BTC/USDT', '1h')
+
+    engine.store_ohlcv('BTC/USDT', '1m', full.iloc[600:])
+    after = engine.get_ohlcv('BTC/USDT', '1h')
+    expected = pandas_resample(full, '1h').iloc[1:]
+    assert len(after) > len(before)
+    np.testing.assert_array_equal(after['timestamp'].to_numpy(), expected['timestamp'].to_numpy())
+    for col in PRICE_COLUMNS:
+        np.testing.assert_allclose(after[col].to_numpy(), expected[col].to_numpy())
+    # Only the partial bucket and the new ones were recomputed
+    assert engine.resampler.materialized_through('BTC/USDT', '1h') == int(full['timestamp'].iloc[-1])
+
+def test_partial_base_never_overwrites_fetched_candles(tmp_path):
+    engine = make_engine(tmp_path, symbols=('ETH/USDT',))
+    hour = 1_600_002_000_000
+    fetched = pd.DataFrame({'timestamp': hour + np.arange(10) * 3_600_000, 'open': 100.0, 'high': 110.0,
+                            'low': 90.0, 'close': 105.0, 'volume': 1000.0})
+    engine.store_ohlcv('ETH/USDT', '1h', fetched)
+
+    def minutes(start, n):
+        return pd.DataFrame({'timestamp': start + np.arange(n) * 60_000, 'open': 1.0, 'high': 2.0,
+                             'low': 0.5, 'close': 1.5, 'volume': 1.0})
+
+    # Half of hour 5, then a gap: neither a complete nor an in-progress bucket
+    engine.store_ohlcv('ETH/USDT', '1m', minutes(hour + 5 * 3_600_000 + 30 * 60_000, 30))
+    pd.testing.assert_frame_equal(engine.get_ohlcv('ETH/USDT', '1h'), fetched, check_dtype=False)
+    # Hour 7 in progress: the fetched candle stays until the base covers it
+    engine.store_ohlcv('ETH/USDT', '1m', minutes(hour + 7 * 3_600_000, 20))
+    pd.testing.assert_frame_equal(engine.get_ohlcv('ETH/USDT', '1h'), fetched, check_dtype=False)
+    engine.store_ohlcv('ETH/USDT', '1m', minutes(hour + 7 * 3_600_000 + 20 * 60_000, 40))
+    hourly = engine.get_ohlcv('ETH/USDT', '1h')
+    assert hourly.iloc[7][['open', 'high', 'low', 'close', 'volume']].tolist() == [1.0, 2.0, 0.5, 1.5, 60.0]
+    pd.testing.assert_frame_equal(hourly.drop(index=7), fetched.drop(index=7), check_dtype=False)
+
+    # A symbol whose base candles are not collected is never derived
+    engine.store_ohlcv('SOL/USDT', '1h', fetched)
+    engine.store_ohlcv('SOL/USDT', '1m', minutes(hour, 120))
+    pd.testing.assert_frame_equal(engine.get_ohlcv('SOL/USDT', '1h'), fetched, check_dtype=False)
+
+def test_materialized_state_survives_a_restart(tmp_path):
+    engine = make_engine(tmp_path)
+    full = make_ohlcv(900, start=START)
+    engine.store_ohlcv('BTC/USDT', '1m', full.iloc[:600])
+    engine.get_ohlcv('BTC/USDT', '1h')
+    through = engine.resampler.materialized_through('BTC/USDT', '1h')
+    partial = engine.resampler.partial_bucket('BTC/USDT', '1h')
+    assert partial == int(engine.get_ohlcv('BTC/USDT', '1h')['timestamp'].iloc[-1])
+
+    restarted = make_engine(tmp_path)
+    assert restarted.resampler.materialized_through('BTC/USDT', '1h') == through
+    assert restarted.resampler.partial_bucket('BTC/USDT', '1h') == partial
+    # The in-progress hour it wrote before the restart is still its to update
+    restarted.store_ohlcv('BTC/USDT', '1m', full.iloc[600:])
+    after = restarted.get_ohlcv('BTC/USDT', '1h')
+    expected = pandas_resample(full, '1h').iloc[1:]
+    np.testing.assert_array_equal(after['timestamp'].to_numpy(), expected['timestamp'].to_numpy())
+    np.testing.assert_allclose(after['volume'].to_numpy(), expected['volume'].to_numpy())
+
+def test_registry_rejects_unresamplable_timeframes():
+    with pytest.raises(ValueError):
+        ResampleRegistry('1m', ['1M'])
+    with pytest.raises(ValueError):
+        ResampleRegistry('5m', ['7m'])
+    with pytest.raises(ValueError):
+        ResampleRegistry('1h', ['1m'])
+
+def test_collector_skips_derived_timeframes(tmp_path):
+    engine = make_engine(tmp_path, timeframes=('5m', '1h', '4h'))
+    config = {'watchlists': [{'name': 'test', 'assets': [
+        {'symbol': 'BTC/USDT', 'timeframes': ['1m', '5m', '1h', '1d']},
+        {'symbol': 'ETH/USDT', 'timeframes': ['4h']},
+    ]}], 'data_sources': {'collector': {'max_requests_per_sec': 1000}}}
+    collector = DataCollector(engine, FakeFetcher(), config)
+    collector.build_tasks(0.0)
+    # ETH has no base candles to build 4h from, so it is still fetched
+    assert set(collector.tasks) == {('BTC/USDT', '1m'), ('BTC/USDT', '1d'), ('ETH/USDT', '4h')}
@@ -0,0 +1,90 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.indicators import IndicatorEngine
+from services.screener import MATRIX_INDICATORS, Screener, stack_latest
+from services.storage import StorageEngine
+from tests.conftest import make_ohlcv
+
+START = 1_599_999_960_000
+STEP = 3_600_000
+
+@pytest.fixture
+def universe(tmp_path):
+    engine = StorageEngine(str(tmp_path / "screener.db"))
+    frames = [make_ohlcv(300, seed=seed, start=START, step=STEP) for seed in range(40)]
+    # A late listing with a short history
+    frames.append(make_ohlcv(60, seed=99, start=START + 240 * STEP, step=STEP))
+    symbols = [f"C{i}/USDT" for i in range(len(frames))]
+    for symbol, df in zip(symbols, frames):
+        engine.store_ohlcv(symbol, '1h', df)
+    return engine, symbols, frames
+
+def test_matrix_indicators_match_indicator_engine(universe):
+    engine, symbols, frames = universe
+    df = engine.get_ohlcv_many(symbols, '1h')
+    cols, last_ts = stack_latest(df, symbols, 200)
+    assert (last_ts == START + 299 * STEP).all()
+    assert np.isnan(cols['close'][:-60, -1]).all() and not np.isnan(cols['close'][-60:, -1]).any()
+
+    for j in (0, 17, len(symbols) - 1):
+        window = frames[j].tail(200).reset_index(drop=True)
+        for name, calc in MATRIX_INDICATORS.items():
+            expected = IndicatorEngine.calculate_all(window, [name])[name]
+            expected = {name: expected} if isinstance(expected, pd.Series) else \
+                {f"{name}_{c}": expected[c] for c in expected.columns}
+            for column, values in calc(cols).items():
+                np.testing.assert_allclose(values[-len(window):, j], values_of(expected[column]),
+                                           rtol=1e-9, equal_nan=True)
+
+def values_of(series: pd.Series) -> np.ndarray:
+    return series.to_numpy(dtype=np.float64)
+
+def test_screen_matches_per_symbol_evaluation(universe):
+    engine, symbols, frames = universe
+    screener = Screener(engine, {})
+    conditions = [
+        {'indicator': 'RSI', 'operator': '<', 'value': '$oversold'},
+        {'indicator': 'MACD_histogram', 'operator': '>', 'value': 0},
+    ]
+    result = screener.screen(symbols, '1h', conditions, {'oversold': 55}, bars=200,
+                             as_of=START + 299 * STEP)
+    assert result['evaluated'] == len(symbols)
+
+    expected = []
+    for symbol, df in zip(symbols, frames):
+        window = df.tail(200).reset_index(drop=True)
+        rsi = IndicatorEngine.calc_rsi(window).iloc[-1]
+        histogram = IndicatorEngine.calc_macd(window)['histogram'].iloc[-1]
+        if rsi < 55 and histogram > 0:
+            expected.append(symbol)
+    assert [m['symbol'] for m in result['matches']] == expected
+    assert expected, "thresholds should select some symbols"
+    assert set(result['matches'][0]['values']) == {'RSI', 'MACD_histogram'}
+
+def test_screen_hundreds_of_symbols_under_a_second(tmp_path):
+    engine = StorageEngine(str(tmp_path / "many.db"))
+    symbols = [f"S{i}/USDT" for i in range(300)]
+    for i, symbol in enumerate(symbols):
+        engine.store_ohlcv(symbol, '4h', make_ohlcv(250, seed=i, start=START, step=4 * STEP))
+    screener = Screener(engine, {})
+    started = time.perf_counter()
+    result = screener.screen(symbols, '4h', [
+        {'indicator': 'RSI', 'operator': '<', 'value': 30},
+        {'indicator': 'MACD_histogram', 'operator': 'crosses_above', 'value': 0},
+    ], as_of=START + 249 * 4 * STEP)
+    assert result['evaluated'] == 300
+    assert time.perf_counter() - started < 1.0
+
+def test_unsupported_indicator_is_rejected(universe):
+    engine, symbols, _ = universe
+    with pytest.raises(ValueError):
+        Screener(engine, {}).screen(symbols, '1h', [{'indicator': 'ICHIMOKU_tenkan', 'operator': '>', 'value': 0}])
+
+def test_stored_symbols(universe):
+    engine, symbols, _ = universe
+    assert engine.get_symbols('1h') == sorted(symbols)
+    assert engine.get_symbols('1d') == []
@@ -0,0 +1,76 @@
+import threading
+
+from services.storage import StorageEngine
+from tests.conftest import make_ohlcv
+
+def test_connections_are_pooled_with_wal(tmp_path):
+    engine = StorageEngine(str(tmp_path / "pool.db"))
+    with engine.get_conn() as conn:
+        first = conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    with engine.get_conn() as conn:
+        assert conn is first
+    engine.close()
+
+def test_failed_transaction_rolls_back_and_connection_is_reused(tmp_path):
+    engine = StorageEngine(str(tmp_path / "pool.db"), ohlcv_cache_bytes=0)
+    try:
+        with engine.get_conn() as conn:
+            conn.execute("INSERT INTO alerts (symbol, condition) VALUES ('BTC/USDT', 'x')")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    with engine.get_conn() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM alerts").fetchone()[0] == 0
+
+def test_concurrent_reads_during_writes(tmp_path):
+    engine = StorageEngine(str(tmp_path / "pool.db"), ohlcv_cache_bytes=0, pool_size=4)
+    engine.store_ohlcv('BTC/USDT', '1m', make_ohlcv(1000))
+    errors = []
+
+    def read():
+        try:
+            for _ in range(20):
+                assert len(engine.get_ohlcv('BTC/USDT', '1m', limit=500)) == 500
+        except Exception as e:
+            errors.append(e)
+
+    def write():
+        for i in range(20):
+            engine.store_ohlcv('BTC/USDT', '1m', make_ohlcv(10, seed=i, start=1_600_000_000_000 + 60_000 * (1000 + i)))
+
+    threads = [threading.Thread(target=read) for _ in range(6)] + [threading.Thread(target=write)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert len(engine.get_ohlcv('BTC/USDT', '1m')) == 1029
+
+def test_bulk_ingest_upserts_only_changed_rows(tmp_path):
+    engine = StorageEngine(str(tmp_path / "ingest.db"), ohlcv_cache_bytes=0)
+    df = make_ohlcv(1234)  # not a multiple of the statement batch
+    stats = engine.store_ohlcv('BTC/USDT', '1m', df)
+    assert stats['rows'] == 1234 and stats['rows_per_sec'] > 0
+    stored = engine.get_ohlcv('BTC/USDT', '1m')
+    assert stored['timestamp'].tolist() == df['timestamp'].tolist()
+    assert stored['close'].tolist() == df['close'].tolist()
+
+    with engine.get_conn() as conn:
+        before = conn.total_changes
+        engine_conn = conn
+    engine.store_ohlcv('BTC/USDT', '1m', df)
+    with engine.get_conn() as conn:
+        assert conn is engine_conn and conn.total_changes == before
+
+    changed = df.iloc[[10, 20]].copy()
+    changed['close'] += 1.0
+    # Duplicates in one batch: the last row wins, as with INSERT OR REPLACE
+    changed = changed.iloc[[0, 0, 1]].reset_index(drop=True)
+    changed.loc[0, 'close'] = -1.0
+    engine.store_ohlcv('BTC/USDT', '1m', changed)
+    stored = engine.get_ohlcv('BTC/USDT', '1m')
+    assert len(stored) == 1234
+    assert stored['close'].iloc[10] == df['close'].iloc[10] + 1.0
+    assert stored['close'].iloc[20] == df['close'].iloc[20] + 1.0
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from services.backtester import Backtester
+from services.optimizer import load_strategy_config
+from services.strategy_compiler import compile_strategy, crosses
+
+def columns(**arrays):
+    return {name: np.asarray(values, dtype=np.float64) for name, values in arrays.items()}
+
+def test_yaml_strategy_references_only_needed_indicators():
+    compiled = compile_strategy(load_strategy_config("rsi_mean_reversion"))
+    assert compiled.indicators == ["RSI"]
+    assert compiled.columns == {"RSI", "volume", "close"}
+
+def test_parameter_expressions_and_derived_series():
+    config = {'strategy': {
+        'parameters': {'limit': 30, 'mult': 2.0, 'volume_avg_period': 2},
+        'entry_conditions': [
+            {'indicator': 'RSI', 'operator': '<', 'value': '$limit'},
+            {'indicator': 'volume', 'operator': '>', 'value': '$avg_volume * $mult'},
+        ],
+        'exit_conditions': [
+            {'indicator': 'RSI', 'operator': '>=', 'value': '($limit + 40) / 2'},
+            {'type': 'stop_loss', 'value': '$limit / 1000'},
+        ],
+    }}
+    signals = compile_strategy(config).evaluate(columns(
+        close=[1, 1, 1, 1], RSI=[20, 20, 40, 35], volume=[1, 5, 1, 10]))
+
+    # avg_volume over 2 bars: [nan, 3, 3, 5.5]
+    assert signals.entry.tolist() == [False, False, False, False]
+    assert signals.exit.tolist() == [False, False, True, True]
+    assert signals.stop_loss == pytest.approx(0.03)
+    assert signals.take_profit == np.inf
+
+    wide = compile_strategy(config).evaluate(columns(
+        close=[1, 1, 1], RSI=[20, 20, 20], volume=[1, 1, 10]), overrides={'mult': 1.0})
+    assert wide.entry.tolist() == [False, False, True]
+
+def test_disabled_condition_is_skipped():
+    config = load_strategy_config("rsi_mean_reversion")
+    compiled = compile_strategy(config)
+    cols = columns(close=np.ones(30), RSI=np.full(30, 10.0), volume=np.ones(30))
+    assert not compiled.evaluate(cols).entry.any()
+    assert compiled.evaluate(cols, {'volume_confirmation': False}).entry.all()
+
+def test_crossovers():
+    macd = np.array([-1.0, -0.5, 0.5, 1.0, -0.2])
+    assert crosses(macd, 0, above=True).tolist() == [False, False, True, False, False]
+    assert crosses(macd, 0, above=False).tolist() == [False, False, False, False, True]
+
+@pytest.mark.parametrize("condition", [
+    {'indicator': 'RSI', 'operator': 'between', 'value': 1},
+    {'indicator': 'FOO', 'operator': '<', 'value': 1},
+    {'indicator': 'RSI', 'operator': '<', 'value': '__import__("os")'},
+])
+def test_invalid_conditions_rejected(condition):
+    with pytest.raises(ValueError):
+        compile_strategy({'strategy': {'entry_conditions': [condition]}})
+
+def test_macd_crossover_strategy_backtest(storage):
+    config = {'strategy': {
+        'entry_conditions': [{'indicator': 'MACD_histogram', 'operator': 'crosses_above', 'value': 0}],
+        'exit_conditions': [{'indicator': 'MACD_histogram', 'operator': 'crosses_below', 'value': 0}],
+    }}
+    assert compile_strategy(config).indicators == ["MACD"]
+    result = Backtester(storage).run_backtest(config, "BTC/USDT", "1m", None, None)
+    assert result['metrics']['total_trades'] > 0
+    assert {t['reason'] for t in result['trades']} == {"signal"}
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+
+from websockets.asyncio.server import serve
+
+from services.backfill import Backfiller, missing_ranges
+from services.data_collector import DataCollector
+from services.rate_limit import TokenBucket
+from services.stream_ingest import StreamIngestor
+from services.timeframes import candle_open
+from tests.conftest import FakeFetcher
+
+def kline(stream: str, open_time: int, close: float, event_time: int = None) -> str:
+    return json.dumps({'stream': stream, 'data': {
+        'e': 'kline', 'E': event_time or open_time, 's': stream.split('@')[0].upper(),
+        'k': {'t': open_time, 'T': open_time + 59_999, 'i': '1m', 'o': '100', 'h': str(max(close, 100)),
+              'l': str(min(close, 100)), 'c': str(close), 'v': '5', 'x': False},
+    }})
+
+def make_ingestor(storage, port, pairs, **stream_config):
+    config = {'data_sources': {'stream': {'url': f"ws://127.0.0.1:{port}", 'flush_interval_ms': 20,
+                                          'reconnect_min_sec': 0.01, **stream_config}}}
+    backfiller = Backfiller(storage, FakeFetcher(), TokenBucket(1000))
+    return StreamIngestor(storage, backfiller, config, pairs)
+
+async def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def test_klines_are_merged_and_written_in_micro_batches(storage):
+    t0 = 1_700_000_040_000
+    paths = []
+
+    async def feed(ws):
+        paths.append(ws.request.path)
+        for close in (101.0, 102.5, 99.0):
+            await ws.send(kline('xrpusdt@kline_1m', t0, close))
+        await ws.send(kline('xrpusdt@kline_1m', t0 + 60_000, 98.0))
+        await ws.send(kline('ethusdt@kline_1m', t0, 5.0))  # not subscribed
+        await ws.wait_closed()
+
+    async def run():
+        async with serve(feed, '127.0.0.1', 0) as server:
+            ingestor = make_ingestor(storage, server.sockets[0].getsockname()[1], pairs=[('XRP/USDT', '1m')])
+            task = asyncio.create_task(ingestor.run_forever())
+            await wait_for(lambda: ingestor.rows_written >= 2)
+            ingestor.stop()
+            await asyncio.gather(task, return_exceptions=True)
+            return ingestor
+
+    ingestor = asyncio.run(run())
+    assert paths == ['/stream?streams=xrpusdt@kline_1m']
+    assert ingestor.messages == 4 and ingestor.rows_written == 2
+    stored = storage.get_ohlcv('XRP/USDT', '1m', start=t0)
+    assert stored['timestamp'].tolist() == [t0, t0 + 60_000]
+    assert stored['close'].tolist() == [99.0, 98.0]
+    assert storage.get_ohlcv('ETH/USDT', '1m').empty
+
+def test_reconnect_backfills_the_gap(storage):
+    seed = FakeFetcher(now=lambda: time.time() - 600)
+    storage.store_ohlcv('SOL/USDT', '1m', asyncio.run(seed.fetch_ohlcv('SOL/USDT', '1m', 100)))
+    first = int(storage.get_ohlcv('SOL/USDT', '1m')['timestamp'].iloc[0])
+    forming = candle_open(int(time.time() * 1000), '1m')
+    connections = []
+
+    async def feed(ws):
+        connections.append(ws)
+        if len(connections) == 1:
+            # One update of the forming candle, then the connection drops
+            await ws.send(kline('solusdt@kline_1m', forming, 1.0))
+            return
+        await ws.wait_closed()
+
+    async def run():
+        async with serve(feed, '127.0.0.1', 0) as server:
+            ingestor = make_ingestor(storage, server.sockets[0].getsockname()[1], pairs=[('SOL/USDT', '1m')])
+            task = asyncio.create_task(ingestor.run_forever())
+            await wait_for(lambda: ingestor.connections == 2 and ingestor.connected)
+            assert ingestor.covers('SOL/USDT', '1m') and not ingestor.covers('SOL/USDT', '1h')
+            ingestor.stop()
+            await asyncio.gather(task, return_exceptions=True)
+            return ingestor
+
+    ingestor = asyncio.run(run())
+    assert ingestor.messages == 1 and ingestor.backfilled_rows >= 10
+    # The candle that was forming at the drop was refetched over REST
+    candle = storage.get_ohlcv('SOL/USDT', '1m', start=forming, end=forming).iloc[0]
+    assert candle['close'] != 1.0 and candle['volume'] != 5.0
+    now_ms = int(time.time() * 1000)
+    timestamps = storage.get_timestamps('SOL/USDT', '1m', first, now_ms)
+    assert missing_ranges(timestamps, 60_000, first, candle_open(now_ms, '1m')) == []
+
+def test_collector_skips_pairs_covered_by_the_feed(storage):
+    class LiveFeed:
+        def covers(self, symbol, timeframe):
+            return timeframe == '1m'
+
+    config = {'watchlists': [{'name': 'test', 'assets': [{'symbol': 'BTC/USDT', 'timeframes': ['1m', '1d']}]}],
+              'data_sources': {'collector': {'max_requests_per_sec': 1000}}}
+    collector = DataCollector(storage, FakeFetcher(), config)
+    collector.live_feed = LiveFeed()
+
+    async def run():
+        collector.build_tasks(0.0)
+        for task in collector.tasks.values():
+            task.runs = 1  # history already backfilled
+        launched = collector.launch_due(1.0)
+        await asyncio.gather(*launched)
+        return launched
+
+    assert len(asyncio.run(run())) == 1
+    assert collector.tasks[('BTC/USDT', '1m')].live_skips == 1
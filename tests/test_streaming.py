@@ -0,0 +1,152 @@
+import asyncio
+import json
+
+import pytest
+
+import api.main
+from api.streaming import StreamHub
+from services.indicators import IndicatorEngine
+from services.market_data import MarketDataService
+from services.storage import StorageEngine
+from tests.conftest import FakeFetcher, make_ohlcv
+
+START = 1_599_999_960_000
+KEY = ('BTC/USDT', '1m')
+
+@pytest.fixture
+def hub(tmp_path):
+    engine = StorageEngine(str(tmp_path / "stream.db"))
+    engine.store_ohlcv('BTC/USDT', '1m', make_ohlcv(600, start=START))
+    clock = [(START + 599 * 60_000 + 30_000) / 1000]
+    service = MarketDataService(engine, FakeFetcher(now=lambda: clock[0]), {}, clock=lambda: clock[0])
+    hub = StreamHub(service, {'streaming': {'poll_interval_sec': 3600, 'max_stale_sec': 3600}})
+    hub.clock = clock
+    return hub
+
+def drain(subscriber):
+    messages = []
+    while not subscriber.queue.empty():
+        messages.append(json.loads(subscriber.queue.get_nowait()))
+    return messages
+
+def test_shared_upstream_sends_only_changed_candles(hub):
+    async def run():
+        a, b = hub.connect(), hub.connect()
+        await hub.subscribe(a, *KEY, ['RSI'])
+        await hub.subscribe(b, *KEY)
+        while KEY not in hub._last:
+            await asyncio.sleep(0.01)
+        assert hub.stats()['streams'] == 1 and hub.stats()['subscriptions'] == 2
+
+        (snapshot,) = drain(a)
+        assert snapshot['type'] == 'snapshot' and len(snapshot['candles']['timestamp']) == 500
+        assert len(snapshot['indicators']['RSI']['value']) == 500
+        assert drain(b)[0]['indicators'] == {}
+
+        # The in-progress candle moves and two new candles open
+        last_ts = START + 599 * 60_000
+        hub.market_data.storage.store_ohlcv('BTC/USDT', '1m', make_ohlcv(3, seed=9, start=last_ts))
+        hub.clock[0] += 120
+        assert await hub.poll(KEY) == 3
+
+        (update_a,), (update_b,) = drain(a), drain(b)
+        assert update_a['type'] == 'update'
+        assert update_a['candles']['timestamp'] == [last_ts, last_ts + 60_000, last_ts + 120_000]
+        assert len(update_a['indicators']['RSI']['value']) == 3
+        assert update_b['candles'] == update_a['candles'] and update_b['indicators'] == {}
+
+        # Nothing changed, nothing sent
+        assert await hub.poll(KEY) == 0
+        assert drain(a) == []
+
+        hub.disconnect(a)
+        hub.disconnect(b)
+        assert hub.stats()['streams'] == 0
+
+    asyncio.run(run())
+
+def test_updates_match_a_full_calculation_without_one(hub, monkeypatch):
+    names = ['RSI', 'MACD', 'ICHIMOKU']
+
+    async def run():
+        subscriber = hub.connect()
+        await hub.subscribe(subscriber, *KEY, names)
+        while KEY not in hub._last:
+            await asyncio.sleep(0.01)
+        drain(subscriber)
+        # The upstream's first window; EMAs carry on from it
+        first = START + 100 * 60_000
+
+        def full():
+            raise AssertionError("poll recomputed the whole window")
+        monkeypatch.setattr(IndicatorEngine, 'calculate_all', staticmethod(lambda *args: full()))
+
+        last_ts = START + 599 * 60_000
+        for seed, minutes, changed in ((9, 2, 3), (10, 1, 2)):
+            hub.market_data.storage.store_ohlcv('BTC/USDT', '1m', make_ohlcv(changed, seed=seed, start=last_ts))
+            hub.clock[0] += 60 * minutes
+            assert await hub.poll(KEY) == changed
+            (update,) = drain(subscriber)
+            monkeypatch.undo()
+            df = hub.market_data.storage.get_ohlcv('BTC/USDT', '1m', start=first)
+            expected = IndicatorEngine.calculate_all(df, names)
+            for name in names:
+                for column, values in update['indicators'][name].items():
+                    series = expected[name] if column == 'value' else expected[name][column]
+                    values = [float('nan') if v is None else v for v in values]  # NaN arrives as null
+                    assert values == pytest.approx(series.iloc[-changed:].tolist(), nan_ok=True)
+            monkeypatch.setattr(IndicatorEngine, 'calculate_all', staticmethod(lambda *args: full()))
+            last_ts = update['candles']['timestamp'][-1]
+
+        hub.disconnect(subscriber)
+        assert hub.incremental.last_timestamp(*KEY, 'RSI') is None
+
+    asyncio.run(run())
+
+def test_slow_subscriber_is_resynced_with_a_snapshot(hub):
+    async def run():
+        hub.max_queue = 1
+        slow = hub.connect()
+        await hub.subscribe(slow, *KEY)
+        slow.offer(KEY, 'queued')
+        assert KEY in slow.resync
+
+        sent = []
+        async def send(message):
+            sent.append(message)
+        pump = asyncio.create_task(hub.pump(slow, send))
+        while len(sent) < 2:
+            await asyncio.sleep(0.01)
+        pump.cancel()
+        hub.disconnect(slow)
+        assert json.loads(sent[-1])['type'] == 'snapshot' and not slow.resync
+
+    asyncio.run(run())
+
+def test_websocket_subscribe(client, hub, monkeypatch):
+    monkeypatch.setattr(api.main, 'stream_hub', hub)
+    with client.websocket_connect("/api/v1/stream") as ws:
+        ws.send_json({'action': 'subscribe', 'symbol': 'BTC/USDT', 'timeframe': '1m', 'indicators': ['MACD']})
+        snapshot = ws.receive_json()
+        assert snapshot['type'] == 'snapshot'
+        assert set(snapshot['indicators']['MACD']) == {'macd', 'signal', 'histogram'}
+        ws.send_json({'action': 'subscribe', 'symbol': 'BTC/USDT', 'timeframe': '7x'})
+        assert ws.receive_json()['type'] == 'error'
+    assert hub.stats()['streams'] == 0
+
+def test_websocket_releases_streams_on_any_error(client, hub, monkeypatch):
+    monkeypatch.setattr(api.main, 'stream_hub', hub)
+    with client.websocket_connect("/api/v1/stream") as ws:
+        ws.send_text('not json')
+        assert ws.receive_json()['type'] == 'error'
+        ws.send_json(['subscribe'])
+        assert ws.receive_json()['type'] == 'error'
+
+    async def broken(subscriber, key):
+        raise RuntimeError("snapshot failed")
+    monkeypatch.setattr(hub, '_send_snapshot', broken)
+    with pytest.raises(RuntimeError):
+        with client.websocket_connect("/api/v1/stream") as ws:
+            ws.send_json({'action': 'subscribe', 'symbol': 'BTC/USDT', 'timeframe': '1m'})
+            ws.receive_json()
+    assert hub.stats()['streams'] == 0 and hub.stats()['subscriptions'] == 0
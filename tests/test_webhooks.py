@@ -0,0 +1,129 @@
+import asyncio
+import json
+import time
+
+from services.webhooks import WebhookDispatcher, split_content
+
+class WebhookStandIn:
+    """Minimal HTTP/1.1 server with keep-alive that records webhook posts.
+
+    `responses` is consumed one status per request (then 204); `delay`
+    holds each response back to simulate a slow endpoint.
+    """
+
+    def __init__(self, responses=(), delay: float = 0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.posts = []
+        self.connections = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.concurrent += 1
+                self.max_concurrent = max(self.max_concurrent, self.concurrent)
+                await asyncio.sleep(self.delay)
+                self.concurrent -= 1
+                status = self.responses.pop(0) if self.responses else 204
+                if status < 400:
+                    self.posts.append((request_line.split()[1].decode(), json.loads(body)))
+                extra = "Retry-After: 0\r\n" if status == 429 else ""
+                writer.write(f"HTTP/1.1 {status} X\r\nContent-Length: 0\r\n{extra}\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+
+def dispatcher(webhooks, **delivery):
+    settings = {'batch_window_ms': 50, 'retry_base_sec': 0.01, **delivery}
+    return WebhookDispatcher({'alerts': {'webhooks': webhooks, 'delivery': settings}})
+
+def test_bursts_are_coalesced_over_one_pooled_connection():
+    async def run():
+        async with WebhookStandIn() as hook:
+            d = dispatcher({'discord': hook.url + "/discord", 'telegram': "${TELEGRAM_BOT_TOKEN}"}, max_batch=20)
+            for i in range(45):
+                assert d.submit(f"rule {i % 15}", "RSI < 30", key=f"rule {i % 15}")
+            await d.drain()
+            # A later alert reuses the kept-alive connection
+            d.submit("late", "close > 100")
+            await d.drain()
+            await d.close()
+            return hook, d
+
+    hook, d = asyncio.run(run())
+    assert d.targets == {'discord': hook.url + "/discord"}
+    assert hook.connections == 1 and d.batches == 4 and d.stats()['posts'] == 4
+    first = hook.posts[0][1]['content'].split("\n")
+    assert len(first) == 15 and first[0] == "**rule 0** (x2): RSI < 30"  # duplicates collapsed
+    assert hook.posts[-1] == ("/discord", {"content": "**late**\nclose > 100"})
+
+def test_failed_posts_are_retried_with_backoff():
+    async def run():
+        async with WebhookStandIn(responses=[500, 429, 503]) as hook:
+            d = dispatcher({'ops': hook.url + "/hook"}, max_retries=3)
+            d.submit("BTC", "crossed")
+            await d.drain()
+            give_up = dispatcher({'ops': hook.url + "/hook"}, max_retries=1)
+            hook.responses = [500, 500]
+            give_up.submit("ETH", "crossed")
+            await give_up.drain()
+            bad_request = dispatcher({'ops': hook.url + "/hook"})
+            hook.responses = [400]
+            bad_request.submit("SOL", "crossed")
+            await bad_request.drain()
+            for x in (d, give_up, bad_request):
+                await x.close()
+            return hook, d, give_up, bad_request
+
+    hook, d, give_up, bad_request = asyncio.run(run())
+    assert hook.posts == [("/hook", {"text": "**BTC**\ncrossed"})]
+    assert d.retries == 3 and d.failed == 0
+    assert give_up.retries == 1 and give_up.failed == 1 and give_up.last_error == "ops: HTTP 500"
+    assert bad_request.retries == 0 and bad_request.failed == 1
+
+def test_slow_webhook_does_not_block_others():
+    async def run():
+        async with WebhookStandIn(delay=0.3) as slow, WebhookStandIn() as fast:
+            d = dispatcher({'slow': slow.url, 'fast': fast.url}, max_batch=1, max_concurrency=2)
+            started = time.perf_counter()
+            for i in range(6):
+                d.submit(f"alert {i}", "fired")
+            submit_sec = time.perf_counter() - started
+            while len(fast.posts) < 6:
+                await asyncio.sleep(0.01)
+            fast_sec = time.perf_counter() - started
+            await d.drain()
+            await d.close()
+            return slow, fast, submit_sec, fast_sec
+
+    slow, fast, submit_sec, fast_sec = asyncio.run(run())
+    assert submit_sec < 0.05
+    assert fast_sec < 0.6  # the slow webhook alone needs ~0.9s for six posts
+    assert slow.max_concurrent == 2 and len(slow.posts) == 6
+
+def test_discord_content_is_split_on_lines():
+    lines = [f"line {i} " + "x" * 90 for i in range(50)]
+    chunks = split_content("\n".join(lines))
+    assert all(len(chunk) <= 2000 for chunk in chunks) and len(chunks) == 3
+    assert "\n".join(chunks) == "\n".join(lines)